@@ -1,12 +1,18 @@
-from langchain_community.document_loaders import PyPDFDirectoryLoader
-from langchain_text_splitters import RecursiveCharacterTextSplitter
 from langchain_openai import OpenAIEmbeddings, ChatOpenAI
-from langchain_community.vectorstores import FAISS
 from langchain_core.prompts import ChatPromptTemplate
-from langchain.chains.combine_documents import create_stuff_documents_chain
-from langchain.chains import create_retrieval_chain
 from dotenv import load_dotenv
 import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "embeddings"))
+from ann_index import INDEX_TYPE, RESCORE
+from cv_metadata import cv_enricher
+from cv_screening import format_ranking, screen_candidates
+from cv_table import ask_cvs, sync_cv_table
+from embedding_cache import with_cache
+from local_embeddings import EMBEDDING_BACKEND, LocalEmbeddings
+from query_engine import RAGQueryEngine
+from sharded_index import SHARDS, sync_shards
 
 # Load environment variables
 load_dotenv()
@@ -16,49 +22,55 @@ OPENAI_API_KEY = os.getenv("OPENAI_API_KEY")
 CV_DATA_PATH = "cv_data"
 FAISS_PATH = "faiss_openai_cv"
 
-def ingest_cvs():
-    """Load, split, embed, and save CVs to FAISS if index doesn't exist."""
+def make_embeddings(max_retries: int = 2):
+    # EMBEDDING_BACKEND=local embeds on this machine, offline; the index is rebuilt on switching.
+    if EMBEDDING_BACKEND == "local":
+        return LocalEmbeddings()
+    return OpenAIEmbeddings(model="text-embedding-3-small", max_retries=max_retries)
+
+def make_llm():
+    return ChatOpenAI(model="gpt-4-turbo")
+
+def ingest_cvs(index_type: str = INDEX_TYPE, rescore: int = RESCORE, shards: int = SHARDS):
+    """Stream CVs through split, embed and add into FAISS; only new or changed CVs are embedded."""
     # First check if there are any PDF files
     pdf_files = [f for f in os.listdir(CV_DATA_PATH) if f.lower().endswith('.pdf')]
     if not pdf_files:
         print(f"⚠️ No PDF files found in {CV_DATA_PATH}")
         return
 
-    # Check if FAISS index exists
-    if (os.path.exists(os.path.join(FAISS_PATH, "index.faiss")) and 
-        os.path.exists(os.path.join(FAISS_PATH, "index.pkl"))):
-        print(f"⏩ FAISS index already exists with {len(pdf_files)} PDFs. Skipping ingestion.")
-        return
-
     print(f"📥 Processing {len(pdf_files)} CVs...")
     try:
-        loader = PyPDFDirectoryLoader(CV_DATA_PATH)
-        docs = loader.load()
-        
-        if len(docs) != len(pdf_files):
-            print(f"⚠️ Warning: Loaded {len(docs)} documents but found {len(pdf_files)} PDF files")
-        
-        splitter = RecursiveCharacterTextSplitter(chunk_size=500, chunk_overlap=100)
-        chunks = splitter.split_documents(docs)
-
-        embeddings = OpenAIEmbeddings(model="text-embedding-3-small")
-        db = FAISS.from_documents(chunks, embedding=embeddings)
-        
-        os.makedirs(FAISS_PATH, exist_ok=True)
-        db.save_local(FAISS_PATH)
-        
-        print(f"✅ Created FAISS index with {len(chunks)} chunks from {len(docs)} CVs")
+        # Chunks go into the index in fixed-size batches with periodic checkpoints,
+        # so memory stays flat however many CVs there are and a crash resumes.
+        # Client retries off: BatchEmbedder backs off on 429s itself and lowers its concurrency.
+        embeddings = with_cache(make_embeddings(max_retries=0))
+        stats = sync_shards(CV_DATA_PATH, FAISS_PATH, embeddings, num_shards=shards, chunk_size=500,
+                            chunk_overlap=100, index_type=index_type, rescore=rescore, enrich=cv_enricher())
+        # One structured record per CV for list/count/filter questions (see cv_table.py).
+        table_stats = sync_cv_table(CV_DATA_PATH, FAISS_PATH)
+        if table_stats["extracted"]:
+            print(f"🗂️ Extracted {table_stats['extracted']} candidate records")
+        if not stats["added"] and not stats["updated"] and not stats["removed"]:
+            print(f"⏩ FAISS index already up to date with {len(pdf_files)} PDFs. Skipping ingestion.")
+            return
+
+        print(f"✅ Indexed {stats['chunks_added']} chunks from {stats['added'] + stats['updated']} CVs "
+              f"({stats['unchanged']} unchanged, {stats['removed']} removed)")
+        if stats["chunks_deduplicated"]:
+            print(f"♻️ Skipped {stats['chunks_deduplicated']} near-duplicate chunks (repeated pages or re-uploaded CVs)")
     except Exception as e:
         print(f"❌ Error during ingestion: {str(e)}")
 
-def query_cv(query_text: str) -> str:
-    """Query the CV database."""
-    print("🔍 Loading CV database...")
-    try:
-        embeddings = OpenAIEmbeddings(model="text-embedding-3-small")
-        db = FAISS.load_local(folder_path=FAISS_PATH, embeddings=embeddings, allow_dangerous_deserialization=True)
-        
-        llm = ChatOpenAI(model="gpt-4-turbo")
+_engine = None
+
+def get_query_engine() -> RAGQueryEngine:
+    """Build the CV query engine once; it reloads the index when ingestion replaces it."""
+    global _engine
+    if _engine is None:
+        print("🔍 Loading CV database...")
+        embeddings = make_embeddings()
+        llm = make_llm()
 
         # Simplified prompt without template logic
         prompt = ChatPromptTemplate.from_template(
@@ -70,15 +82,31 @@ def query_cv(query_text: str) -> str:
             
             Provide clear, concise answers. When listing names, include all candidates found."""
         )
+        _engine = RAGQueryEngine(FAISS_PATH, embeddings, llm, prompt, k=3)
+    return _engine
+
+def query_cv(query_text: str, filter: dict | None = None) -> str:
+    """Query the CV database.
 
-        retriever = db.as_retriever(search_kwargs={"k": 5})
-        chain = create_retrieval_chain(retriever, create_stuff_documents_chain(llm, prompt))
-        
-        response = chain.invoke({"input": query_text})
-        return response['answer'].strip()
+    filter restricts retrieval by metadata, e.g. {"candidate": "Asha Gurung"},
+    {"file": "asha.pdf"} or {"batch": "2025-06-01 10:30"}. Without one the
+    question is routed like in the Streamlit app (cv_table.ask_cvs): listing,
+    counting and skill/experience/degree filter questions are answered from
+    the CV table without calling the LLM, and a question that names
+    candidates is limited to their CVs unless it compares them with others.
+    """
+    try:
+        return ask_cvs(get_query_engine(), query_text, filter)
     except Exception as e:
         return f"Error processing query: {str(e)}"
 
+def screen_cvs(query_text: str, max_concurrency: int = 8) -> str:
+    """Ask the question of every candidate's CV in parallel and rank them (see cv_screening)."""
+    try:
+        return format_ranking(screen_candidates(get_query_engine(), query_text, max_concurrency=max_concurrency))
+    except Exception as e:
+        return f"Error screening CVs: {str(e)}"
+
 if __name__ == "__main__":
     # First run ingestion (comment out after first run)
     ingest_cvs()
@@ -88,13 +116,17 @@ if __name__ == "__main__":
     print("Example questions:")
     print("- List all candidate names")
     print("- Who has Python experience?")
+    print("- screen: Who would be a good fit for a backend Python role?  (asks every CV, ranks them)")
     
     while True:
         try:
             query_text = input("\n❓ What would you like to know about the candidates? ")
             if query_text.lower() in ['exit', 'quit']:
                 break
-            response = query_cv(query_text)
+            if query_text.lower().startswith("screen:"):
+                response = screen_cvs(query_text[len("screen:"):].strip())
+            else:
+                response = query_cv(query_text)
             print("\n💬 Answer:")
             print(response)
         except KeyboardInterrupt:
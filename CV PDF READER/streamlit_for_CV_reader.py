@@ -1,21 +1,31 @@
 import streamlit as st
-from langchain_community.document_loaders import PyPDFLoader
-from langchain_text_splitters import RecursiveCharacterTextSplitter
 from langchain_openai import OpenAIEmbeddings, ChatOpenAI
-from langchain_community.vectorstores import FAISS
 from langchain_core.prompts import ChatPromptTemplate
-from langchain.chains.combine_documents import create_stuff_documents_chain
-from langchain.chains import create_retrieval_chain
 from dotenv import load_dotenv
+import hashlib
 import os
+import sys
 import shutil
 import atexit # Import the atexit module
 
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "embeddings"))
+from ann_index import INDEX_TYPE, RESCORE
+from cv_metadata import cv_enricher
+from cv_screening import format_ranking, screen_candidates
+from cv_table import ask_cvs, forget_cv_table, sync_cv_table
+from embedding_cache import with_cache
+from index_store import index_exists
+from ingest_jobs import ACTIVE_STATES, job_progress, load_job, start_job
+from local_embeddings import EMBEDDING_BACKEND, LocalEmbeddings
+from query_engine import RAGQueryEngine
+from session_registry import SESSIONS_SPILL, SessionRegistry, new_session_id, valid_session_id
+from sharded_index import SHARDS, indexed_files, shard_paths, sync_shards
+
 # Load environment variables
 load_dotenv()
 OPENAI_API_KEY = os.getenv("OPENAI_API_KEY")
 
-# Paths
+# Paths: every browser session gets its own subfolder of each (see session_registry)
 CV_DATA_PATH = "cv_data"
 FAISS_PATH = "faiss_openai_cv"
 
@@ -23,6 +33,12 @@ FAISS_PATH = "faiss_openai_cv"
 os.makedirs(CV_DATA_PATH, exist_ok=True)
 os.makedirs(FAISS_PATH, exist_ok=True)
 
+def make_embeddings(max_retries: int = 2):
+    # EMBEDDING_BACKEND=local embeds on this machine, offline.
+    if EMBEDDING_BACKEND == "local":
+        return LocalEmbeddings()
+    return OpenAIEmbeddings(model="text-embedding-3-small", max_retries=max_retries)
+
 # --- NEW CLEANUP FUNCTION FOR EXIT ---
 def clean_on_exit():
     """Delete all files/subfolders inside cv_data and faiss_openai_cv but keep the folders."""
@@ -46,8 +62,11 @@ def clean_on_exit():
     print("✅ Cleanup complete.")
 
 # --- REGISTER THE CLEANUP FUNCTION ---
-# This function will now be called automatically when the script exits gracefully (e.g., Ctrl+C)
-atexit.register(clean_on_exit)
+# This function will now be called automatically when the script exits gracefully (e.g., Ctrl+C).
+# With SESSIONS_SPILL=1 sessions are kept on disk instead, so a returning user finds their CVs; the registry
+# deletes those unused for SESSIONS_TTL_HOURS.
+if not SESSIONS_SPILL:
+    atexit.register(clean_on_exit)
 
 
 # Streamlit page configuration
@@ -57,100 +76,149 @@ st.set_page_config(
     layout="wide"
 )
 
-def check_faiss_index_exists():
-    """Check if the essential FAISS index files exist."""
-    index_file = os.path.join(FAISS_PATH, "index.faiss")
-    pkl_file = os.path.join(FAISS_PATH, "index.pkl")
-    return os.path.exists(index_file) and os.path.exists(pkl_file)
-
-def clear_faiss_index():
-    """Remove all contents of the FAISS directory."""
-    if os.path.exists(FAISS_PATH):
-        for item in os.listdir(FAISS_PATH):
-            item_path = os.path.join(FAISS_PATH, item)
-            try:
-                if os.path.isfile(item_path) or os.path.islink(item_path):
-                    os.unlink(item_path)
-                elif os.path.isdir(item_path):
-                    shutil.rmtree(item_path)
-            except Exception as e:
-                st.error(f"Error deleting item {item_path}: {e}")
-
-def save_uploaded_files(uploaded_files):
-    """Save uploaded PDFs to the cv_data folder, clearing old ones first."""
-    # This function is now just for saving, as cleanup is handled globally on exit
+def check_faiss_index_exists(faiss_path: str):
+    """Check if a FAISS index exists, monolithic or in shard-XXX/ folders (FAISS_SHARDS > 1)."""
+    return index_exists(faiss_path) or bool(shard_paths(faiss_path))
+
+def save_uploaded_files(uploaded_files, data_path: str, faiss_path: str):
+    """Save uploaded PDFs to the session's data folder, skipping CVs that are already there.
+
+    Uploads are compared by content hash with the CVs already indexed (or
+    saved earlier in this batch), so re-submitting the same files, under any
+    name, costs nothing. Returns (saved, skipped).
+    """
+    known = set(indexed_files(faiss_path).values())
+    saved = skipped = 0
     for uploaded_file in uploaded_files:
         if uploaded_file.name.lower().endswith('.pdf'):
-            file_path = os.path.join(CV_DATA_PATH, uploaded_file.name)
+            data = uploaded_file.getbuffer()
+            file_hash = hashlib.sha256(data).hexdigest()
+            if file_hash in known:
+                skipped += 1
+                continue
+            known.add(file_hash)
+            file_path = os.path.join(data_path, uploaded_file.name)
             with open(file_path, "wb") as f:
-                f.write(uploaded_file.getbuffer())
-    return len(uploaded_files)
+                f.write(data)
+            saved += 1
+    return saved, skipped
 
 
-def ingest_cvs():
-    """Load, split, embed, and save CVs to FAISS. This function now handles cleanup."""
-    pdf_files = [f for f in os.listdir(CV_DATA_PATH) if f.lower().endswith('.pdf')]
-    if not pdf_files:
-        st.warning(f"No PDF files found in {CV_DATA_PATH}")
-        clear_faiss_index() 
-        return False
+def remove_cv(file_name: str, session_id: str) -> str:
+    """Delete one CV and start a job that drops its vectors, leaving the other CVs untouched."""
+    data_path, _ = get_registry().paths(session_id)
+    path = os.path.join(data_path, os.path.basename(file_name))
+    if os.path.exists(path):
+        os.unlink(path)
+    return start_ingest(session_id)
 
-    with st.status("Processing CVs...", expanded=True) as status:
-        try:
-            status.write("Clearing old database...")
-            clear_faiss_index()
-
-            status.write("Loading PDF files...")
-            docs = []
-            for pdf_file in pdf_files:
-                loader = PyPDFLoader(os.path.join(CV_DATA_PATH, pdf_file))
-                docs.extend(loader.load())
-            
-            status.write(f"Loaded {len(docs)} pages from {len(pdf_files)} PDFs")
-            
-            status.write("Splitting documents into chunks...")
-            splitter = RecursiveCharacterTextSplitter(chunk_size=500, chunk_overlap=100)
-            chunks = splitter.split_documents(docs)
 
-            status.write("Creating embeddings and building FAISS index...")
-            embeddings = OpenAIEmbeddings(model="text-embedding-3-small")
-            
-            db = FAISS.from_documents(chunks, embedding=embeddings)
-            db.save_local(FAISS_PATH)
-            
-            status.update(label="Processing complete!", state="complete", expanded=False)
-            st.success(f"Created FAISS index with {len(chunks)} chunks from {len(pdf_files)} CVs")
-            return True
-        except Exception as e:
-            st.error(f"Error during ingestion: {str(e)}")
-            status.update(label="Ingestion failed.", state="error", expanded=True)
-            clear_faiss_index()
-            return False
+def ingest_cvs(data_path: str, faiss_path: str, progress=None, engine=None) -> dict:
+    """Bring a session's FAISS index in line with its CVs: embed new or changed ones, drop deleted ones.
 
-def query_cv(query_text: str) -> str:
-    """Query the CV database."""
-    with st.spinner("Searching CV database..."):
+    Unchanged CVs are neither parsed nor embedded again (see
+    incremental_ingest.sync_index), so the time taken follows the size of
+    the upload rather than of the whole pool. Uses the same index layout
+    and CV metadata as cvreader.ingest_cvs(). Runs as a background job
+    (start_ingest), so it must not call Streamlit itself; progress gets
+    per-file updates. If the sync fails, the index on disk stays as it was
+    (or at its last checkpoint), so earlier CVs remain searchable.
+    """
+    # Client retries off: BatchEmbedder backs off on 429s itself and lowers its concurrency.
+    embeddings = with_cache(make_embeddings(max_retries=0))
+    stats = sync_shards(data_path, faiss_path, embeddings, num_shards=SHARDS, chunk_size=500,
+                        chunk_overlap=100, index_type=INDEX_TYPE, rescore=RESCORE, enrich=cv_enricher(),
+                        progress=progress)
+    sync_cv_table(data_path, faiss_path)
+    if engine is not None and (stats["added"] or stats["updated"] or stats["removed"]):
+        # sync saved a new version; load it now so the first question doesn't wait for it.
         try:
-            if not check_faiss_index_exists():
-                return "No CV database found. Please process CVs first."
-                
-            embeddings = OpenAIEmbeddings(model="text-embedding-3-small")
-            db = FAISS.load_local(folder_path=FAISS_PATH, embeddings=embeddings, allow_dangerous_deserialization=True)
-            
-            llm = ChatOpenAI(model="gpt-4-turbo")
+            engine.refresh(force=True)
+        except FileNotFoundError:
+            pass  # every CV was removed
+    return stats
 
-            prompt = ChatPromptTemplate.from_template(
-                """You are an expert HR assistant analyzing CVs. Answer the question using only the provided context.
-                Context: {context}
-                Question: {input}
-                Provide clear, concise answers. When listing names, include all candidates found. Format names as bullet points when listing multiple candidates."""
-            )
 
-            retriever = db.as_retriever(search_kwargs={"k": 5})
-            chain = create_retrieval_chain(retriever, create_stuff_documents_chain(llm, prompt))
-            
-            response = chain.invoke({"input": query_text})
-            return response['answer'].strip()
+def start_ingest(session_id: str) -> str:
+    """Start ingest_cvs in the background and remember the job in the URL, so a browser refresh finds it."""
+    registry = get_registry()
+    data_path, faiss_path = registry.paths(session_id)
+    engine = registry.engine(session_id)
+    job_id = start_job(faiss_path, lambda progress: ingest_cvs(data_path, faiss_path, progress, engine))
+    st.query_params["job"] = job_id
+    return job_id
+
+
+@st.fragment(run_every=1.0)
+def show_job_progress(job_id: str, faiss_path: str):
+    """Poll a running job's saved progress; questions keep going to the previous index meanwhile."""
+    job = load_job(faiss_path, job_id)
+    if job is None or job["state"] not in ACTIVE_STATES:
+        st.rerun()  # finished: redraw the whole page with the new index
+    done, total = job_progress(job)
+    st.progress(done / total if total else 0.0, text=f"Processing CVs: {done}/{total} files")
+    for rel, state in sorted(job["files"].items()):
+        if state not in ("embedded", "removed"):
+            st.caption(f"{rel}: {state}")
+
+
+def show_job_result(job: dict):
+    if job["state"] == "done":
+        stats = job["stats"]
+        st.success(f"Embedded {stats['chunks_added']} chunks from {stats['added'] + stats['updated']} new CVs "
+                   f"({stats['unchanged']} already indexed, {stats['removed']} removed)")
+    elif job["state"] == "failed":
+        st.error(f"Error during ingestion: {job['error']}")
+    elif job["state"] == "interrupted":
+        st.warning("Processing was interrupted; click Process CVs to resume it.")
+
+@st.cache_resource
+def get_registry() -> SessionRegistry:
+    """Per-session query engines for this server process (one embeddings client and LLM shared by all).
+
+    A session's loaded index and chain stay in memory across reruns and
+    questions; they are only replaced when its index's version changes,
+    i.e. after ingest_cvs() saved a new index, or dropped when the least
+    recently used sessions are evicted (SESSIONS_MAX_MB, SESSIONS_SPILL,
+    SESSIONS_TTL_HOURS).
+    """
+    embeddings = make_embeddings()
+    llm = ChatOpenAI(model="gpt-4-turbo")
+
+    prompt = ChatPromptTemplate.from_template(
+        """You are an expert HR assistant analyzing CVs. Answer the question using only the provided context.
+        Context: {context}
+        Question: {input}
+        Provide clear, concise answers. When listing names, include all candidates found. Format names as bullet points when listing multiple candidates."""
+    )
+    # Loaded unmapped so the registry's memory cap counts what the indexes really use. No polling: a session's
+    # index only changes through ingest_cvs() in this process, which reloads the engine itself.
+    return SessionRegistry(CV_DATA_PATH, FAISS_PATH,
+                           lambda folder: RAGQueryEngine(folder, embeddings, llm, prompt, k=3, lazy=False,
+                                                         check_interval=None),
+                           release=forget_cv_table)
+
+def current_session() -> str:
+    """This browser session's ID, kept in the URL so a refresh returns to the same CVs."""
+    if "session_id" not in st.session_state:
+        session_id = st.query_params.get("session")
+        st.session_state.session_id = session_id if valid_session_id(session_id) else new_session_id()
+    st.query_params["session"] = st.session_state.session_id
+    return st.session_state.session_id
+
+def query_cv(query_text: str, session_id: str, screen_all: bool = False) -> str:
+    """Query the session's CVs; screen_all asks every candidate's CV in parallel and ranks them."""
+    with st.spinner("Searching CV database..."):
+        try:
+            engine = get_registry().engine(session_id)
+            if screen_all:
+                return format_ranking(screen_candidates(engine, query_text))
+            # Lists, counts and skill/experience filters come straight from the CV table, no LLM call; other
+            # questions naming candidates search only their CVs. Same routing as cvreader.py (cv_table.ask_cvs).
+            # No per-question load: the engine answers from the index it holds until the version changes.
+            return ask_cvs(engine, query_text)
+        except FileNotFoundError:
+            return "No CV database found. Please process CVs first."
         except Exception as e:
             return f"Error processing query: {str(e)}"
 
@@ -158,9 +226,10 @@ def main():
     st.title("📄 CV Analysis Assistant")
     st.markdown("Upload and analyze candidate CVs using AI")
     
-    if "cvs_ready" not in st.session_state:
-        # On first run, it will correctly be false because clean_on_exit deleted the files
-        st.session_state.cvs_ready = check_faiss_index_exists()
+    session_id = current_session()
+    data_path, faiss_path = get_registry().paths(session_id)
+    # Checked on every rerun: while a job builds, questions keep going to the previous index.
+    st.session_state.cvs_ready = check_faiss_index_exists(faiss_path)
     
     if "query_history" not in st.session_state:
         st.session_state.query_history = []
@@ -177,25 +246,35 @@ def main():
         
         if st.button("Process CVs", type="primary"):
             if uploaded_files:
-                st.session_state.cvs_ready = False
-                save_uploaded_files(uploaded_files)
-                
-                if ingest_cvs():
-                    st.session_state.cvs_ready = True
-                else:
-                    st.session_state.cvs_ready = False
-                
+                saved, skipped = save_uploaded_files(uploaded_files, data_path, faiss_path)
+                st.session_state.upload_note = f"{skipped} of the uploaded CVs were already indexed" if skipped else None
+                start_ingest(session_id)
                 st.rerun()
             else:
                 st.warning("Please upload at least one PDF file first")
         
         st.markdown("---")
         st.subheader("CV Status")
+        job_id = st.query_params.get("job")
+        job = load_job(faiss_path, job_id) if job_id else None
+        if job is not None and job["state"] in ACTIVE_STATES:
+            show_job_progress(job_id, faiss_path)
+        elif job is not None:
+            show_job_result(job)
+        if st.session_state.get("upload_note"):
+            st.info(st.session_state.upload_note)
         if st.session_state.cvs_ready:
             st.success("✅ CV database ready")
         else:
             st.warning("⚠️ No CV database found")
 
+        indexed = sorted(indexed_files(faiss_path))
+        if indexed:
+            to_remove = st.selectbox(f"{len(indexed)} CVs indexed", indexed)
+            if st.button("Remove CV"):
+                remove_cv(to_remove, session_id)
+                st.rerun()
+
         st.markdown("---")
         st.subheader("Example Questions")
         examples = ["List all candidate names", "Who has Python experience?"]
@@ -216,10 +295,12 @@ def main():
         )
         
         submit_disabled = not st.session_state.cvs_ready
-        
+        screen_all = st.checkbox("Screen every candidate", help="Ask the question of each CV in parallel and rank "
+                                                                 "the candidates (one LLM call per CV)")
+
         if st.button("Submit Query", disabled=submit_disabled):
             if query_text:
-                answer = query_cv(query_text)
+                answer = query_cv(query_text, session_id, screen_all)
                 st.session_state.query_history.append((query_text, answer))
                 st.rerun()
             else:
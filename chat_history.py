@@ -0,0 +1,115 @@
+#rolling chat history for Gemini: the last few turns go out verbatim, older ones are folded into a summary
+#in a background thread, and what is sent with each message stays within a token budget.
+
+import os
+import threading
+
+CHAT_RECENT_TURNS = int(os.getenv("CHAT_RECENT_TURNS", "6"))
+CHAT_TOKEN_BUDGET = int(os.getenv("CHAT_TOKEN_BUDGET", "2000"))
+
+SUMMARY_PROMPT = """You keep a running summary of a conversation between a user and an AI assistant.
+
+Summary so far:
+{summary}
+
+Exchanges to add:
+{turns}
+
+Write the updated summary in at most {words} words. Keep the facts, names, numbers, preferences, decisions
+and open questions the assistant may need later; drop greetings and small talk. Reply with the summary only."""
+
+
+def estimate_tokens(text: str) -> int:
+    # ~4 characters per token for English text; good enough for budgeting.
+    return len(text) // 4 + 1
+
+
+def _turn_tokens(turn: tuple) -> int:
+    return estimate_tokens(turn[0]) + estimate_tokens(turn[1])
+
+
+class ChatHistory:
+    """Drop-in for model.start_chat(history=[]) whose requests do not grow with the conversation.
+
+    send_message(text) sends the summary of older turns, the recent turns
+    verbatim and text. A turn leaves the verbatim window once there are
+    more than recent_turns of them or they no longer fit the budget left
+    after the summary; a worker thread then folds it into the summary with
+    summary_model (the chat model by default), so the user never waits for
+    it. Until that finishes the turn is still sent verbatim if it fits.
+    The summary itself is held to a quarter of token_budget.
+    """
+
+    def __init__(self, model, recent_turns: int = CHAT_RECENT_TURNS, token_budget: int = CHAT_TOKEN_BUDGET,
+                 summary_model=None):
+        self.model = model
+        self.summary_model = summary_model or model
+        self.recent_turns = max(recent_turns, 1)
+        self.token_budget = token_budget
+        self.summary = ""
+        self.turns = []  # (user, model) pairs sent verbatim, oldest first
+        self._folding = []  # turns out of the window, not yet in the summary
+        self._lock = threading.Lock()
+        self._summarizing = False
+
+    @property
+    def summary_budget(self) -> int:
+        return self.token_budget // 4
+
+    def contents(self) -> list:
+        """The history to send before the next message, as Gemini contents."""
+        with self._lock:
+            summary, turns = self.summary, self._folding + self.turns
+        used = estimate_tokens(summary) if summary else 0
+        kept = []
+        for turn in reversed(turns):
+            if kept and used + _turn_tokens(turn) > self.token_budget:
+                break  # the newest turn always goes, whatever its size
+            kept.append(turn)
+            used += _turn_tokens(turn)
+        contents = []
+        if summary:
+            contents.append({"role": "user", "parts": [f"Summary of our conversation so far:\n{summary}"]})
+            contents.append({"role": "model", "parts": ["Understood, I will keep that in mind."]})
+        for user, reply in reversed(kept):
+            contents.append({"role": "user", "parts": [user]})
+            contents.append({"role": "model", "parts": [reply]})
+        return contents
+
+    def send_message(self, message: str, **kwargs):
+        response = self.model.generate_content(self.contents() + [{"role": "user", "parts": [message]}], **kwargs)
+        self.add_turn(message, response.text)
+        return response
+
+    def add_turn(self, user: str, reply: str):
+        with self._lock:
+            self.turns.append((user, reply))
+            budget = self.token_budget - (estimate_tokens(self.summary) if self.summary else 0)
+            while len(self.turns) > 1 and (len(self.turns) > self.recent_turns
+                                           or sum(map(_turn_tokens, self.turns)) > budget):
+                self._folding.append(self.turns.pop(0))
+            if not self._folding or self._summarizing:
+                return
+            self._summarizing = True
+        threading.Thread(target=self._summarize, daemon=True, name="chat-summary").start()
+
+    def _summarize(self):
+        try:
+            while True:
+                with self._lock:
+                    summary, batch = self.summary, list(self._folding)
+                    if not batch:
+                        self._summarizing = False  # under the lock, so add_turn cannot queue a turn nobody folds
+                        return
+                turns = "\n\n".join(f"User: {user}\nAssistant: {reply}" for user, reply in batch)
+                prompt = SUMMARY_PROMPT.format(summary=summary or "(none yet)", turns=turns,
+                                               words=self.summary_budget * 3 // 4)
+                text = self.summary_model.generate_content(prompt).text.strip()
+                with self._lock:
+                    self.summary = text[:self.summary_budget * 4]
+                    del self._folding[:len(batch)]
+        except Exception as e:
+            # The turns stay queued (and sent verbatim while they fit); the next turn tries again.
+            print(f"⚠️ Could not summarize chat history: {e}")
+            with self._lock:
+                self._summarizing = False
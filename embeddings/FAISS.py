@@ -1,13 +1,14 @@
 #this is my faiss python program. 
 
-from langchain_community.document_loaders import PyPDFDirectoryLoader
-from langchain_text_splitters import RecursiveCharacterTextSplitter
 from langchain_google_genai import GoogleGenerativeAIEmbeddings, ChatGoogleGenerativeAI
-from langchain_community.vectorstores import FAISS
 from langchain_core.prompts import ChatPromptTemplate
-from langchain.chains.combine_documents import create_stuff_documents_chain
-from langchain.chains import create_retrieval_chain
 from dotenv import load_dotenv
+from ann_index import INDEX_TYPE, INDEX_TYPES, RESCORE
+from embedding_cache import with_cache
+from local_embeddings import EMBEDDING_BACKEND, LocalEmbeddings
+from query_engine import RAGQueryEngine
+from sharded_index import SHARDS, sync_shards
+import argparse
 import os
 
 # Load environment variables
@@ -18,52 +19,83 @@ GOOGLE_API_KEY = os.getenv("GOOGLE_API_KEY")
 DATA_PATH = "data"
 FAISS_PATH = "faiss_gemini"
 
-def ingest_documents():
-    """Load, split, embed, and save documents to FAISS."""
+def make_embeddings():
+    # EMBEDDING_BACKEND=local embeds on this machine, offline; the index is rebuilt on switching.
+    if EMBEDDING_BACKEND == "local":
+        return LocalEmbeddings()
+    return GoogleGenerativeAIEmbeddings(model='models/gemini-embedding-exp-03-07')
+
+def make_llm():
+    return ChatGoogleGenerativeAI(model='gemini-2.5-flash')
+
+def ingest_documents(incremental: bool = True, index_type: str = INDEX_TYPE, rescore: int = RESCORE,
+                     shards: int = SHARDS):
+    """Load, split, embed, and save documents to FAISS.
+
+    In incremental mode only new or changed PDFs are embedded and deleted ones
+    are removed from the index; otherwise the whole index is rebuilt.
+    index_type is one of ann_index.INDEX_TYPES (flat, ivf_flat, hnsw, ivf_pq, fp16, sq8);
+    rescore > 0 re-ranks rescore * k candidates of an approximate index exactly.
+    With shards > 1 the PDFs are spread over that many independently built
+    indexes, which the query engine searches in parallel.
+    """
     print("📥 Loading and processing documents...")
-    loader = PyPDFDirectoryLoader(DATA_PATH)
-    docs = loader.load()
-
-    splitter = RecursiveCharacterTextSplitter(chunk_size=1000, chunk_overlap=200)
-    chunks = splitter.split_documents(docs)
-
-    embeddings = GoogleGenerativeAIEmbeddings(model='models/gemini-embedding-exp-03-07')
-    db = FAISS.from_documents(chunks, embedding=embeddings)
-    db.save_local(FAISS_PATH)
-
+    embeddings = with_cache(make_embeddings())
+    stats = sync_shards(DATA_PATH, FAISS_PATH, embeddings, num_shards=shards, chunk_size=1000, chunk_overlap=200,
+                        rebuild=not incremental, index_type=index_type, rescore=rescore)
+
+    print(f"   {stats['added']} new, {stats['updated']} changed, {stats['removed']} removed, "
+          f"{stats['unchanged']} unchanged PDFs ({stats['chunks_added']} chunks embedded, "
+          f"{stats['chunks_removed']} dropped)")
+    if stats["chunks_deduplicated"]:
+        print(f"   ♻️ {stats['chunks_deduplicated']} near-duplicate chunks skipped")
+    if stats.get("chunks_per_sec"):
+        print(f"   ⚡ {stats['chunks_per_sec']:.1f} chunks/sec")
     print("✅ Embedding complete and saved to FAISS.")
 
-def load_db_and_query(query_text: str) -> str:
-    """Load FAISS DB and get answer for query."""
-    print("🔍 Loading vector database...")
-    embeddings = GoogleGenerativeAIEmbeddings(model='models/gemini-embedding-exp-03-07')
-    db = FAISS.load_local(folder_path=FAISS_PATH, embeddings=embeddings, allow_dangerous_deserialization=True)
-
-    llm = ChatGoogleGenerativeAI(model='gemini-2.5-flash')
+_engine = None
 
-    prompt = ChatPromptTemplate.from_template(
-        """
-        You are a helpful assistant. Use only the following context to answer the question.
-        Provide a clear and accurate answer.
+def get_query_engine() -> RAGQueryEngine:
+    """Build the query engine once; it reloads the index by itself after re-ingestion."""
+    global _engine
+    if _engine is None:
+        print("🔍 Loading vector database...")
+        embeddings = make_embeddings()
+        llm = make_llm()
 
-        Context:
-        {context}
+        prompt = ChatPromptTemplate.from_template(
+            """
+            You are a helpful assistant. Use only the following context to answer the question.
+            Provide a clear and accurate answer.
 
-        Question:
-        {input}
-        """
-    )
+            Context:
+            {context}
 
-    retriever = db.as_retriever(search_kwargs={"k": 5})
-    doc_chain = create_stuff_documents_chain(llm, prompt)
-    chain = create_retrieval_chain(retriever, doc_chain)
+            Question:
+            {input}
+            """
+        )
+        _engine = RAGQueryEngine(FAISS_PATH, embeddings, llm, prompt, k=3)
+    return _engine
 
-    response = chain.invoke({"input": query_text})
-    return response['answer'].strip()
+def load_db_and_query(query_text: str) -> str:
+    """Get answer for query from the warm FAISS DB."""
+    return get_query_engine().ask(query_text)
 
 if __name__ == "__main__":
-    # Step 1: Ingest documents (only once needed; comment after first run if needed)
-    ingest_documents()
+    parser = argparse.ArgumentParser(description="Temple RAG over the PDFs in data/")
+    parser.add_argument("--rebuild", action="store_true", help="re-embed every PDF instead of only the changed ones")
+    parser.add_argument("--index-type", choices=INDEX_TYPES, default=INDEX_TYPE,
+                        help="FAISS index to build (default: $FAISS_INDEX_TYPE or flat)")
+    parser.add_argument("--rescore", type=int, default=RESCORE,
+                        help="re-score N*k candidates against exact vectors, e.g. 4 with sq8 (default: $FAISS_RESCORE or 0)")
+    parser.add_argument("--shards", type=int, default=SHARDS,
+                        help="split the index into N shards searched in parallel (default: $FAISS_SHARDS or 1)")
+    args = parser.parse_args()
+
+    # Step 1: Ingest documents (cheap when nothing changed since the last run)
+    ingest_documents(incremental=not args.rebuild, index_type=args.index_type, rescore=args.rescore,
+                     shards=args.shards)
 
     # Step 2: Ask questions
     while True:
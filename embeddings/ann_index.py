@@ -0,0 +1,169 @@
+#FAISS index types for the vector stores: exact flat, IVF-Flat, HNSW, IVF-PQ and float16 / int8 scalar-quantized.
+
+import math
+import os
+
+import faiss
+import numpy as np
+from langchain_community.docstore.in_memory import InMemoryDocstore
+from langchain_community.vectorstores import FAISS
+
+from batch_embedder import BatchEmbedder
+
+INDEX_TYPES = ("flat", "ivf_flat", "hnsw", "ivf_pq", "fp16", "sq8")
+INDEX_TYPE = os.getenv("FAISS_INDEX_TYPE", "flat")
+# Re-score rescore * k candidates of an approximate index against exact float32 vectors (0 = off).
+RESCORE = int(os.getenv("FAISS_RESCORE", "0"))
+INDEX_PARAMS_NAME = "index_params.json"
+# IVF indexes are trained once this many vectors are embedded (or on all of them, for a smaller corpus).
+TRAIN_SIZE = int(os.getenv("FAISS_TRAIN_SIZE", "50000"))
+# ... but on no more than this many MB of float32 vectors, so wide embeddings train on fewer of them.
+TRAIN_MB = float(os.getenv("FAISS_TRAIN_MB", "256"))
+TRAINED_TYPES = ("ivf_flat", "ivf_pq")
+MIN_TRAIN = 39 * 4
+# An index trained on fewer than TRAIN_SIZE vectors is rebuilt once it holds this many times as many.
+RETRAIN_GROWTH = 4
+
+
+def _nlist_for(n: int) -> int:
+    # ~4*sqrt(n) lists, but keep at least 39 training points per centroid as FAISS recommends.
+    return max(1, min(int(4 * math.sqrt(n)), n // 39))
+
+
+def _pq_m_for(dim: int) -> int:
+    for m in (64, 48, 32, 16, 8, 4, 2):
+        if dim % m == 0:
+            return m
+    return 1
+
+
+def build_index(vectors: np.ndarray, index_type: str = INDEX_TYPE, rescore: int = 0, **params):
+    """Create (and train, if needed) an empty L2 index for vectors.
+
+    Returns (index, params) where params records everything needed to tune
+    the index at load time. Corpora too small to train the requested type
+    get a flat index instead.
+
+    fp16 and sq8 store each dimension in 2 bytes or 1 byte instead of 4.
+    With rescore > 0 an approximate index is wrapped in IndexRefineFlat,
+    which keeps the float32 vectors too and re-ranks rescore * k candidates
+    exactly. Only when the index is loaded memory-mapped are just the pages
+    of those candidates read, keeping the resident set to the compressed
+    codes; loaded into memory (lazy=False, FAISS_MMAP=0) it takes more than
+    a flat index.
+    """
+    index, saved = _build_base(vectors, index_type, **params)
+    if rescore and saved["index_type"] != "flat":
+        index = faiss.IndexRefineFlat(index)
+        index.k_factor = rescore
+        saved["rescore"] = rescore
+    return index, saved
+
+
+def _build_base(vectors: np.ndarray, index_type: str, **params):
+    if index_type not in INDEX_TYPES:
+        raise ValueError(f"Unknown FAISS index type {index_type!r}, expected one of {INDEX_TYPES}")
+    n, dim = vectors.shape
+    if index_type in TRAINED_TYPES and n < MIN_TRAIN:
+        print(f"⚠️ Only {n} vectors, too few to train {index_type}; using a flat index.")
+        index_type = "flat"
+
+    if index_type == "flat":
+        return faiss.IndexFlatL2(dim), {"index_type": "flat"}
+
+    if index_type in ("fp16", "sq8"):
+        qtype = faiss.ScalarQuantizer.QT_fp16 if index_type == "fp16" else faiss.ScalarQuantizer.QT_8bit
+        index = faiss.IndexScalarQuantizer(dim, qtype)
+        # sq8 learns a per-dimension min/max from the vectors; fp16 needs no training.
+        index.train(np.ascontiguousarray(vectors, dtype=np.float32))
+        return index, {"index_type": index_type}
+
+    if index_type == "hnsw":
+        m = params.get("M", 32)
+        index = faiss.IndexHNSWFlat(dim, m)
+        index.hnsw.efConstruction = params.get("efConstruction", 80)
+        index.hnsw.efSearch = params.get("efSearch", 64)
+        return index, {"index_type": "hnsw", "M": m, "efConstruction": index.hnsw.efConstruction,
+                       "efSearch": index.hnsw.efSearch}
+
+    nlist = params.get("nlist") or _nlist_for(n)
+    quantizer = faiss.IndexFlatL2(dim)
+    if index_type == "ivf_flat":
+        index = faiss.IndexIVFFlat(quantizer, dim, nlist)
+        saved = {"index_type": "ivf_flat", "nlist": nlist}
+    else:
+        m = params.get("m") or _pq_m_for(dim)
+        nbits = params.get("nbits") or (8 if n >= 256 * 39 else 6 if n >= 64 * 39 else 4)
+        index = faiss.IndexIVFPQ(quantizer, dim, nlist, m, nbits)
+        saved = {"index_type": "ivf_pq", "nlist": nlist, "m": m, "nbits": nbits}
+    index.train(np.ascontiguousarray(vectors, dtype=np.float32))
+    index.nprobe = params.get("nprobe") or max(1, nlist // 16)
+    saved["nprobe"] = index.nprobe
+    saved["trained_on"] = n
+    return index, saved
+
+
+def apply_search_params(index, params: dict):
+    """Set the query-time knobs (rescore / nprobe / efSearch) saved with the index."""
+    index = faiss.downcast_index(index)
+    if isinstance(index, faiss.IndexRefine):
+        index.k_factor = params.get("rescore", index.k_factor)
+        index = faiss.downcast_index(index.base_index)
+    if "nprobe" in params:
+        faiss.extract_index_ivf(index).nprobe = params["nprobe"]
+    if "efSearch" in params:
+        faiss.downcast_index(index).hnsw.efSearch = params["efSearch"]
+
+
+def train_limit(dim: int, train_size: int = TRAIN_SIZE, train_mb: float = TRAIN_MB) -> int:
+    """How many dim-dimensional vectors to train on: train_size, or as many as fit in train_mb."""
+    return max(MIN_TRAIN, min(train_size, int(train_mb * 2 ** 20) // (4 * dim)))
+
+
+def needs_retrain(params: dict, ntotal: int, index_type: str, train_size: int = TRAIN_SIZE) -> bool:
+    """True if an index built as index_type should be rebuilt now that it holds ntotal vectors.
+
+    That is an IVF index that fell back to flat for lack of training
+    vectors and now has enough, or one trained on fewer than train_size
+    vectors that has grown RETRAIN_GROWTH times past them (or to
+    train_size), so its centroids no longer describe the corpus.
+    """
+    if index_type not in TRAINED_TYPES:
+        return False
+    if params.get("index_type") == "flat":
+        return ntotal >= MIN_TRAIN
+    trained_on = params.get("trained_on")
+    return trained_on is not None and trained_on < train_size and ntotal >= min(train_size, RETRAIN_GROWTH * trained_on)
+
+
+def supports_remove(index) -> bool:
+    """True if remove_ids keeps the remaining vectors at contiguous positions.
+
+    Only flat-code indexes compact after a removal, which is what the
+    vector store's position -> docstore ID map assumes. IVF lists keep the
+    old labels and HNSW graphs cannot drop vectors at all, so deletes from
+    those require a rebuild; so do re-scored indexes, which FAISS cannot
+    remove from.
+    """
+    return isinstance(faiss.downcast_index(index), faiss.IndexFlatCodes)
+
+
+def vectorstore_from_embeddings(text_embeddings, embeddings, metadatas=None, ids=None,
+                                index_type: str = INDEX_TYPE, docstore=None, **params) -> FAISS:
+    """Like FAISS.from_embeddings, but with the configured index type (and docstore, in memory by default)."""
+    text_embeddings = list(text_embeddings)
+    vectors = np.array([v for _, v in text_embeddings], dtype=np.float32)
+    index, saved = build_index(vectors, index_type, **params)
+    db = FAISS(embeddings, index, docstore if docstore is not None else InMemoryDocstore(), {})
+    db.add_embeddings(text_embeddings, metadatas=metadatas, ids=ids)
+    db.index_params = saved
+    return db
+
+
+def vectorstore_from_documents(documents, embeddings, ids=None, index_type: str = INDEX_TYPE,
+                               batch_size: int = 100, max_in_flight: int = 4, **params) -> FAISS:
+    """Like FAISS.from_documents, embedding through a BatchEmbedder into the configured index type."""
+    texts = [d.page_content for d in documents]
+    vectors = BatchEmbedder(embeddings, batch_size=batch_size, max_in_flight=max_in_flight).embed(texts)
+    return vectorstore_from_embeddings(zip(texts, vectors), embeddings, metadatas=[d.metadata for d in documents],
+                                       ids=ids, index_type=index_type, **params)
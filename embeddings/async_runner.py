@@ -0,0 +1,41 @@
+#one long-lived asyncio loop in a daemon thread, for synchronous code that drives async API clients.
+
+import asyncio
+import os
+import threading
+
+_loop = None
+_loop_pid = None
+_lock = threading.Lock()
+
+
+def _shared_loop() -> asyncio.AbstractEventLoop:
+    global _loop, _loop_pid
+    with _lock:
+        if _loop is None or _loop_pid != os.getpid():  # a forked child has the loop but not its thread
+            _loop = asyncio.new_event_loop()
+            _loop_pid = os.getpid()
+            threading.Thread(target=_loop.run_forever, daemon=True, name="async-runner").start()
+        return _loop
+
+
+def run(coro):
+    """Run coro on the shared loop and wait for its result; safe to call from several threads at once.
+
+    Async HTTP clients (httpx pools, grpc aio channels) stay bound to the
+    loop they first ran on, so asyncio.run's fresh loop per call breaks
+    them from the second call on. Everything goes through this one loop.
+    """
+    loop = _shared_loop()
+    try:
+        running = asyncio.get_running_loop()
+    except RuntimeError:
+        running = None
+    if running is loop:
+        raise RuntimeError("async_runner.run() called from the shared loop itself; await the coroutine instead")
+    future = asyncio.run_coroutine_threadsafe(coro, loop)
+    try:
+        return future.result()
+    except BaseException:
+        future.cancel()  # e.g. Ctrl+C in the caller: stop the work rather than leave it running
+        raise
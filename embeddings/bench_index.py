@@ -0,0 +1,125 @@
+#compare FAISS index types on recall@k against the exact flat index, query latency and memory.
+#
+#   python bench_index.py --index faiss_gemini          # vectors of an existing index
+#   python bench_index.py --synthetic 100000 --dim 768  # clustered random vectors
+#   python bench_index.py --synthetic 100000 --types fp16 sq8 --rescore 4
+
+import argparse
+import time
+
+import faiss
+import numpy as np
+
+from ann_index import INDEX_TYPES, build_index
+
+
+def load_vectors(folder_path: str) -> np.ndarray:
+    index = faiss.read_index(f"{folder_path}/index.faiss")
+    ivf = faiss.try_extract_index_ivf(index)
+    if ivf is not None:
+        ivf.make_direct_map()
+    return index.reconstruct_n(0, index.ntotal)
+
+
+def synthetic_vectors(n: int, dim: int, seed: int = 0) -> np.ndarray:
+    """Gaussian clusters, closer to real embeddings than uniform noise."""
+    rng = np.random.default_rng(seed)
+    centers = rng.normal(size=(max(1, n // 100), dim)).astype(np.float32)
+    vectors = centers[rng.integers(len(centers), size=n)] + 0.3 * rng.normal(size=(n, dim)).astype(np.float32)
+    return vectors.astype(np.float32)
+
+
+def make_queries(vectors: np.ndarray, count: int, seed: int = 1) -> np.ndarray:
+    # Perturbed copies of stored vectors stand in for real questions.
+    rng = np.random.default_rng(seed)
+    picks = vectors[rng.integers(len(vectors), size=count)]
+    noise = rng.normal(scale=float(vectors.std()) * 0.1, size=picks.shape)
+    return (picks + noise).astype(np.float32)
+
+
+def measure(index, queries: np.ndarray, k: int):
+    """Return (ids, per-query latencies in ms), searching one query at a time like the app does."""
+    ids = np.empty((len(queries), k), dtype=np.int64)
+    latencies = []
+    for i, q in enumerate(queries):
+        start = time.perf_counter()
+        _, found = index.search(q[None, :], k)
+        latencies.append((time.perf_counter() - start) * 1000)
+        ids[i] = found[0]
+    return ids, np.array(latencies)
+
+
+def recall_at_k(found: np.ndarray, truth: np.ndarray) -> float:
+    hits = sum(len(set(f) & set(t)) for f, t in zip(found, truth))
+    return hits / truth.size
+
+
+def resident_bytes(index, mapped: bool = False) -> int:
+    """Bytes that must stay in RAM to search.
+
+    Loaded into memory (lazy=False, FAISS_MMAP=0, Windows, or when mapping
+    fails) that is the whole index. Only when it is memory-mapped is a
+    re-scoring index's float32 copy paged in per hit rather than resident.
+    """
+    index = faiss.downcast_index(index)
+    if mapped and isinstance(index, faiss.IndexRefine):
+        index = index.base_index
+    return len(faiss.serialize_index(index))
+
+
+def run(vectors: np.ndarray, index_types, k: int, n_queries: int, rescore: int = 0):
+    queries = make_queries(vectors, n_queries)
+    results = []
+    truth = None
+    runs = [(t, 0) for t in index_types] + [(t, rescore) for t in index_types if rescore and t != "flat"]
+    for index_type, k_factor in runs:
+        start = time.perf_counter()
+        index, params = build_index(vectors, index_type, rescore=k_factor)
+        index.add(vectors)
+        build_s = time.perf_counter() - start
+        found, latencies = measure(index, queries, k)
+        if truth is None:
+            truth = found  # flat always runs first
+        results.append({
+            "index": params["index_type"] + ("+rescore" if "rescore" in params else ""),
+            "params": {key: v for key, v in params.items() if key != "index_type"},
+            "build_s": build_s,
+            "recall": recall_at_k(found, truth),
+            "p50_ms": float(np.percentile(latencies, 50)),
+            "p99_ms": float(np.percentile(latencies, 99)),
+            "memory_mb": resident_bytes(index) / 1e6,
+            "mapped_mb": resident_bytes(index, mapped=True) / 1e6,
+            "disk_mb": len(faiss.serialize_index(index)) / 1e6,
+        })
+    return results
+
+
+def print_table(results, k: int):
+    flat_mb = results[0]["memory_mb"]
+    # memory MB is what a loaded index holds; mapped MB what stays resident memory-mapped (differs for +rescore).
+    print(f"{'index':<16} {'recall@' + str(k):>9} {'lost':>6} {'p50 ms':>8} {'p99 ms':>8} {'memory MB':>10} "
+          f"{'saved':>6} {'mapped MB':>10} {'disk MB':>8} {'build s':>8}  params")
+    for r in results:
+        print(f"{r['index']:<16} {r['recall']:>9.3f} {1 - r['recall']:>6.1%} {r['p50_ms']:>8.3f} {r['p99_ms']:>8.3f} "
+              f"{r['memory_mb']:>10.1f} {1 - r['memory_mb'] / flat_mb:>6.0%} {r['mapped_mb']:>10.1f} "
+              f"{r['disk_mb']:>8.1f} {r['build_s']:>8.2f}  {r['params']}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark FAISS index types")
+    source = parser.add_mutually_exclusive_group(required=True)
+    source.add_argument("--index", help="folder of an existing index (e.g. faiss_gemini) to take vectors from")
+    source.add_argument("--synthetic", type=int, help="number of synthetic vectors to generate")
+    parser.add_argument("--dim", type=int, default=768, help="dimension of synthetic vectors")
+    parser.add_argument("--types", nargs="+", choices=INDEX_TYPES, default=list(INDEX_TYPES))
+    parser.add_argument("-k", type=int, default=5)
+    parser.add_argument("--queries", type=int, default=500)
+    parser.add_argument("--rescore", type=int, default=0,
+                        help="also run each approximate type re-scoring N*k candidates exactly")
+    args = parser.parse_args()
+
+    vectors = load_vectors(args.index) if args.index else synthetic_vectors(args.synthetic, args.dim)
+    faiss.omp_set_num_threads(1)  # single-query latency, as in the apps
+    types = ["flat"] + [t for t in args.types if t != "flat"]
+    print(f"📊 {len(vectors)} vectors of dim {vectors.shape[1]}, {args.queries} queries")
+    print_table(run(vectors, types, args.k, args.queries, args.rescore), args.k)
@@ -0,0 +1,186 @@
+#offline benchmark of the temple (embeddings/FAISS.py) and CV (CV PDF READER/cvreader.py) RAG pipelines.
+#
+#Runs the real ingest_documents/load_db_and_query and ingest_cvs/query_cv code on a synthetic PDF corpus,
+#with deterministic local stand-ins for the embedding and chat models, so no API key or network is needed.
+#
+#   python bench_rag.py --pdfs 200 --pages 5
+#   python bench_rag.py --json before.json ... then later ... --compare before.json
+
+import argparse
+import importlib.util
+import json
+import os
+import random
+import shutil
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+PIPELINES = {
+    "temple": (os.path.join(HERE, "FAISS.py"), "ingest_documents", "load_db_and_query", "DATA_PATH"),
+    "cv": (os.path.join(HERE, "..", "CV PDF READER", "cvreader.py"), "ingest_cvs", "query_cv", "CV_DATA_PATH"),
+}
+WORDS = ("temple goddess kali shrine pilgrims festival valley river stone priest offering ritual history "
+         "python engineer project manager experience university degree skills data analysis team lead "
+         "kathmandu nepal dakshinkali pharping saturday tuesday animal sacrifice worship mountain").split()
+NAMES = ["Asha Gurung", "Bikash Thapa", "Chandra Rai", "Deepa Shrestha", "Eshan Karki", "Fulmaya Tamang"]
+
+
+def _pdf_escape(text: str) -> str:
+    return text.replace("\\", "\\\\").replace("(", "\\(").replace(")", "\\)")
+
+
+def write_pdf(path: str, pages: list):
+    """Write a minimal text PDF (one list of lines per page) that pypdf can extract."""
+    objects = ["<< /Type /Catalog /Pages 2 0 R >>", None, "<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>"]
+    page_ids = []
+    for lines in pages:
+        body = "BT /F1 10 Tf 12 TL 40 800 Td " + " ".join(f"({_pdf_escape(line)}) '" for line in lines) + " ET"
+        objects.append(f"<< /Length {len(body)} >>\nstream\n{body}\nendstream")
+        objects.append(f"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 595 842] "
+                       f"/Resources << /Font << /F1 3 0 R >> >> /Contents {len(objects)} 0 R >>")
+        page_ids.append(len(objects))
+    objects[1] = f"<< /Type /Pages /Kids [{' '.join(f'{i} 0 R' for i in page_ids)}] /Count {len(page_ids)} >>"
+
+    out = bytearray(b"%PDF-1.4\n")
+    offsets = []
+    for number, obj in enumerate(objects, start=1):
+        offsets.append(len(out))
+        out += f"{number} 0 obj\n{obj}\nendobj\n".encode("latin-1")
+    xref = len(out)
+    out += f"xref\n0 {len(objects) + 1}\n0000000000 65535 f \n".encode("latin-1")
+    out += "".join(f"{o:010d} 00000 n \n" for o in offsets).encode("latin-1")
+    out += f"trailer\n<< /Size {len(objects) + 1} /Root 1 0 R >>\nstartxref\n{xref}\n%%EOF\n".encode("latin-1")
+    with open(path, "wb") as f:
+        f.write(out)
+
+
+def make_corpus(folder: str, n_pdfs: int, pages_per_pdf: int, seed: int = 0) -> int:
+    """Generate n_pdfs synthetic PDFs; returns the total page count."""
+    rng = random.Random(seed)
+    os.makedirs(folder, exist_ok=True)
+    for i in range(n_pdfs):
+        name = NAMES[i % len(NAMES)] + f" {i}"
+        pages = [[name] + [" ".join(rng.choice(WORDS) for _ in range(12)) for _ in range(60)]
+                 for _ in range(pages_per_pdf)]
+        write_pdf(os.path.join(folder, f"doc_{i:05d}.pdf"), pages)
+    return n_pdfs * pages_per_pdf
+
+
+def load_pipeline(path: str, name: str):
+    spec = importlib.util.spec_from_file_location(f"bench_{name}", path)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+def folder_size(path: str) -> int:
+    return sum(os.path.getsize(os.path.join(root, f)) for root, _, files in os.walk(path) for f in files)
+
+
+def bench_pipeline(name: str, workdir: str, n_pdfs: int, pages: int, n_queries: int, dim: int) -> dict:
+    from langchain_core.embeddings import DeterministicFakeEmbedding
+    from langchain_core.language_models import FakeListChatModel
+    from parallel_loader import iter_split_pdfs
+
+    path, ingest_name, query_name, data_attr = PIPELINES[name]
+    module = load_pipeline(path, name)
+    data_path = os.path.join(workdir, f"{name}_data")
+    index_path = os.path.join(workdir, f"{name}_index")
+    total_pages = make_corpus(data_path, n_pdfs, pages)
+    setattr(module, data_attr, data_path)
+    module.FAISS_PATH = index_path
+    module.make_embeddings = lambda **kwargs: DeterministicFakeEmbedding(size=dim)
+    module.make_llm = lambda: FakeListChatModel(responses=["stub answer"])
+
+    # Parse/split alone, through the same loader ingestion uses.
+    chunk_size = 1000 if name == "temple" else 500
+    start = time.perf_counter()
+    pdfs = [os.path.join(data_path, f) for f in sorted(os.listdir(data_path))]
+    chunk_count = sum(len(chunks) for _, chunks, _ in iter_split_pdfs(pdfs, chunk_size, chunk_size // 5))
+    parse_s = time.perf_counter() - start
+
+    start = time.perf_counter()
+    if name == "temple":
+        module.ingest_documents(incremental=False)
+    else:
+        module.ingest_cvs()
+    ingest_s = time.perf_counter() - start
+
+    start = time.perf_counter()
+    engine = module.get_query_engine()
+    engine.refresh(force=True)
+    load_s = time.perf_counter() - start
+
+    rng = random.Random(1)
+    queries = [" ".join(rng.choice(WORDS) for _ in range(6)) for _ in range(n_queries)]
+    retrieval_ms, query_ms = [], []
+    for q in queries:
+        start = time.perf_counter()
+        engine.retrieve(q)
+        retrieval_ms.append((time.perf_counter() - start) * 1000)
+        start = time.perf_counter()
+        getattr(module, query_name)(q)
+        query_ms.append((time.perf_counter() - start) * 1000)
+
+    return {
+        "pdfs": n_pdfs,
+        "pages": total_pages,
+        "chunks": chunk_count,
+        "pages_per_sec": total_pages / parse_s,
+        "chunks_per_sec": chunk_count / ingest_s,
+        "index_build_s": ingest_s,
+        "index_size_mb": folder_size(index_path) / 1e6,
+        "load_s": load_s,
+        "retrieval_p50_ms": float(np.percentile(retrieval_ms, 50)),
+        "retrieval_p99_ms": float(np.percentile(retrieval_ms, 99)),
+        "query_p50_ms": float(np.percentile(query_ms, 50)),
+    }
+
+
+def print_results(results: dict, baseline: dict | None = None):
+    for name, metrics in results.items():
+        print(f"\n📊 {name}")
+        for key, value in metrics.items():
+            line = f"  {key:<18} {value:>12.3f}" if isinstance(value, float) else f"  {key:<18} {value:>12}"
+            old = (baseline or {}).get(name, {}).get(key)
+            if isinstance(value, float) and old:
+                line += f"   ({(value - old) / old * 100:+.1f}% vs baseline)"
+            print(line)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Offline RAG benchmark with stub embedding and chat models")
+    parser.add_argument("--pipelines", nargs="+", choices=list(PIPELINES), default=list(PIPELINES))
+    parser.add_argument("--pdfs", type=int, default=50)
+    parser.add_argument("--pages", type=int, default=4, help="pages per PDF")
+    parser.add_argument("--queries", type=int, default=100)
+    parser.add_argument("--dim", type=int, default=768, help="stub embedding dimension")
+    parser.add_argument("--workdir", help="keep the corpus and indexes here instead of a temp folder")
+    parser.add_argument("--json", help="write the results to this file")
+    parser.add_argument("--compare", help="baseline results file to compare against")
+    args = parser.parse_args()
+
+    workdir = args.workdir or tempfile.mkdtemp(prefix="bench_rag_")
+    # Keep the shared embedding and page caches out of it; set before the pipelines import them.
+    os.environ["EMBEDDING_CACHE_PATH"] = os.path.join(workdir, "embedding_cache.sqlite")
+    os.environ["PAGE_CACHE_PATH"] = os.path.join(workdir, "page_cache.sqlite")
+    sys.path.insert(0, HERE)
+    try:
+        results = {name: bench_pipeline(name, workdir, args.pdfs, args.pages, args.queries, args.dim)
+                   for name in args.pipelines}
+    finally:
+        if not args.workdir:
+            shutil.rmtree(workdir, ignore_errors=True)
+
+    baseline = None
+    if args.compare:
+        with open(args.compare, "r", encoding="utf-8") as f:
+            baseline = json.load(f)
+    print_results(results, baseline)
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=2)
@@ -0,0 +1,140 @@
+#compact BM25 inverted index over the chunks of a FAISS index, keyed by FAISS row.
+
+import bisect
+import math
+import os
+import re
+from array import array
+from collections import Counter
+
+import numpy as np
+
+BM25_NAME = "bm25.npz"
+_TOKEN = re.compile(r"\w+", re.UNICODE)
+_STOPWORDS = frozenset(
+    "a an and are as at be by for from has have in is it its of on or that the this to was were will with "
+    "who what which when where how do does did i you he she they we".split()
+)
+
+
+def tokenize(text: str) -> list:
+    return [t for t in _TOKEN.findall(text.lower()) if t not in _STOPWORDS]
+
+
+def _pack_terms(terms: list) -> tuple:
+    """Sorted terms as one UTF-8 blob plus offsets, so one long token (a URL, a hash) costs its own length only."""
+    encoded = [term.encode("utf-8") for term in terms]
+    offsets = np.zeros(len(encoded) + 1, dtype=np.int64)
+    offsets[1:] = np.cumsum([len(term) for term in encoded])
+    return np.frombuffer(b"".join(encoded), dtype=np.uint8), offsets
+
+
+class BM25Builder:
+    """Collects postings one chunk at a time in flat arrays, 10 bytes per (term, chunk) pair.
+
+    Rows are numbered in the order chunks are added; finish() sorts the
+    postings by term into a BM25Index.
+    """
+
+    def __init__(self):
+        self._term_ids = {}
+        self._terms = array("i")
+        self._rows = array("i")
+        self._tfs = array("H")
+        self._doc_len = array("i")
+
+    def add(self, text: str):
+        row = len(self._doc_len)
+        counts = Counter(tokenize(text))
+        self._doc_len.append(sum(counts.values()))
+        for term, tf in counts.items():
+            self._terms.append(self._term_ids.setdefault(term, len(self._term_ids)))
+            self._rows.append(row)
+            self._tfs.append(min(tf, 65535))
+
+    def finish(self) -> "BM25Index":
+        terms = sorted(self._term_ids)
+        rank = np.empty(len(terms), dtype=np.int64)
+        rank[[self._term_ids[t] for t in terms]] = np.arange(len(terms))
+        keys = rank[np.frombuffer(self._terms, dtype=np.int32)]
+        order = np.argsort(keys, kind="stable")  # stable: rows stay ascending within a term
+        offsets = np.zeros(len(terms) + 1, dtype=np.int64)
+        offsets[1:] = np.cumsum(np.bincount(keys, minlength=len(terms)))
+        return BM25Index(*_pack_terms(terms), offsets, np.frombuffer(self._rows, dtype=np.int32)[order],
+                         np.frombuffer(self._tfs, dtype=np.uint16)[order],
+                         np.frombuffer(self._doc_len, dtype=np.int32).copy())
+
+
+class BM25Index:
+    """Okapi BM25 over a fixed set of documents.
+
+    Postings are stored as flat numpy arrays (rows int32, term frequencies
+    uint16) sliced by a per-term offset table, which keeps the file a
+    fraction of the size of the texts and makes lookups a binary search.
+    The sorted terms are one UTF-8 blob cut by term_offsets; UTF-8 byte
+    order is code point order, so the search compares encoded terms.
+    """
+
+    def __init__(self, term_blob, term_offsets, offsets, rows, tfs, doc_len, k1: float = 1.5, b: float = 0.75):
+        self.term_blob = term_blob
+        self.term_offsets = term_offsets
+        self.offsets = offsets
+        self.rows = rows
+        self.tfs = tfs
+        self.doc_len = doc_len
+        self.k1 = k1
+        self.b = b
+        self.avgdl = float(doc_len.mean()) if len(doc_len) else 0.0
+
+    @classmethod
+    def build(cls, texts) -> "BM25Index":
+        builder = BM25Builder()
+        for text in texts:
+            builder.add(text)
+        return builder.finish()
+
+    def save(self, folder_path: str):
+        with open(os.path.join(folder_path, BM25_NAME), "wb") as f:
+            np.savez(f, term_blob=self.term_blob, term_offsets=self.term_offsets, offsets=self.offsets,
+                     rows=self.rows, tfs=self.tfs, doc_len=self.doc_len)
+
+    @classmethod
+    def load(cls, folder_path: str) -> "BM25Index | None":
+        path = os.path.join(folder_path, BM25_NAME)
+        if not os.path.exists(path):
+            return None
+        with np.load(path) as data:
+            # Files written before the blob layout hold a fixed-width unicode "terms" array.
+            terms = (data["term_blob"], data["term_offsets"]) if "term_blob" in data.files \
+                else _pack_terms(data["terms"].tolist())
+            return cls(*terms, data["offsets"], data["rows"], data["tfs"], data["doc_len"])
+
+    def _term(self, i: int) -> bytes:
+        return self.term_blob[self.term_offsets[i]:self.term_offsets[i + 1]].tobytes()
+
+    def _postings(self, term: str):
+        key = term.encode("utf-8")
+        count = len(self.term_offsets) - 1
+        i = bisect.bisect_left(range(count), key, key=self._term)
+        if i >= count or self._term(i) != key:
+            return None
+        return self.rows[self.offsets[i]:self.offsets[i + 1]], self.tfs[self.offsets[i]:self.offsets[i + 1]]
+
+    def search(self, query: str, k: int = 20, only=None) -> list:
+        """Return up to k (row, score) pairs, best first; only (sorted rows) restricts the candidates."""
+        n = len(self.doc_len)
+        scores = {}
+        for term in set(tokenize(query)):
+            postings = self._postings(term)
+            if postings is None:
+                continue
+            rows, tfs = postings
+            idf = math.log(1 + (n - len(rows) + 0.5) / (len(rows) + 0.5))
+            if only is not None:
+                keep = np.isin(rows, only, assume_unique=True)
+                rows, tfs = rows[keep], tfs[keep]
+            tf = tfs.astype(np.float32)
+            norm = self.k1 * (1 - self.b + self.b * self.doc_len[rows] / (self.avgdl or 1.0))
+            for row, s in zip(rows.tolist(), (idf * tf * (self.k1 + 1) / (tf + norm)).tolist()):
+                scores[row] = scores.get(row, 0.0) + s
+        return sorted(scores.items(), key=lambda item: item[1], reverse=True)[:k]
@@ -0,0 +1,114 @@
+#post-retrieval compaction: merge overlapping chunks, drop duplicates, cut weak hits and fit a token budget.
+
+import re
+from typing import Any
+
+from langchain_core.callbacks import CallbackManagerForRetrieverRun
+from langchain_core.documents import Document
+from langchain_core.retrievers import BaseRetriever
+
+
+def estimate_tokens(text: str) -> int:
+    # ~4 characters per token for English text; good enough for budgeting.
+    return len(text) // 4 + 1
+
+
+def _norm(text: str) -> str:
+    return re.sub(r"\s+", " ", text).strip()
+
+
+def _overlap(left: str, right: str, min_overlap: int = 20) -> int:
+    """Length of the longest suffix of left that is also a prefix of right."""
+    for size in range(min(len(left), len(right)), min_overlap - 1, -1):
+        if left.endswith(right[:size]):
+            return size
+    return 0
+
+
+def _merge(group: list) -> list:
+    """Merge chunks of one source page that overlap or touch; returns (text, score) pieces."""
+    if all("start_index" in d.metadata for d in group):
+        group = sorted(group, key=lambda d: d.metadata["start_index"])
+    pieces = []
+    for doc in group:
+        text, score = doc.page_content, doc.metadata.get("score", 0.0)
+        start = doc.metadata.get("start_index")
+        if pieces:
+            prev = pieces[-1]
+            if start is not None and prev["end"] is not None and start <= prev["end"]:
+                cut = prev["end"] - start
+                prev["text"] += text[cut:]
+                prev["end"] = max(prev["end"], start + len(text))
+                prev["score"] = max(prev["score"], score)
+                continue
+            size = _overlap(prev["text"], text)
+            if size:
+                prev["text"] += text[size:]
+                prev["end"] = None if start is None else start + len(text)
+                prev["score"] = max(prev["score"], score)
+                continue
+        pieces.append({"text": text, "score": score, "end": None if start is None else start + len(text),
+                       "metadata": doc.metadata})
+    return pieces
+
+
+def compact_documents(docs: list, token_budget: int = 1500, min_score_ratio: float = 0.5,
+                      max_docs: int | None = None) -> list:
+    """Turn ranked retrieval results into a shorter, de-duplicated context.
+
+    docs must be ordered best first with a higher-is-better metadata["score"].
+    Results below min_score_ratio are dropped (adaptive k): measured by
+    metadata["relevance"] where the retriever sets it (see
+    channel_relevance; fused RRF scores say little about how good a hit is),
+    otherwise by score relative to the best one. The rest are grouped by
+    source and page, merged where they overlap, stripped of duplicates, and
+    added best first until token_budget is spent.
+    """
+    if not docs:
+        return []
+    if all("relevance" in d.metadata for d in docs):
+        kept = [d for d in docs if d.metadata["relevance"] >= min_score_ratio]
+    else:
+        best = max(d.metadata.get("score", 0.0) for d in docs)
+        kept = [d for d in docs if best <= 0 or d.metadata.get("score", 0.0) >= best * min_score_ratio]
+
+    groups = {}
+    for doc in kept:
+        key = (doc.metadata.get("source"), doc.metadata.get("page"))
+        groups.setdefault(key, []).append(doc)
+    pieces = [piece for group in groups.values() for piece in _merge(group)]
+    pieces.sort(key=lambda p: p["score"], reverse=True)
+
+    seen, results, used = [], [], 0
+    for piece in pieces:
+        norm = _norm(piece["text"])
+        if any(norm in other for other in seen):
+            continue  # duplicate or contained in a better piece
+        tokens = estimate_tokens(piece["text"])
+        if used + tokens > token_budget:
+            remaining = token_budget - used
+            if remaining < 100:
+                break
+            piece["text"] = piece["text"][:remaining * 4]
+            tokens = remaining
+        seen.append(norm)
+        metadata = {key: value for key, value in piece["metadata"].items() if key != "start_index"}
+        metadata["score"] = piece["score"]
+        results.append(Document(page_content=piece["text"], metadata=metadata))
+        used += tokens
+        if max_docs and len(results) >= max_docs:
+            break
+    return results
+
+
+class CompactingRetriever(BaseRetriever):
+    """Wraps a scored retriever (e.g. HybridRetriever) and compacts what it returns."""
+
+    base: Any
+    token_budget: int = 1500
+    min_score_ratio: float = 0.5
+    max_docs: int | None = None
+
+    def _get_relevant_documents(self, query: str, *, run_manager: CallbackManagerForRetrieverRun) -> list:
+        docs = self.base.invoke(query)
+        return compact_documents(docs, self.token_budget, self.min_score_ratio, self.max_docs)
@@ -0,0 +1,66 @@
+#per-CV metadata recorded at ingest (file, candidate, upload batch) and candidate filters for questions.
+
+import os
+import re
+import time
+
+_NAME_LINE = re.compile(r"^[A-Z][A-Za-z'.\-]+(?: [A-Z][A-Za-z'.\-]+){1,3}$")
+_NOT_A_NAME = {"curriculum", "vitae", "resume", "résumé", "cv", "profile", "contact", "summary", "page"}
+# Questions that weigh the named candidates against the rest need everyone's chunks, not only theirs.
+_COMPARATIVE = re.compile(r"\b(?:compar\w*|versus|vs|others|other (?:candidates?|applicants?|people|cvs)|the rest|"
+                          r"everyone|everybody|anyone else|all (?:the )?(?:candidates?|applicants?)|rank\w*|"
+                          r"(?:best|strongest|most suitable) (?:candidate|applicant|fit|choice))\b", re.IGNORECASE)
+
+
+def guess_candidate(rel_path: str, first_page_text: str) -> str:
+    """The candidate's name: the first name-like line of the CV, else the file name."""
+    for line in first_page_text.splitlines()[:8]:
+        line = " ".join(line.split())
+        if _NAME_LINE.match(line) and not _NOT_A_NAME & {w.lower() for w in line.split()}:
+            return line
+    stem = os.path.splitext(os.path.basename(rel_path))[0]
+    words = [w for w in re.split(r"[\s_\-.]+", stem) if w and w.lower() not in _NOT_A_NAME]
+    return " ".join(words).title() or stem
+
+
+def cv_enricher(batch: str | None = None):
+    """Return an enrich(rel_path, chunks) hook for sync_index that tags every chunk of a CV.
+
+    All CVs added in one ingest run share the same batch label (by default
+    the time the run started).
+    """
+    batch = batch or time.strftime("%Y-%m-%d %H:%M")
+
+    def enrich(rel_path: str, chunks: list):
+        first = min(chunks, key=lambda c: (c.metadata.get("page", 0), c.metadata.get("start_index", 0)),
+                    default=None)
+        candidate = guess_candidate(rel_path, first.page_content if first else "")
+        for chunk in chunks:
+            chunk.metadata.update({"file": rel_path, "candidate": candidate, "batch": batch})
+
+    return enrich
+
+
+def candidate_filter(query_text: str, candidates: list) -> dict | None:
+    """{"candidate": [...]} for the candidates named in a question, or None if it names nobody."""
+    text = query_text.casefold()
+    named = [c for c in candidates if re.search(rf"\b{re.escape(c.casefold())}\b", text)]
+    if not named:
+        # A first name alone counts when only one candidate has it.
+        by_first = {}
+        for c in candidates:
+            by_first.setdefault(c.split()[0].casefold(), []).append(c)
+        named = [cs[0] for first, cs in by_first.items()
+                 if len(cs) == 1 and len(first) > 2 and re.search(rf"\b{re.escape(first)}\b", text)]
+    return {"candidate": named} if named else None
+
+
+def question_filter(query_text: str, candidates: list) -> dict | None:
+    """The metadata filter to retrieve a question's context with: candidate_filter, unless it compares.
+
+    "How does Asha compare to the others?" names only Asha but needs the
+    other CVs too, so comparisons and rankings search every CV.
+    """
+    if _COMPARATIVE.search(query_text):
+        return None
+    return candidate_filter(query_text, candidates)
@@ -0,0 +1,78 @@
+#map-reduce screening: one question asked of every candidate's CV concurrently, answers merged into a ranking.
+
+import asyncio
+import re
+
+from langchain.chains.combine_documents import create_stuff_documents_chain
+from langchain_core.prompts import ChatPromptTemplate
+
+import async_runner
+
+MAP_PROMPT = ChatPromptTemplate.from_template(
+    """You are an expert HR assistant screening one candidate, {candidate}. Answer the question using only
+    these excerpts from their CV.
+
+    Context: {context}
+
+    Question: {input}
+
+    Start your reply with "Score: N", where N from 0 to 10 is how well {candidate} matches the question,
+    then give one or two sentences of evidence from the CV."""
+)
+_SCORE = re.compile(r"\**score\**\s*[:=]\s*\**(\d+(?:\.\d+)?)(?:\s*/\s*10)?\**", re.IGNORECASE)
+
+
+def parse_score(text: str) -> tuple:
+    """(score, the rest of the answer) from a map step reply; a reply without a score ranks last."""
+    match = _SCORE.search(text)
+    if match is None:
+        return 0.0, text.strip()
+    return min(float(match.group(1)), 10.0), (text[:match.start()] + text[match.end():]).strip().lstrip(".,:-").strip()
+
+
+async def ascreen_candidates(engine, query_text: str, candidates: list | None = None,
+                             max_concurrency: int = 8, llm=None) -> list:
+    """Ask query_text of each candidate's own chunks in parallel and rank the answers.
+
+    The map step retrieves each candidate's best chunks (metadata filter on
+    "candidate", with the question embedded only once) and asks the LLM
+    about that candidate alone; at most max_concurrency of them run at a
+    time. The reduce step sorts by the score each answer starts with, so it
+    costs no further LLM call and total time is about one LLM round trip
+    per max_concurrency candidates. Returns dicts with candidate, score,
+    answer and files, best first.
+    """
+    candidates = candidates if candidates is not None else engine.metadata_values("candidate")
+    chain = create_stuff_documents_chain(llm or engine.llm, MAP_PROMPT)
+    vector = await asyncio.to_thread(engine.embeddings.embed_query, query_text)
+    limit = asyncio.Semaphore(max_concurrency)
+
+    async def screen_one(candidate: str):
+        async with limit:
+            docs = await asyncio.to_thread(engine.retrieve, query_text, {"candidate": candidate}, vector)
+            if not docs:
+                return None
+            reply = await chain.ainvoke({"input": query_text, "context": docs, "candidate": candidate})
+        score, answer = parse_score(reply)
+        files = sorted({doc.metadata["file"] for doc in docs if "file" in doc.metadata})
+        return {"candidate": candidate, "score": score, "answer": answer, "files": files}
+
+    results = await asyncio.gather(*(screen_one(c) for c in candidates))
+    return sorted((r for r in results if r is not None), key=lambda r: (-r["score"], r["candidate"]))
+
+
+def screen_candidates(engine, query_text: str, candidates: list | None = None, max_concurrency: int = 8,
+                      llm=None) -> list:
+    """ascreen_candidates for synchronous callers (CLI, Streamlit script thread).
+
+    Runs on async_runner's shared loop: the LLM's async HTTP client is
+    shared by every screening in the process and stays bound to one loop.
+    """
+    return async_runner.run(ascreen_candidates(engine, query_text, candidates, max_concurrency, llm))
+
+
+def format_ranking(results: list) -> str:
+    if not results:
+        return "No candidates to screen."
+    return "\n".join(f"{i}. **{r['candidate']}** ({r['score']:g}/10): {r['answer']}"
+                     for i, r in enumerate(results, 1))
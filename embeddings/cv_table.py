@@ -0,0 +1,313 @@
+#one structured record per CV (name, contact, skills, experience, education) in a parquet table, and a
+#router that answers aggregate questions ("list all candidates", "who knows Python?") from it without the LLM.
+
+import os
+import re
+
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+from cv_metadata import candidate_filter, guess_candidate, question_filter
+from page_cache import DEFAULT_PAGE_CACHE_PATH, PAGE_CACHE
+from parallel_loader import load_pages
+from sharded_index import indexed_files
+
+CV_TABLE_NAME = "cv_table.parquet"
+SCHEMA = pa.schema([
+    ("file", pa.string()),
+    ("sha256", pa.string()),
+    ("name", pa.string()),
+    ("email", pa.string()),
+    ("phone", pa.string()),
+    ("skills", pa.list_(pa.string())),
+    ("years_experience", pa.float32()),
+    ("education", pa.list_(pa.string())),
+])
+# Canonical spelling -> pattern. Single letters and words like "go" are left out, they match too much prose.
+SKILLS = {
+    "Python": r"python", "Java": r"java(?!\s*script)", "JavaScript": r"java\s*script|\bjs", "TypeScript": r"typescript",
+    "C++": r"c\+\+", "C#": r"c#", "Golang": r"golang", "Rust": r"rust", "SQL": r"sql|mysql|postgres(?:ql)?",
+    "NoSQL": r"nosql|mongodb", "HTML": r"html5?", "CSS": r"css3?", "React": r"react(?:\.js|js)?",
+    "Node.js": r"node(?:\.js|js)", "Django": r"django", "Flask": r"flask", "FastAPI": r"fastapi",
+    "Machine Learning": r"machine learning|\bml", "Deep Learning": r"deep learning", "NLP": r"nlp|natural language processing",
+    "Computer Vision": r"computer vision", "PyTorch": r"pytorch", "TensorFlow": r"tensorflow", "Keras": r"keras",
+    "scikit-learn": r"scikit-learn|sklearn", "Pandas": r"pandas", "NumPy": r"numpy", "LangChain": r"langchain",
+    "LLM": r"llms?|large language models?", "Spark": r"spark|pyspark", "Hadoop": r"hadoop", "Docker": r"docker",
+    "Kubernetes": r"kubernetes|k8s", "AWS": r"aws|amazon web services", "Azure": r"azure", "GCP": r"gcp|google cloud",
+    "Linux": r"linux", "Git": r"git(?:hub|lab)?", "Excel": r"excel", "Tableau": r"tableau", "Power BI": r"power\s*bi",
+    "Data Analysis": r"data analy(?:sis|tics)", "Statistics": r"statistics", "Project Management": r"project management",
+    "Agile": r"agile|scrum", "Communication": r"communication",
+}
+# All skills in one alternation with a named group each, so a CV is scanned once rather than once per skill.
+_SKILL_NAMES = list(SKILLS)
+_SKILL_RE = re.compile(r"(?<![\w+#])(?:" + "|".join(f"(?P<s{i}>{pattern})" for i, pattern in enumerate(SKILLS.values()))
+                       + r")(?![\w+#])", re.IGNORECASE)
+_EMAIL = re.compile(r"[\w.+-]+@[\w-]+(?:\.[\w-]+)+")
+_PHONE = re.compile(r"(?<!\w)\+?\d[\d\s().-]{7,}\d(?!\w)")
+_PHONE_LABEL = re.compile(r"\b(?:phone|tel(?:ephone)?|mobile|mob|cell|contact)\b", re.IGNORECASE)
+# "2015 - 2019", "2018-20", "12.05.2019": digit runs _PHONE would otherwise take for a number.
+_DATES = re.compile(r"(?<!\d)(?:19|20)\d\d\s*[-–]\s*(?:(?:19|20)\d\d|\d\d)(?!\d)|"
+                    r"(?<!\d)\d{1,2}[./-]\d{1,2}[./-](?:19|20)?\d\d(?!\d)")
+_YEARS = re.compile(r"(\d{1,2}(?:\.\d)?)\s*\+?\s*(?:years?|yrs?)(?:\s+of)?(?:\s+\w+){0,3}?\s+experience", re.IGNORECASE)
+_DEGREE = re.compile(r"\b(?:ph\.?\s?d|doctorate|master'?s?|m\.?\s?sc|m\.?\s?tech|m\.e\b|mba|m\.a\b|"
+                     r"bachelor'?s?|b\.?\s?sc|b\.?\s?tech|b\.e\b|b\.a\b|bba|bca|mca|diploma|associate degree)",
+                     re.IGNORECASE)
+_DEGREE_LEVELS = {"phd": r"ph\.?\s?d|doctorate", "master": r"master|m\.?\s?sc|m\.?\s?tech|mba|mca|m\.e\b|m\.a\b",
+                  "bachelor": r"bachelor|b\.?\s?sc|b\.?\s?tech|bba|bca|b\.e\b|b\.a\b", "diploma": r"diploma"}
+
+
+def find_skills(text: str) -> list:
+    """Known skills mentioned in text, in SKILLS order."""
+    found = {int(m.lastgroup[1:]) for m in _SKILL_RE.finditer(text)}
+    return [_SKILL_NAMES[i] for i in sorted(found)]
+
+
+def find_phone(text: str) -> str | None:
+    """The first phone number of at least 9 digits, looked for on lines labelled phone/mobile/tel (and
+    the line after) before the rest of the text; dates and year ranges are skipped."""
+    lines = text.splitlines()
+    labelled = [" ".join(lines[i:i + 2]) for i, line in enumerate(lines) if _PHONE_LABEL.search(line)]
+    for chunk in labelled + lines:
+        for match in _PHONE.findall(_DATES.sub(";", chunk)):
+            if sum(c.isdigit() for c in match) >= 9:
+                return match.strip()
+    return None
+
+
+def extract_record(rel_path: str, file_hash: str, pages: list) -> dict:
+    """Structured fields of one CV, pulled from its page text with patterns (no LLM call)."""
+    text = "\n".join(page.page_content for page in pages)
+    email = _EMAIL.search(text)
+    years = [float(y) for y in _YEARS.findall(text)]
+    education = []
+    for line in text.splitlines():
+        line = " ".join(line.split())
+        if _DEGREE.search(line) and line not in education:
+            education.append(line[:150])
+    return {
+        "file": rel_path,
+        "sha256": file_hash,
+        "name": guess_candidate(rel_path, pages[0].page_content if pages else ""),
+        "email": email.group(0) if email else None,
+        "phone": find_phone(text),
+        "skills": find_skills(text),
+        "years_experience": max(years) if years else None,
+        "education": education[:5],
+    }
+
+
+def sync_cv_table(data_path: str, faiss_path: str) -> dict:
+    """Bring faiss_path/cv_table.parquet in line with the CVs in the index.
+
+    Run after ingestion: only CVs that are new or changed since the table
+    was last written are extracted, from the page cache filled during
+    ingest, so this re-parses nothing; rows of removed CVs are dropped.
+    """
+    files = indexed_files(faiss_path)
+    path = os.path.join(faiss_path, CV_TABLE_NAME)
+    rows = pq.read_table(path).to_pylist() if os.path.exists(path) else []
+    kept = [row for row in rows if files.get(row["file"]) == row["sha256"]]
+    done = {row["file"] for row in kept}
+    cache_path = DEFAULT_PAGE_CACHE_PATH if PAGE_CACHE else None
+    new = [extract_record(rel, file_hash, load_pages(os.path.join(data_path, rel), file_hash, cache_path))
+           for rel, file_hash in sorted(files.items()) if rel not in done]
+    stats = {"extracted": len(new), "removed": len(rows) - len(kept)}
+    if not new and not stats["removed"] and os.path.exists(path):
+        return stats
+
+    os.makedirs(faiss_path, exist_ok=True)
+    table = pa.Table.from_pylist(sorted(kept + new, key=lambda row: row["file"]), schema=SCHEMA)
+    tmp_path = f"{path}.tmp-{os.getpid()}"
+    pq.write_table(table, tmp_path, compression="zstd")
+    os.replace(tmp_path, path)
+    return stats
+
+
+class CVTable:
+    """The parquet table in memory, with the lookups the router needs."""
+
+    def __init__(self, table: pa.Table):
+        self.table = table
+        self.rows = table.to_pylist()
+
+    def __len__(self) -> int:
+        return len(self.rows)
+
+    def names(self) -> list:
+        return sorted({row["name"] for row in self.rows})
+
+    def select(self, skills=(), min_years: float | None = None, degree: str | None = None,
+               names=None, any_skills=(), without=()) -> list:
+        """Rows having every skill, one of any_skills, none of without, at least min_years of experience
+        and a degree of that level."""
+        degree_re = re.compile(rf"\b(?:{_DEGREE_LEVELS[degree]})", re.IGNORECASE) if degree else None
+        wanted = {s.casefold() for s in skills}
+        one_of = {s.casefold() for s in any_skills}
+        banned = {s.casefold() for s in without}
+        found = []
+        for row in self.rows:
+            have = {s.casefold() for s in row["skills"]}
+            if wanted - have or (one_of and not one_of & have) or banned & have:
+                continue
+            if min_years is not None and (row["years_experience"] or 0) < min_years:
+                continue
+            if degree_re is not None and not any(degree_re.search(line) for line in row["education"]):
+                continue
+            if names is not None and row["name"] not in names:
+                continue
+            found.append(row)
+        return sorted(found, key=lambda row: row["name"])
+
+
+_tables = {}
+
+
+def load_cv_table(faiss_path: str) -> CVTable | None:
+    """The CV table of an index folder, re-read only when the file changed; None before the first ingest."""
+    path = os.path.join(faiss_path, CV_TABLE_NAME)
+    try:
+        stamp = os.stat(path).st_mtime_ns
+    except FileNotFoundError:
+        return None
+    cached = _tables.get(path)
+    if cached is None or cached[0] != stamp:
+        cached = (stamp, CVTable(pq.read_table(path)))
+        _tables[path] = cached
+    return cached[1]
+
+
+def forget_cv_table(faiss_path: str):
+    """Drop the cached table of an index folder, e.g. when its session leaves memory."""
+    _tables.pop(os.path.join(faiss_path, CV_TABLE_NAME), None)
+
+
+# Questions that want judgement or explanation go to the LLM even when they mention a skill.
+_OPEN_ENDED = re.compile(r"\b(?:why|how (?:good|well|strong)|compar\w*|summar\w*|describ\w*|explain\w*|evaluat\w*|best|"
+                         r"strongest|most suitable|recommend\w*|tell me about|projects?|achievements?)\b", re.IGNORECASE)
+_LIST_ALL = re.compile(r"\b(?:list|show|give|name|what are|who are)\b.*\b(?:candidates?|names?|applicants?|cvs?|people)\b"
+                       r"|\ball (?:the )?(?:candidates?|names?|applicants?)\b", re.IGNORECASE)
+_COUNT = re.compile(r"\bhow many\b", re.IGNORECASE)
+_WHO = re.compile(r"\b(?:who|which|list|show|find|any|anyone|candidates? (?:with|who|having))\b", re.IGNORECASE)
+_MIN_YEARS = re.compile(r"(?:(more than|over|above|at least|minimum of|min\.?)\s*(\d{1,2})|(\d{1,2})\s*\+)\s*"
+                        r"(?:years?|yrs?)", re.IGNORECASE)
+_CONTACT = re.compile(r"\b(?:contact|e-?mail|phone|number|reach)\b", re.IGNORECASE)
+# "doesn't know SQL", "Python but not Java": skills in the clause a negation opens are excluded.
+_NEGATION = re.compile(r"\b(?:not|no|without|lacks?|lacking|never|neither|nor|except|excluding)\b|n['’]t\b|"
+                       r"\b(?:dont|doesnt|hasnt|havent|isnt|cant)\b", re.IGNORECASE)
+_OR = re.compile(r"\b(?:or|either|neither|nor)\b", re.IGNORECASE)
+_AND = re.compile(r"\band\b|&", re.IGNORECASE)
+_CLAUSE_END = re.compile(r"[,;:.?!]|\b(?:and|but|who|whose|which|that|while)\b", re.IGNORECASE)
+
+
+def _bullets(rows: list, detail) -> str:
+    return "\n".join(f"- {row['name']}{detail(row)}" for row in rows)
+
+
+def _clause_end(text: str, pos: int) -> int:
+    end = _CLAUSE_END.search(text, pos)
+    return end.start() if end else len(text)
+
+
+def _clause_start(text: str, pos: int) -> int:
+    return max((m.end() for m in _CLAUSE_END.finditer(text, 0, pos)), default=0)
+
+
+def answer_from_table(query_text: str, table: CVTable | None) -> str | None:
+    """Answer an aggregate or filter question straight from the CV table, or None to fall back to the LLM.
+
+    Handled: listing or counting candidates, filtering by skills, minimum
+    years of experience and degree level, and looking up contact details
+    of named candidates. A skill in a negated clause ("doesn't know SQL",
+    "Python but not Java") is excluded, and skills joined only by "or"
+    need any one of them. Anything the table cannot settle goes to the LLM
+    rather than being answered wrongly: a negation of something other than
+    a skill, "or" mixed with "and" or with a degree or years filter, and
+    years of experience with a particular skill ("3 years of Python"), as
+    the table only records total experience.
+    """
+    if table is None or not len(table) or _OPEN_ENDED.search(query_text):
+        return None
+    negated = [(m.start(), _clause_end(query_text, m.end())) for m in _NEGATION.finditer(query_text)]
+
+    def in_negation(pos: int) -> bool:
+        return any(start <= pos < end for start, end in negated)
+
+    mentions = [(int(m.lastgroup[1:]), m.start()) for m in _SKILL_RE.finditer(query_text)]
+    excluded = {i for i, pos in mentions if in_negation(pos)}
+    skills = [_SKILL_NAMES[i] for i in sorted({i for i, _ in mentions} - excluded)]
+    excluded = [_SKILL_NAMES[i] for i in sorted(excluded)]
+    years = _MIN_YEARS.search(query_text)
+    min_years = None
+    if years:
+        min_years = float(years.group(2) or years.group(3))
+        if years.group(1) and years.group(1).lower() in ("more than", "over", "above"):
+            min_years += 0.1
+    degree, degree_at = next(((level, m.start()) for level, pattern in _DEGREE_LEVELS.items()
+                              for m in [re.search(rf"\b(?:{pattern})", query_text, re.IGNORECASE)] if m),
+                             (None, None))
+    named = candidate_filter(query_text, table.names())
+
+    if named and _CONTACT.search(query_text):
+        rows = table.select(names=named["candidate"])
+        return _bullets(rows, lambda row: f": {row['email'] or 'no email'}, {row['phone'] or 'no phone'}")
+    if named:
+        return None  # a question about particular people needs their CV text
+    if negated and (not excluded or (years and in_negation(years.start()))
+                    or (degree and in_negation(degree_at))):
+        return None  # "not from Nepal", "without a master's degree": not something the table can exclude
+    if years and find_skills(query_text[_clause_start(query_text, years.start()):
+                                        _clause_end(query_text, years.end())]):
+        return None  # years with a skill, not in total
+    any_skills = []
+    if _OR.search(query_text) and (skills or excluded or years or degree):
+        if negated or years or degree or _AND.search(query_text) or len(skills) < 2:
+            return None
+        skills, any_skills = [], skills
+    if not (skills or any_skills or excluded or min_years is not None or degree):
+        if _COUNT.search(query_text):
+            return f"There are {len(table)} candidates."
+        if _LIST_ALL.search(query_text):
+            return _bullets(table.select(), lambda row: "")
+        return None
+    if not (_WHO.search(query_text) or _COUNT.search(query_text)):
+        return None
+
+    rows = table.select(skills, min_years, degree, any_skills=any_skills, without=excluded)
+    wanted = " and ".join(filter(None, [", ".join(skills), " or ".join(any_skills),
+                                        years and f"{years.group(0)} of experience",
+                                        degree and f"a {degree} degree",
+                                        excluded and "no " + " or ".join(excluded)]))
+    if _COUNT.search(query_text):
+        return f"{len(rows)} of {len(table)} candidates have {wanted}."
+    if not rows:
+        if excluded and wanted == "no " + " or ".join(excluded):
+            return f"Every candidate has {' or '.join(excluded)}."
+        return f"No candidate has {wanted}."
+
+    shown = set(skills + any_skills)
+
+    def detail(row):
+        parts = []
+        if row["years_experience"] is not None:
+            parts.append(f"{row['years_experience']:g} years")
+        if shown:
+            parts.append(", ".join(s for s in row["skills"] if s in shown))
+        return f" ({'; '.join(parts)})" if parts else ""
+    return f"Candidates with {wanted}:\n" + _bullets(rows, detail)
+
+
+def ask_cvs(engine, query_text: str, filter: dict | None = None) -> str:
+    """Answer a question about the CVs in engine's index; every UI routes questions through here.
+
+    Without an explicit filter, aggregate questions are answered from the
+    CV table, and the rest are retrieved with question_filter, i.e. from
+    the CVs of the candidates they name unless they compare them with
+    others. filter (e.g. {"file": "asha.pdf"}) skips both and goes
+    straight to retrieval.
+    """
+    if filter is None:
+        answer = answer_from_table(query_text, load_cv_table(engine.folder_path))
+        if answer is not None:
+            return answer
+        filter = question_filter(query_text, engine.metadata_values("candidate"))
+    return engine.ask(query_text, filter)
@@ -0,0 +1,138 @@
+#near-duplicate chunk detection at ingest: MinHash signatures (mmh3) banded into an LSH table.
+
+import os
+import re
+
+import mmh3
+import numpy as np
+
+DEDUP_NAME = "minhash_lsh.npz"
+DEDUP = os.getenv("INGEST_DEDUP", "1") == "1"
+NUM_PERM = 64
+BANDS = 8  # 8 bands of 8 rows: pairs above ~0.77 Jaccard almost always share a band
+THRESHOLD = 0.8
+_PRIME = (1 << 61) - 1
+_rng = np.random.default_rng(20240601)
+# Universal hashing h -> (a*h + b) mod p; a stays below 2^31 so a*h fits in 64 bits.
+_A = _rng.integers(1, 1 << 31, size=NUM_PERM, dtype=np.uint64)
+_B = _rng.integers(0, 1 << 61, size=NUM_PERM, dtype=np.uint64)
+_WORD = re.compile(r"\w+", re.UNICODE)
+
+
+def shingles(text: str, size: int = 3) -> set:
+    words = _WORD.findall(text.lower())
+    if len(words) <= size:
+        return {" ".join(words)}
+    return {" ".join(words[i:i + size]) for i in range(len(words) - size + 1)}
+
+
+def minhash(text: str) -> np.ndarray:
+    hashes = np.fromiter((mmh3.hash(s, signed=False) for s in shingles(text)), dtype=np.uint64)
+    return ((hashes[:, None] * _A + _B) % _PRIME).min(axis=0)
+
+
+def band_keys(signature: np.ndarray) -> np.ndarray:
+    rows = NUM_PERM // BANDS
+    return np.array([mmh3.hash64(signature[i * rows:(i + 1) * rows].tobytes(), seed=i, signed=False)[0]
+                     for i in range(BANDS)], dtype=np.uint64)
+
+
+def similarity(a: np.ndarray, b: np.ndarray) -> float:
+    """MinHash estimate of the Jaccard similarity of two texts' shingles."""
+    return float(np.mean(a == b))
+
+
+class LSHIndex:
+    """Band key -> chunk ID table.
+
+    Keys live in one sorted numpy array (searched with searchsorted) plus a
+    small dict for recent additions that is merged in as it grows, so the
+    table costs a few dozen bytes per chunk rather than a Python object
+    per band.
+    """
+
+    def __init__(self, keys=None, slots=None, ids=None):
+        self.keys = np.empty(0, dtype=np.uint64) if keys is None else keys
+        self.slots = np.empty(0, dtype=np.int64) if slots is None else slots
+        self.ids = [] if ids is None else list(ids)
+        self.removed = set()
+        self._recent = {}
+
+    def _merge(self):
+        if not self._recent:
+            return
+        keys = np.fromiter(self._recent, dtype=np.uint64, count=len(self._recent))
+        slots = np.fromiter(self._recent.values(), dtype=np.int64, count=len(self._recent))
+        self.keys = np.concatenate([self.keys, keys])
+        self.slots = np.concatenate([self.slots, slots])
+        order = np.argsort(self.keys, kind="stable")
+        self.keys, self.slots = self.keys[order], self.slots[order]
+        self._recent = {}
+
+    def add(self, chunk_id: str, keys: np.ndarray):
+        slot = len(self.ids)
+        self.ids.append(chunk_id)
+        for key in keys.tolist():
+            self._recent.setdefault(key, slot)
+        if len(self._recent) > max(50000, len(self.keys) // 4):
+            self._merge()
+
+    def candidates(self, keys: np.ndarray) -> list:
+        found = []
+        for key in keys.tolist():
+            slot = self._recent.get(key)
+            if slot is None:
+                i = int(np.searchsorted(self.keys, key))
+                if i < len(self.keys) and self.keys[i] == key:
+                    slot = int(self.slots[i])
+            if slot is not None and self.ids[slot] not in self.removed and self.ids[slot] not in found:
+                found.append(self.ids[slot])
+        return found
+
+    def remove(self, chunk_ids):
+        self.removed.update(chunk_ids)
+
+    def save(self, folder_path: str):
+        self._merge()
+        ids = np.array(self.ids, dtype="S32")
+        live = ~np.isin(ids, np.array(sorted(self.removed), dtype="S32")) if self.removed else np.ones(len(ids), bool)
+        # Renumber slots so removed chunks are dropped from the file.
+        remap = np.cumsum(live) - 1
+        keep = live[self.slots] if len(self.slots) else np.empty(0, bool)
+        tmp_path = os.path.join(folder_path, f"{DEDUP_NAME}.tmp-{os.getpid()}")
+        with open(tmp_path, "wb") as f:
+            np.savez(f, keys=self.keys[keep], slots=remap[self.slots[keep]], ids=ids[live])
+        os.replace(tmp_path, os.path.join(folder_path, DEDUP_NAME))
+
+    @classmethod
+    def load(cls, folder_path: str) -> "LSHIndex":
+        path = os.path.join(folder_path, DEDUP_NAME)
+        if not os.path.exists(path):
+            return cls()
+        with np.load(path) as data:
+            return cls(data["keys"], data["slots"], [i.decode("ascii") for i in data["ids"]])
+
+
+class NearDuplicateFilter:
+    """Finds chunks whose text is a near-duplicate (>= threshold) of one already kept.
+
+    Band collisions are only candidates; each is confirmed by comparing
+    MinHash signatures recomputed from the kept chunk's text (text_of(id)),
+    so nothing but the band table has to be stored.
+    """
+
+    def __init__(self, lsh: LSHIndex, text_of, threshold: float = THRESHOLD):
+        self.lsh = lsh
+        self.text_of = text_of
+        self.threshold = threshold
+
+    def check(self, chunk_id: str, text: str) -> str | None:
+        """Return the ID of the chunk text duplicates, or register it as kept and return None."""
+        signature = minhash(text)
+        keys = band_keys(signature)
+        for other in self.lsh.candidates(keys):
+            other_text = self.text_of(other)
+            if other_text is not None and similarity(signature, minhash(other_text)) >= self.threshold:
+                return other
+        self.lsh.add(chunk_id, keys)
+        return None
@@ -0,0 +1,175 @@
+#content-addressed on-disk cache for embedding vectors, shared by every ingest script.
+
+import hashlib
+import os
+import re
+import sqlite3
+import threading
+import time
+import unicodedata
+from array import array
+
+from langchain_core.embeddings import Embeddings
+
+DEFAULT_CACHE_PATH = os.getenv(
+    "EMBEDDING_CACHE_PATH",
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), "embedding_cache.sqlite"),
+)
+DEFAULT_MAX_BYTES = int(os.getenv("EMBEDDING_CACHE_MAX_MB", "2048")) * 1024 * 1024
+
+
+def normalize_text(text: str) -> str:
+    """Unicode-normalize and collapse whitespace so trivial differences share a vector."""
+    return re.sub(r"\s+", " ", unicodedata.normalize("NFC", text)).strip()
+
+
+def text_key(text: str) -> str:
+    return hashlib.sha256(normalize_text(text).encode("utf-8")).hexdigest()
+
+
+class EmbeddingCache:
+    """SQLite table of float32 vectors keyed by (model, kind, text hash).
+
+    ``kind`` keeps document and query vectors apart, since some providers
+    (Gemini) embed them with different task types. When the stored vectors
+    grow past max_bytes, the least recently used ones are evicted.
+    """
+
+    def __init__(self, path: str = DEFAULT_CACHE_PATH, max_bytes: int = DEFAULT_MAX_BYTES):
+        self.path = path
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False, timeout=30)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            """CREATE TABLE IF NOT EXISTS vectors (
+                   model TEXT NOT NULL,
+                   kind TEXT NOT NULL,
+                   key TEXT NOT NULL,
+                   vector BLOB NOT NULL,
+                   last_used REAL NOT NULL,
+                   PRIMARY KEY (model, kind, key)
+               ) WITHOUT ROWID"""
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS vectors_last_used ON vectors (last_used)")
+        self._conn.commit()
+        self._size = self._stored_bytes()
+
+    def _stored_bytes(self) -> int:
+        return self._conn.execute("SELECT COALESCE(SUM(LENGTH(vector)), 0) FROM vectors").fetchone()[0]
+
+    def get_many(self, model: str, kind: str, keys: list) -> dict:
+        """Return {key: vector} for the keys that are cached."""
+        found = {}
+        unique = list(dict.fromkeys(keys))
+        with self._lock:
+            for start in range(0, len(unique), 500):
+                batch = unique[start:start + 500]
+                marks = ",".join("?" * len(batch))
+                rows = self._conn.execute(
+                    f"SELECT key, vector FROM vectors WHERE model = ? AND kind = ? AND key IN ({marks})",
+                    [model, kind, *batch],
+                ).fetchall()
+                for key, blob in rows:
+                    vector = array("f")
+                    vector.frombytes(blob)
+                    found[key] = vector.tolist()
+            if found:
+                now = time.time()
+                self._conn.executemany(
+                    "UPDATE vectors SET last_used = ? WHERE model = ? AND kind = ? AND key = ?",
+                    [(now, model, kind, key) for key in found],
+                )
+                self._conn.commit()
+        return found
+
+    def put_many(self, model: str, kind: str, items: dict):
+        """Store {key: vector} and evict old entries if the cache is over its size limit."""
+        if not items:
+            return
+        now = time.time()
+        rows = [(model, kind, key, array("f", vector).tobytes(), now) for key, vector in items.items()]
+        with self._lock:
+            self._conn.executemany("INSERT OR REPLACE INTO vectors VALUES (?, ?, ?, ?, ?)", rows)
+            self._conn.commit()
+            self._size += sum(len(row[3]) for row in rows)
+            if self._size > self.max_bytes:
+                self._evict()
+
+    def _evict(self):
+        # Drop the least recently used tenth at a time until we are back under the limit.
+        self._size = self._stored_bytes()
+        while self._size > self.max_bytes:
+            count = self._conn.execute("SELECT COUNT(*) FROM vectors").fetchone()[0]
+            self._conn.execute(
+                "DELETE FROM vectors WHERE (model, kind, key) IN "
+                "(SELECT model, kind, key FROM vectors ORDER BY last_used LIMIT ?)",
+                (max(1, count // 10),),
+            )
+            self._conn.commit()
+            self._size = self._stored_bytes()
+
+
+class CachedEmbeddings(Embeddings):
+    """Wrap an embeddings client so vectors that were computed before are read from the cache."""
+
+    def __init__(self, embeddings: Embeddings, cache: EmbeddingCache | None = None, model: str | None = None):
+        self.embeddings = embeddings
+        self.cache = cache or get_cache()
+        self.model = model or getattr(embeddings, "model", None) or type(embeddings).__name__
+        self.hits = 0
+        self.misses = 0
+
+    def _lookup(self, texts, kind):
+        keys = [text_key(t) for t in texts]
+        found = self.cache.get_many(self.model, kind, keys)
+        missing = {}
+        for i, key in enumerate(keys):
+            if key not in found:
+                missing.setdefault(key, i)
+        self.hits += len(texts) - len(missing)
+        self.misses += len(missing)
+        return keys, found, missing
+
+    def _store(self, texts, kind, keys, found, missing, vectors):
+        # Round fresh vectors to float32 too, so a hit returns exactly what a miss did.
+        new = {key: array("f", vector).tolist() for key, vector in zip(missing, vectors)}
+        self.cache.put_many(self.model, kind, new)
+        found.update(new)
+        return [found[key] for key in keys]
+
+    def embed_documents(self, texts: list[str]) -> list[list[float]]:
+        keys, found, missing = self._lookup(texts, "document")
+        vectors = self.embeddings.embed_documents([texts[i] for i in missing.values()]) if missing else []
+        return self._store(texts, "document", keys, found, missing, vectors)
+
+    async def aembed_documents(self, texts: list[str]) -> list[list[float]]:
+        keys, found, missing = self._lookup(texts, "document")
+        vectors = await self.embeddings.aembed_documents([texts[i] for i in missing.values()]) if missing else []
+        return self._store(texts, "document", keys, found, missing, vectors)
+
+    def embed_query(self, text: str) -> list[float]:
+        keys, found, missing = self._lookup([text], "query")
+        vectors = [self.embeddings.embed_query(text)] if missing else []
+        return self._store([text], "query", keys, found, missing, vectors)[0]
+
+    async def aembed_query(self, text: str) -> list[float]:
+        keys, found, missing = self._lookup([text], "query")
+        vectors = [await self.embeddings.aembed_query(text)] if missing else []
+        return self._store([text], "query", keys, found, missing, vectors)[0]
+
+
+_shared_cache = None
+
+
+def get_cache() -> EmbeddingCache:
+    """Process-wide cache instance at DEFAULT_CACHE_PATH."""
+    global _shared_cache
+    if _shared_cache is None:
+        _shared_cache = EmbeddingCache()
+    return _shared_cache
+
+
+def with_cache(embeddings: Embeddings) -> CachedEmbeddings:
+    return CachedEmbeddings(embeddings)
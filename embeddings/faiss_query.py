@@ -1,42 +1,47 @@
-from langchain_community.vectorstores import FAISS
 from langchain_google_genai import ChatGoogleGenerativeAI
 from langchain_google_genai import GoogleGenerativeAIEmbeddings
 from langchain_core.prompts import ChatPromptTemplate
-from langchain.chains.combine_documents import create_stuff_documents_chain
-from langchain.chains import create_retrieval_chain
 from dotenv import load_dotenv
+from local_embeddings import EMBEDDING_BACKEND, LocalEmbeddings
+from query_engine import RAGQueryEngine
 import os 
 
-def load_db_query(query_text):
-    # Load environment variables from .env file
-    load_dotenv()
-
-    GOOGLE_API_KEY = os.environ.get("GOOGLE_API_KEY")
-
-    FAISS_PATH="faiss_gemini"
+FAISS_PATH="faiss_gemini"
 
-    db = FAISS.load_local(embeddings=GoogleGenerativeAIEmbeddings(model='models/gemini-embedding-exp-03-07'),folder_path=FAISS_PATH,allow_dangerous_deserialization=True)
+_engine = None
 
-    llm = ChatGoogleGenerativeAI(model='gemini-2.5-flash')
+def get_query_engine():
+    # Built once per process; the engine reloads the index itself when it changes on disk.
+    global _engine
+    if _engine is None:
+        # Load environment variables from .env file
+        load_dotenv()
 
-    prompt = ChatPromptTemplate.from_template(
-        """
-        Answer the question only based on the provided contexts. Think step by step befoe providing a detailed answer.
-        Context:{context}
-        Question:{input}
-        """
-    )
+        GOOGLE_API_KEY = os.environ.get("GOOGLE_API_KEY")
 
-    retriever=db.as_retriever(search_kwargs={"k": 5})
+        llm = ChatGoogleGenerativeAI(model='gemini-2.5-flash')
 
-    documents_chain = create_stuff_documents_chain(llm, prompt)
+        prompt = ChatPromptTemplate.from_template(
+            """
+            Answer the question only based on the provided contexts. Think step by step befoe providing a detailed answer.
+            Context:{context}
+            Question:{input}
+            """
+        )
 
-    retriever_chain = create_retrieval_chain(retriever, documents_chain)
+        if EMBEDDING_BACKEND == "local":
+            embeddings = LocalEmbeddings()
+        else:
+            embeddings = GoogleGenerativeAIEmbeddings(model='models/gemini-embedding-exp-03-07')
+        _engine = RAGQueryEngine(FAISS_PATH, embeddings, llm, prompt, k=3)
+    return _engine
 
-    response = retriever_chain.invoke({"input": query_text})
-
-    return response['answer'].strip()
+def load_db_query(query_text):
+    return get_query_engine().ask(query_text)
     
 if __name__ == "__main__":
-    query_text = input("Enter your query: ")
-    print(load_db_query(query_text))
\ No newline at end of file
+    while True:
+        query_text = input("Enter your query (or type 'exit' to quit): ")
+        if query_text.lower() == "exit":
+            break
+        print(load_db_query(query_text))
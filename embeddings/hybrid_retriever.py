@@ -0,0 +1,115 @@
+#retriever that fuses BM25 (exact names and terms) with FAISS vector search.
+
+from typing import Any
+
+import numpy as np
+from langchain_core.callbacks import CallbackManagerForRetrieverRun
+from langchain_core.documents import Document
+from langchain_core.retrievers import BaseRetriever
+
+from metadata_index import filtered_search
+
+
+def document_at(db, row: int) -> Document:
+    """Fetch the chunk stored at a FAISS row (works for pickled and memory-mapped docstores)."""
+    return db.docstore.search(db.index_to_docstore_id[row])
+
+
+def dense_search(db, query: str, k: int, vector: list | None = None, only=None) -> list:
+    """(row, L2 distance) pairs for the k nearest chunks; pass vector to reuse an embedded query.
+
+    only (sorted FAISS rows, see filter_rows) limits the search to those chunks.
+    """
+    if vector is None:
+        vector = db.embeddings.embed_query(query)
+    if only is not None:
+        return filtered_search(db.index, vector, k, only)
+    distances, rows = db.index.search(np.array([vector], dtype=np.float32), k)
+    return [(int(r), float(d)) for r, d in zip(rows[0], distances[0]) if r != -1]
+
+
+def filter_rows(db, filter: dict):
+    """FAISS rows whose metadata matches filter, via the metadata index saved with the vector store."""
+    metadata_index = getattr(db, "metadata_index", None)
+    if metadata_index is None:
+        raise ValueError("This index has no metadata index; run ingestion again to filter by metadata.")
+    return metadata_index.match(filter)
+
+
+def rrf_fuse(rankings, rrf_k: int = 60) -> list:
+    """Reciprocal-rank fusion of (weight, keys best first) rankings; returns (key, score) best first."""
+    scores = {}
+    for weight, keys in rankings:
+        for rank, key in enumerate(keys):
+            scores[key] = scores.get(key, 0.0) + weight / (rrf_k + rank + 1)
+    return sorted(scores.items(), key=lambda item: item[1], reverse=True)
+
+
+def channel_relevance(dense: list, lexical: list) -> dict:
+    """Key -> how close a hit comes to the best one of its own list, from 0 to 1.
+
+    dense holds (key, L2 distance) and lexical (key, BM25 score) pairs; a
+    key in both lists takes the better of the two. Unlike fused RRF scores,
+    which halve for a chunk found by only one search, this is comparable
+    between a name-only BM25 hit and a chunk both searches agree on.
+    """
+    relevance = {}
+    if dense:
+        best = min(dist for _, dist in dense)
+        for key, dist in dense:
+            relevance[key] = (best + 1e-6) / (dist + 1e-6)
+    if lexical:
+        best = max(score for _, score in lexical)
+        for key, score in lexical:
+            if best > 0:
+                relevance[key] = max(relevance.get(key, 0.0), score / best)
+    return relevance
+
+
+class HybridRetriever(BaseRetriever):
+    """Reciprocal-rank fusion of dense and BM25 results.
+
+    Each list contributes weight / (rrf_k + rank) per chunk, so a chunk that
+    is only an exact-term match (a temple or candidate name) can still make
+    the top k. Without a BM25 index this is plain dense retrieval. The fused
+    score is added to each returned document's metadata as "score" and its
+    channel_relevance as "relevance".
+    With a metadata filter (e.g. {"candidate": "Asha Gurung"}) both searches
+    only ever score the matching chunks. vector, if set, is the already
+    embedded query, for asking one question under many filters.
+    """
+
+    db: Any
+    bm25: Any = None
+    k: int = 3
+    fetch_k: int = 20
+    rrf_k: int = 60
+    dense_weight: float = 1.0
+    lexical_weight: float = 1.0
+    filter: dict | None = None
+    vector: list | None = None
+
+    def _search(self, query: str) -> tuple:
+        only = filter_rows(self.db, self.filter) if self.filter else None
+        if only is not None and not len(only):
+            return [], []
+        dense = dense_search(self.db, query, self.fetch_k, self.vector, only)
+        lexical = [] if self.bm25 is None else self.bm25.search(query, self.fetch_k, only=only)
+        return dense, lexical
+
+    def _fuse(self, dense: list, lexical: list) -> list:
+        return rrf_fuse([(self.dense_weight, [row for row, _ in dense]),
+                         (self.lexical_weight, [row for row, _ in lexical])], self.rrf_k)
+
+    def fused_rows(self, query: str) -> list:
+        return self._fuse(*self._search(query))
+
+    def _get_relevant_documents(self, query: str, *, run_manager: CallbackManagerForRetrieverRun) -> list:
+        dense, lexical = self._search(query)
+        relevance = channel_relevance(dense, lexical)
+        results = []
+        for row, score in self._fuse(dense, lexical)[:self.k]:
+            doc = document_at(self.db, row)
+            results.append(Document(id=doc.id, page_content=doc.page_content,
+                                    metadata={**doc.metadata, "score": score, "relevance": relevance[row]}))
+        return results
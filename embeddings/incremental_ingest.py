@@ -0,0 +1,366 @@
+#incremental ingestion: only new or changed PDFs are embedded, deleted ones are removed from the index.
+
+import glob
+import hashlib
+import os
+
+import numpy as np
+from langchain_core.documents import Document
+
+from ann_index import INDEX_TYPE, RESCORE, TRAIN_SIZE, TRAINED_TYPES, needs_retrain, supports_remove, train_limit, \
+    vectorstore_from_embeddings
+from batch_embedder import BatchEmbedder
+from dedup import DEDUP, THRESHOLD, LSHIndex, NearDuplicateFilter, band_keys, minhash
+from index_store import checkpoint_dir, clear_index, current_version, index_dir, index_exists, index_version, \
+    load_manifest, load_vectorstore, publish_index, save_index
+from ingest_staging import StagingLog
+from mmap_docstore import SpilledDocstore
+from page_cache import DEFAULT_PAGE_CACHE_PATH, PAGE_CACHE
+from parallel_loader import iter_split_pdfs
+
+
+def file_sha256(path: str) -> str:
+    """Hash a file's bytes without reading it into memory at once."""
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def file_stamp(path: str) -> list:
+    stat = os.stat(path)
+    return [stat.st_size, stat.st_mtime_ns]
+
+
+def text_sha256(text: str) -> str:
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+def chunk_id(rel_path: str, file_hash: str, position: int) -> str:
+    """Stable vector store ID for the n-th chunk of a given file version."""
+    return hashlib.sha256(f"{rel_path}\0{file_hash}\0{position}".encode("utf-8")).hexdigest()[:32]
+
+
+def list_pdfs(data_path: str) -> dict:
+    """Map each PDF under data_path (relative, '/'-separated) to its full path."""
+    paths = glob.glob(os.path.join(data_path, "**", "[!.]*.pdf"), recursive=True)
+    paths += glob.glob(os.path.join(data_path, "**", "[!.]*.PDF"), recursive=True)
+    return {os.path.relpath(p, data_path).replace(os.sep, "/"): p for p in sorted(set(paths))}
+
+
+def embedding_model_name(embeddings) -> str:
+    return getattr(embeddings, "model", None) or type(embeddings).__name__
+
+
+class _HeldVectors:
+    """float32 rows appended a batch at a time into one array that doubles in size as it fills."""
+
+    def __init__(self):
+        self._rows = np.empty((0, 0), dtype=np.float32)
+        self.count = 0
+
+    def extend(self, vectors: list):
+        vectors = np.asarray(vectors, dtype=np.float32)
+        if self.count + len(vectors) > len(self._rows):
+            grown = np.empty((max(2 * len(self._rows), self.count + len(vectors)), vectors.shape[1]), dtype=np.float32)
+            if self.count:
+                grown[:self.count] = self._rows[:self.count]
+            self._rows = grown
+        self._rows[self.count:self.count + len(vectors)] = vectors
+        self.count += len(vectors)
+
+    @property
+    def array(self) -> np.ndarray:
+        return self._rows[:self.count]
+
+    def clear(self):
+        self.__init__()
+
+
+def sync_index(data_path: str, faiss_path: str, embeddings, chunk_size: int = 1000,
+               chunk_overlap: int = 200, rebuild: bool = False, batch_size: int = 100,
+               max_in_flight: int = 4, max_workers: int | None = None,
+               index_type: str = INDEX_TYPE, ingest_batch: int = 2000,
+               checkpoint_every: int = 50000, rescore: int = RESCORE, select=None, enrich=None,
+               dedup: bool = DEDUP, progress=None, train_size: int = TRAIN_SIZE, publish: bool = True) -> dict:
+    """Bring the FAISS index in faiss_path in line with the PDFs in data_path.
+
+    The manifest next to the index records the SHA-256 (and size and mtime)
+    of every ingested file and the ID and text hash of each of its chunks.
+    Files whose hash is unchanged are skipped, changed and deleted files have
+    their old chunks removed by ID; only files whose size or mtime moved are
+    hashed again, so a run costs in proportion to what changed. A full rebuild happens when asked for, when there is no
+    manifest, or when the splitter settings, embedding model or index type
+    changed; IVF and HNSW indexes cannot delete vectors in place, so removals
+    rebuild them too.
+    Changed PDFs are parsed and split by max_workers processes, and new
+    chunks are embedded by a BatchEmbedder with batch_size texts per
+    request and at most max_in_flight concurrent requests. Extracted page
+    text is kept in the page cache (page_cache.py, keyed by file hash), so a
+    rebuild for new splitter settings or another embedding model only
+    re-splits; PAGE_CACHE=0 turns it off.
+
+    Ingestion streams: chunks are embedded and added to the index about
+    ingest_batch at a time (whole files only). Every checkpoint_every added
+    chunks, the chunks and vectors added since the previous checkpoint are
+    written to the staging folder with the files they complete
+    (ingest_staging), so a checkpoint costs what it adds; a crashed run
+    replays them and picks up from there. The index itself is saved once,
+    at the end. Chunk texts live in docstore files on disk
+    (SpilledDocstore); only those added since the last checkpoint are held
+    in memory, and saves stream the documents, so memory beyond the
+    vectors themselves is bounded by checkpoint_every and not by the
+    corpus. IVF indexes are trained on the first train_size
+    embedded vectors (all of them, for a smaller corpus; fewer if they
+    would take more than FAISS_TRAIN_MB, see ann_index.train_limit), which
+    are held as float32 until then, and one trained
+    on too few or left flat is rebuilt once the index has outgrown it
+    (ann_index.needs_retrain); unchanged chunks come back out of the
+    embedding cache. rescore > 0 keeps exact float32 vectors next to an
+    approximate index (see ann_index.build_index).
+    select, if given, is called with each PDF's relative path and limits
+    the index to the files it accepts (one shard of a sharded index).
+    enrich, if given, is called as enrich(rel_path, chunks) for each new or
+    changed PDF before embedding, to add metadata to its chunks.
+
+    With dedup, chunks that are near-duplicates (MinHash/LSH, see dedup.py)
+    of a chunk already in the index are not embedded; the manifest records
+    them with "dup_of", and if that original goes away the files relying on
+    it are ingested again. stats["chunks_deduplicated"] counts the drops.
+    With enrich, chunks are only matched against chunks of the same file:
+    a duplicate's metadata (e.g. its candidate) would otherwise be lost
+    with it.
+    progress, if given, is called as progress(rel_path, state) as each file
+    to be ingested goes "queued" -> "parsed" -> "embedded", and with
+    "removed" for deleted files; it may be called from several shards'
+    threads at once.
+    The finished index is published as the folder's new version, or with
+    publish=False saved unpublished (as CHECKPOINT) for the caller to publish
+    (sync_shards publishes all shards at once); stats["version"] names it,
+    None if no PDF is left to index.
+    """
+    settings = {
+        "chunk_size": chunk_size,
+        "chunk_overlap": chunk_overlap,
+        "embedding_model": embedding_model_name(embeddings),
+        "index_type": index_type,
+    }
+    if rescore:
+        settings["rescore"] = rescore
+    if enrich is not None:
+        settings["enriched"] = True  # chunks indexed without the extra metadata get re-ingested
+    if dedup:
+        settings["dedup"] = THRESHOLD
+        if enrich is not None:
+            settings["dedup_scope"] = "file"
+    # Resume from what an interrupted (or unpublished) sync saved, if it built on the current version.
+    source = faiss_path if rebuild else checkpoint_dir(faiss_path) or faiss_path
+    manifest = {} if rebuild else load_manifest(source)
+    db = None
+    if manifest.get("settings") == settings and index_exists(source):
+        db = load_vectorstore(source, embeddings, spill=True)
+    else:
+        manifest = {}
+    files = manifest.get("files", {})
+
+    per_file = enrich is not None  # dedup within each file only, see above
+    lsh = None
+    log = StagingLog.resume(faiss_path, settings, os.path.basename(source) if source != faiss_path
+                            else index_version(faiss_path))
+    if rebuild:
+        log.discard()
+        log.rebuilt()
+    elif log.steps:
+        if dedup and not per_file:
+            lsh = LSHIndex.load(index_dir(source)) if db is not None else LSHIndex()
+        db, files, lsh = _replay(log, db, files, lsh, embeddings, faiss_path, index_type, rescore)
+
+    current = {}
+    for rel, path in list_pdfs(data_path).items():
+        if select is None or select(rel):
+            # A file with the size and mtime it had when ingested is not read again.
+            stamp = file_stamp(path)
+            known = files.get(rel, {})
+            current[rel] = (path, known["sha256"] if known.get("stat") == stamp else file_sha256(path), stamp)
+    changed = [rel for rel, (_, h, _) in current.items() if files.get(rel, {}).get("sha256") != h]
+    removed = [rel for rel in files if rel not in current]
+    stale = {c["id"] for rel in changed + removed if rel in files for c in files[rel]["chunks"] if "dup_of" not in c}
+    while stale:
+        # Files whose duplicate chunks stood in for a chunk that is going away have to be ingested again.
+        dependents = [rel for rel in current if rel not in changed and rel in files
+                      and any(c.get("dup_of") in stale for c in files[rel]["chunks"])]
+        if not dependents:
+            break
+        changed += dependents
+        stale.update(c["id"] for rel in dependents for c in files[rel]["chunks"] if "dup_of" not in c)
+    stats = {"added": sum(rel not in files for rel in changed), "updated": sum(rel in files for rel in changed),
+             "removed": len(removed), "unchanged": len(current) - len(changed),
+             "chunks_added": 0, "chunks_removed": 0, "chunks_deduplicated": 0}
+    retrain = db is not None and needs_retrain(db.index_params, db.index.ntotal, index_type,
+                                               train_limit(db.index.d, train_size))
+    if not changed and not removed and not retrain and db is not None and not log.steps:
+        stats["version"] = current_version(faiss_path) if source == faiss_path else os.path.basename(source)
+        if publish and source != faiss_path:
+            publish_index(faiss_path, stats["version"])
+        return stats
+
+    if lsh is None:
+        lsh = LSHIndex.load(index_dir(source)) if dedup and db is not None and not per_file else LSHIndex()
+    stale_ids = sorted(stale)
+    if retrain or (stale_ids and not supports_remove(db.index)):
+        # Rebuild from scratch; unchanged chunks come back out of the embedding cache.
+        stats["chunks_removed"] = db.index.ntotal
+        db, files, changed, lsh = None, {}, list(current), LSHIndex()
+        log.rebuilt()
+    else:
+        if stale_ids:
+            db.delete(stale_ids)
+            lsh.remove(stale_ids)
+            stats["chunks_removed"] = len(stale_ids)
+        log.removed(stale_ids, changed + removed)
+    for rel in changed + removed:
+        # A checkpoint must not claim a changed file before its new chunks are in.
+        files.pop(rel, None)
+    if progress is not None:
+        for rel in removed:
+            progress(rel, "removed")
+        for rel in changed:
+            progress(rel, "queued")
+
+    embedder = BatchEmbedder(embeddings, batch_size=batch_size, max_in_flight=max_in_flight)
+    pending, pending_ids, pending_files = [], [], {}
+    pending_texts = {}
+    # Embedded but not yet in the index: the IVF training sample while there is no index yet.
+    held, held_vectors, held_files = [], _HeldVectors(), {}
+    since_checkpoint, checkpoint_files = 0, {}
+
+    def text_of(cid: str) -> str | None:
+        if cid in pending_texts:
+            return pending_texts[cid]
+        doc = db.docstore.search(cid) if db is not None else None
+        return doc.page_content if isinstance(doc, Document) else None
+
+    near_dups = NearDuplicateFilter(lsh, text_of) if dedup else None
+
+    def flush(final: bool = False):
+        nonlocal db, since_checkpoint
+        if pending:
+            texts = [c.page_content for c in pending]
+            held_vectors.extend(embedder.embed(texts))
+            held.extend(zip(texts, [c.metadata for c in pending], pending_ids))
+        held_files.update(pending_files)
+        pending.clear()
+        pending_ids.clear()
+        pending_files.clear()
+        if db is None and index_type in TRAINED_TYPES and not final and \
+                (not held or len(held) < train_limit(held_vectors.array.shape[1], train_size)):
+            return  # train on a proper sample, not on whatever the first batch holds
+        if held:
+            text_embeddings = list(zip([text for text, _, _ in held], held_vectors.array))
+            metadatas = [metadata for _, metadata, _ in held]
+            ids = [cid for _, _, cid in held]
+            if db is None:
+                db = vectorstore_from_embeddings(text_embeddings, embeddings, metadatas=metadatas, ids=ids,
+                                                 index_type=index_type, docstore=SpilledDocstore(faiss_path),
+                                                 rescore=rescore)
+            else:
+                db.add_embeddings(text_embeddings, metadatas=metadatas, ids=ids)
+            if checkpoint_every and not final:
+                log.add(ids, [text for text, _ in text_embeddings], metadatas, held_vectors.array)
+        # Files only enter the manifest once all of their chunks are in the index.
+        files.update(held_files)
+        checkpoint_files.update(held_files)
+        if progress is not None:
+            for rel in held_files:
+                progress(rel, "embedded")
+        stats["chunks_added"] += len(held)
+        since_checkpoint += len(held)
+        held.clear()
+        held_vectors.clear()
+        held_files.clear()
+        pending_texts.clear()
+        if checkpoint_every and since_checkpoint >= checkpoint_every and not final:
+            part_path, part_ids = log.checkpoint(checkpoint_files)
+            if isinstance(db.docstore, SpilledDocstore):  # not a docstore pickled before the docstore files
+                db.docstore.attach(part_path, part_ids)
+            since_checkpoint = 0
+            checkpoint_files.clear()
+
+    rel_by_path = {current[rel][0]: rel for rel in changed}
+    hashes = {path: current[rel][1] for path, rel in rel_by_path.items()}
+    cache_path = DEFAULT_PAGE_CACHE_PATH if PAGE_CACHE else None
+    for path, chunks, _ in iter_split_pdfs(rel_by_path, chunk_size, chunk_overlap, max_workers, hashes, cache_path):
+        rel = rel_by_path[path]
+        file_hash = current[rel][1]
+        if enrich is not None:
+            enrich(rel, chunks)
+        file_dups = NearDuplicateFilter(LSHIndex(), text_of) if near_dups and per_file else near_dups
+        entries = []
+        for i, chunk in enumerate(chunks):
+            entry = {"id": chunk_id(rel, file_hash, i), "sha256": text_sha256(chunk.page_content)}
+            duplicate_of = file_dups.check(entry["id"], chunk.page_content) if file_dups else None
+            if duplicate_of is not None:
+                entry["dup_of"] = duplicate_of
+                stats["chunks_deduplicated"] += 1
+            else:
+                pending.append(chunk)
+                pending_ids.append(entry["id"])
+                pending_texts[entry["id"]] = chunk.page_content
+            entries.append(entry)
+        pending_files[rel] = {"sha256": file_hash, "stat": current[rel][2], "chunks": entries}
+        if progress is not None:
+            progress(rel, "parsed")
+        if len(pending) >= ingest_batch:
+            flush()
+    flush(final=True)
+    if stats["chunks_added"]:
+        stats["chunks_per_sec"] = embedder.stats["chunks_per_sec"]
+
+    if db is None or db.index.ntotal == 0:
+        if publish:
+            clear_index(faiss_path)
+        log.discard()
+        stats["version"] = None
+        return stats
+
+    stats["version"] = save_index(db, faiss_path, {"settings": settings, "files": files}, lsh if dedup else None,
+                                  publish=publish)
+    log.discard()
+    return stats
+
+
+def _replay(log: StagingLog, db, files: dict, lsh, embeddings, faiss_path: str, index_type: str, rescore: int):
+    """Redo the checkpointed steps of an interrupted sync on the index it started from; returns (db, files, lsh).
+
+    lsh, the dedup table, is None when not kept.
+    """
+    for step in log.steps:
+        if step.get("rebuild"):
+            db, files, lsh = None, {}, LSHIndex() if lsh is not None else None
+        elif "deleted" in step:
+            if step["deleted"]:
+                db.delete(step["deleted"])
+                if lsh is not None:
+                    lsh.remove(step["deleted"])
+            for rel in step["dropped"]:
+                files.pop(rel, None)
+        else:
+            ids, documents, vectors, part_files = log.read_part(step["part"])
+            files.update(part_files)
+            if not ids:
+                continue
+            text_embeddings = list(zip([doc.page_content for doc in documents], vectors))
+            metadatas = [doc.metadata for doc in documents]
+            if db is None:
+                db = vectorstore_from_embeddings(text_embeddings, embeddings, metadatas=metadatas, ids=ids,
+                                                 index_type=index_type, docstore=SpilledDocstore(faiss_path),
+                                                 rescore=rescore)
+            else:
+                db.add_embeddings(text_embeddings, metadatas=metadatas, ids=ids)
+            if isinstance(db.docstore, SpilledDocstore):
+                db.docstore.attach(log.part_path(step["part"]), ids)
+            if lsh is not None:
+                for doc_id, doc in zip(ids, documents):
+                    lsh.add(doc_id, band_keys(minhash(doc.page_content)))
+    return db, files, lsh
@@ -0,0 +1,288 @@
+#helpers for reading and writing the FAISS index folders (faiss_gemini/, faiss_openai_cv/).
+#
+#   faiss_gemini/CURRENT      name of the published version, swapped in one rename by each save
+#   faiss_gemini/v-<token>/   one saved version (index.faiss, index.pkl, docstore, bm25.npz, manifest.json, ...),
+#                             never modified once written
+#   faiss_gemini/CHECKPOINT   {"version", "base"}: a version saved by a sync but not published, resumed from
+#   faiss_gemini/staging/     checkpoints of a sync in progress (see ingest_staging)
+#
+# Folders saved before versioning hold those files directly and are still read (and replaced by the next save).
+
+import json
+import os
+import pickle
+import shutil
+import sys
+import uuid
+
+import faiss
+from langchain_community.docstore.in_memory import InMemoryDocstore
+from langchain_community.vectorstores import FAISS
+
+from ann_index import INDEX_PARAMS_NAME, apply_search_params
+from bm25_index import BM25_NAME, BM25Builder, BM25Index
+from dedup import DEDUP_NAME
+from ingest_staging import STAGING_NAME
+from metadata_index import METADATA_INDEX_NAME, MetadataIndex, MetadataIndexBuilder
+from mmap_docstore import (DOCSTORE_FILES, DocstoreWriter, MmapDocstore, RowIdMap, SpilledDocstore, has_docstore,
+                           read_documents, read_index_mmap)
+
+INDEX_FILES = ("index.faiss", "index.pkl")
+MANIFEST_NAME = "manifest.json"
+CURRENT_NAME = "CURRENT"
+CHECKPOINT_NAME = "CHECKPOINT"
+# Version token of a folder saved before versioned folders; the query side keys its cache on the version.
+VERSION_NAME = "VERSION"
+_VERSION_PREFIX = "v-"
+_FLAT_NAMES = (VERSION_NAME,) + INDEX_FILES + DOCSTORE_FILES + (BM25_NAME, METADATA_INDEX_NAME, DEDUP_NAME,
+                                                              INDEX_PARAMS_NAME, MANIFEST_NAME)
+# Windows cannot replace a file that is memory-mapped, so re-ingesting under a running app would fail there.
+MMAP_DEFAULT = os.getenv("FAISS_MMAP", "0" if os.name == "nt" else "1") == "1"
+# Bytes per document held in memory besides its text and metadata (Document object, ID, ID map entry), measured.
+DOC_OVERHEAD = 550
+
+
+def current_version(folder_path: str) -> str | None:
+    """Name of the published version folder, None if there is none (nothing saved, or saved before versioning)."""
+    try:
+        with open(os.path.join(folder_path, CURRENT_NAME), "r", encoding="utf-8") as f:
+            return f.read().strip() or None
+    except FileNotFoundError:
+        return None
+
+
+def index_dir(folder_path: str) -> str:
+    """Folder holding the published index files: the version CURRENT names, else folder_path itself
+    (a folder saved before versioning, or a version folder)."""
+    name = current_version(folder_path)
+    return os.path.join(folder_path, name) if name else folder_path
+
+
+def _from_current(folder_path: str, read):
+    """read(index_dir(folder_path)), again on the new version if a save removed the one read meanwhile."""
+    for attempt in range(3):
+        path = index_dir(folder_path)
+        try:
+            return read(path)
+        except (FileNotFoundError, RuntimeError):  # faiss reports a missing file as RuntimeError
+            if attempt == 2 or index_dir(folder_path) == path:
+                raise
+
+
+def index_exists(folder_path: str) -> bool:
+    """Check if the essential FAISS index files exist."""
+    path = index_dir(folder_path)
+    return all(os.path.exists(os.path.join(path, name)) for name in INDEX_FILES)
+
+
+def index_version(folder_path: str) -> str | None:
+    """Version token of the saved index, None for a missing index or one saved before versioning."""
+    name = current_version(folder_path)
+    if name is not None:
+        return name
+    try:
+        with open(os.path.join(folder_path, VERSION_NAME), "r", encoding="utf-8") as f:
+            return f.read().strip() or None
+    except FileNotFoundError:
+        return None
+
+
+def load_manifest(folder_path: str) -> dict:
+    """Return the ingest manifest stored with the index, or an empty one."""
+    def read(path):
+        with open(os.path.join(path, MANIFEST_NAME), "r", encoding="utf-8") as f:
+            return json.load(f)
+    try:
+        return _from_current(folder_path, read)
+    except FileNotFoundError:
+        return {}
+
+
+def load_vectorstore(folder_path: str, embeddings, lazy: bool = False, spill: bool = False) -> FAISS:
+    """Load a saved index and re-apply its search parameters (nprobe, efSearch).
+
+    With lazy=True (query side only) the index file and the docstore are
+    memory-mapped; the result is read-only. Otherwise the index is read
+    into memory, and so are the documents unless spill=True (ingestion),
+    which reads them from the docstore files only when asked for (see
+    SpilledDocstore). The BM25 and metadata indexes saved alongside, if
+    any, are attached as db.bm25 and db.metadata_index. All files come
+    from one version, the one CURRENT named when loading started.
+    """
+    return _from_current(folder_path, lambda path: _read_vectorstore(path, embeddings, lazy, spill))
+
+
+def _read_vectorstore(folder_path: str, embeddings, lazy: bool, spill: bool) -> FAISS:
+    if lazy and has_docstore(folder_path):
+        index = read_index_mmap(os.path.join(folder_path, INDEX_FILES[0]))
+        docstore = MmapDocstore(folder_path)
+        if len(docstore) != index.ntotal:
+            raise ValueError(f"Docstore in {folder_path} does not match index.faiss (save in progress?)")
+        db = FAISS(embeddings, index, docstore, RowIdMap(index.ntotal))
+    else:
+        index = faiss.read_index(os.path.join(folder_path, INDEX_FILES[0]))
+        with open(os.path.join(folder_path, INDEX_FILES[1]), "rb") as f:
+            docstore, index_to_docstore_id = pickle.load(f)
+        if docstore is None:  # saved by save_index: the documents are only in the docstore files
+            if spill:
+                docstore = SpilledDocstore(folder_path, {doc_id: row for row, doc_id in index_to_docstore_id.items()})
+            else:
+                docstore = InMemoryDocstore(dict(read_documents(folder_path)))
+        db = FAISS(embeddings, index, docstore, index_to_docstore_id)
+    params_path = os.path.join(folder_path, INDEX_PARAMS_NAME)
+    db.index_params = {"index_type": "flat"}
+    if os.path.exists(params_path):
+        with open(params_path, "r", encoding="utf-8") as f:
+            db.index_params = json.load(f)
+        apply_search_params(db.index, db.index_params)
+    db.bm25 = BM25Index.load(folder_path)
+    db.metadata_index = MetadataIndex.load(folder_path)
+    return db
+
+
+def index_bytes(index) -> int:
+    """Bytes of a FAISS index's vectors, codes and lists, computed from its sizes rather than serialized."""
+    index = faiss.downcast_index(index)
+    if isinstance(index, faiss.IndexRefine):
+        return index_bytes(index.base_index) + index_bytes(index.refine_index)
+    if isinstance(index, faiss.IndexHNSW):
+        hnsw = index.hnsw
+        links = hnsw.neighbors.size() * 4 + hnsw.offsets.size() * 8 + hnsw.levels.size() * 4
+        return index_bytes(index.storage) + links
+    ivf = faiss.try_extract_index_ivf(index)
+    if ivf is not None:
+        return ivf.ntotal * (ivf.code_size + 8) + index_bytes(ivf.quantizer)
+    if isinstance(index, faiss.IndexFlatCodes):
+        return index.ntotal * index.code_size
+    return index.ntotal * index.d * 4
+
+
+def vectorstore_bytes(db) -> int:
+    """Rough bytes a loaded vector store holds in memory.
+
+    Counts the FAISS index, the BM25 and metadata indexes and, unless the
+    docstore is memory-mapped (its pages belong to the OS file cache), the
+    documents.
+    """
+    total = index_bytes(db.index)
+    for extra in (db.bm25, db.metadata_index):
+        if extra is not None:
+            total += sum(value.nbytes for value in vars(extra).values() if hasattr(value, "nbytes"))
+    documents = getattr(db.docstore, "_dict", None)
+    if documents is not None:
+        for doc in documents.values():
+            total += sys.getsizeof(doc.page_content) + sys.getsizeof(doc.metadata) + DOC_OVERHEAD
+            total += sum(sys.getsizeof(key) + sys.getsizeof(value) for key, value in doc.metadata.items())
+    return total
+
+
+def save_index(db, folder_path: str, manifest: dict | None = None, lsh=None, publish: bool = True) -> str:
+    """Save the vector store (and manifest, and dedup.LSHIndex) as a new version in folder_path.
+
+    Every file goes into a fresh v-<token> folder and CURRENT is switched to
+    it with one rename, so readers see the old version or the new one,
+    never files of both, and a crash mid-save leaves the old one in place.
+    The documents are streamed once, in row order, into the docstore files
+    and the BM25 and metadata indexes, so a save holds one document at a
+    time beyond what db itself holds; index.pkl only keeps the row -> ID map.
+    With publish=False CURRENT is left alone and the version is recorded
+    in CHECKPOINT instead (see checkpoint_dir), for publish_index to
+    publish later. Returns the version name.
+    """
+    version = f"{_VERSION_PREFIX}{uuid.uuid4().hex}"
+    path = os.path.join(folder_path, version)
+    os.makedirs(path)
+    faiss.write_index(db.index, os.path.join(path, INDEX_FILES[0]))
+    with open(os.path.join(path, INDEX_FILES[1]), "wb") as f:
+        pickle.dump((None, db.index_to_docstore_id), f)
+    bm25, metadata_index = BM25Builder(), MetadataIndexBuilder()
+    with DocstoreWriter(path) as writer:
+        for row in range(db.index.ntotal):
+            doc_id = db.index_to_docstore_id[row]
+            doc = db.docstore.search(doc_id)
+            writer.add(doc_id, doc)
+            bm25.add(doc.page_content)
+            metadata_index.add(doc.metadata)
+    bm25.finish().save(path)
+    metadata_index.finish().save(path)
+    if getattr(db, "index_params", None):
+        with open(os.path.join(path, INDEX_PARAMS_NAME), "w", encoding="utf-8") as f:
+            json.dump(db.index_params, f)
+    if manifest is not None:
+        with open(os.path.join(path, MANIFEST_NAME), "w", encoding="utf-8") as f:
+            json.dump(manifest, f)
+    if lsh is not None:
+        lsh.save(path)
+    if isinstance(db.docstore, SpilledDocstore):
+        db.docstore.rebase(path, db.index_to_docstore_id)
+    if publish:
+        publish_index(folder_path, version)
+        return version
+    previous = checkpoint_dir(folder_path)
+    tmp_path = os.path.join(folder_path, f"{CHECKPOINT_NAME}.tmp-{os.getpid()}")
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump({"version": version, "base": current_version(folder_path)}, f)
+    os.replace(tmp_path, os.path.join(folder_path, CHECKPOINT_NAME))
+    if previous is not None:
+        shutil.rmtree(previous, ignore_errors=True)  # superseded, and never published
+    return version
+
+
+def checkpoint_dir(folder_path: str) -> str | None:
+    """Folder of the version a sync saved without publishing, None if there is none or the published
+    version changed since (it no longer builds on that)."""
+    try:
+        with open(os.path.join(folder_path, CHECKPOINT_NAME), "r", encoding="utf-8") as f:
+            checkpoint = json.load(f)
+    except (FileNotFoundError, json.JSONDecodeError):
+        return None
+    path = os.path.join(folder_path, checkpoint["version"])
+    if checkpoint["base"] != current_version(folder_path) or not os.path.isdir(path):
+        return None
+    return path
+
+
+def publish_index(folder_path: str, version: str):
+    """Make version the one readers load, then delete all older versions but the one it replaced.
+
+    That one stays for readers that looked up CURRENT just before the switch
+    (load_vectorstore moves on to the new version if it disappears
+    mid-load); the files of a folder saved before versioning go now.
+    """
+    previous = current_version(folder_path)
+    tmp_path = os.path.join(folder_path, f"{CURRENT_NAME}.tmp-{os.getpid()}")
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        f.write(version)
+    os.replace(tmp_path, os.path.join(folder_path, CURRENT_NAME))
+    _unlink(os.path.join(folder_path, CHECKPOINT_NAME))
+    _remove_versions(folder_path, keep=(version, previous))
+    _remove_flat_files(folder_path)
+
+
+def _unlink(path: str):
+    try:
+        os.unlink(path)
+    except (FileNotFoundError, PermissionError):
+        pass
+
+
+def _remove_versions(folder_path: str, keep=()):
+    for name in os.listdir(folder_path):
+        if name.startswith(_VERSION_PREFIX) and name not in keep:
+            # Windows refuses while a reader still maps its files; the next save tries again.
+            shutil.rmtree(os.path.join(folder_path, name), ignore_errors=True)
+
+
+def _remove_flat_files(folder_path: str):
+    for name in _FLAT_NAMES:
+        _unlink(os.path.join(folder_path, name))
+
+
+def clear_index(folder_path: str):
+    """Remove the saved index (every version) and manifest but keep the folder and anything else in it."""
+    _unlink(os.path.join(folder_path, CURRENT_NAME))
+    _unlink(os.path.join(folder_path, CHECKPOINT_NAME))
+    shutil.rmtree(os.path.join(folder_path, STAGING_NAME), ignore_errors=True)
+    if os.path.isdir(folder_path):
+        _remove_versions(folder_path)
+    _remove_flat_files(folder_path)
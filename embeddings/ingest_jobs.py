@@ -0,0 +1,170 @@
+#background ingestion jobs: a sync runs in a worker thread while its per-file progress is persisted for polling.
+#
+#   faiss_openai_cv/jobs/<job id>.json   {"id", "state", "files": {rel: state}, "stats", "error", ...}
+
+import json
+import os
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+JOBS_DIR_NAME = "jobs"
+ACTIVE_STATES = ("queued", "running")
+KEEP_JOBS = 20
+# Jobs of different index folders run side by side, up to this many at once.
+JOB_WORKERS = int(os.getenv("INGEST_JOB_WORKERS", "4"))
+_runner = None
+_waiting = {}  # index folder -> jobs queued behind the one running there
+_waiting_lock = threading.Lock()
+
+
+def _jobs_dir(folder_path: str) -> str:
+    return os.path.join(folder_path, JOBS_DIR_NAME)
+
+
+def _executor() -> ThreadPoolExecutor:
+    global _runner
+    if _runner is None:
+        _runner = ThreadPoolExecutor(max_workers=JOB_WORKERS, thread_name_prefix="ingest-job")
+    return _runner
+
+
+def _submit(job, fn):
+    # Two jobs never write the same index at once: a folder's next job is only submitted once its
+    # current one is done, so waiting jobs stay "queued" without holding a worker.
+    folder = os.path.abspath(job.folder_path)
+    with _waiting_lock:
+        if folder in _waiting:
+            _waiting[folder].append((job, fn))
+            return
+        _waiting[folder] = []
+    _executor().submit(_run_folder, folder, job, fn)
+
+
+def _run_folder(folder: str, job, fn):
+    while job is not None:
+        try:
+            job.run(fn)
+        except Exception as e:  # run records fn's errors itself; this is its job file failing to save
+            print(f"⚠️ Ingestion job {job.record['id']} failed: {e}")
+        with _waiting_lock:
+            job, fn = _waiting[folder].pop(0) if _waiting[folder] else (None, None)
+            if job is None:
+                del _waiting[folder]
+
+
+class IngestJob:
+    """State of one job, written to its JSON file at most every save_interval seconds while it runs."""
+
+    def __init__(self, folder_path: str, job_id: str, save_interval: float = 0.5):
+        self.folder_path = folder_path
+        self.path = os.path.join(_jobs_dir(folder_path), f"{job_id}.json")
+        self.save_interval = save_interval
+        self.record = {"id": job_id, "state": "queued", "pid": os.getpid(), "created": time.time(),
+                       "started": None, "finished": None, "files": {}, "stats": None, "error": None}
+        self._lock = threading.Lock()
+        self._saved_at = 0.0
+
+    def save(self, force: bool = False):
+        with self._lock:
+            now = time.monotonic()
+            if not force and now - self._saved_at < self.save_interval:
+                return
+            self._saved_at = now
+            tmp_path = f"{self.path}.tmp-{os.getpid()}-{threading.get_ident()}"
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump(self.record, f)
+            os.replace(tmp_path, self.path)
+
+    def progress(self, rel_path: str, state: str):
+        """sync_index progress callback."""
+        with self._lock:
+            self.record["files"][rel_path] = state
+        self.save()
+
+    def run(self, fn):
+        self.record.update(state="running", started=time.time())
+        self.save(force=True)
+        try:
+            self.record["stats"] = fn(self.progress)
+            self.record["state"] = "done"
+        except Exception as e:
+            self.record.update(state="failed", error=str(e))
+        self.record["finished"] = time.time()
+        self.save(force=True)
+
+
+def start_job(folder_path: str, fn) -> str:
+    """Run fn(progress) in the background and return the job ID to poll with load_job.
+
+    fn does the ingestion (e.g. sync_shards(..., progress=progress)) and
+    returns its stats. The index it writes only changes for readers when
+    save_index switches CURRENT to the new version, so queries keep using
+    the previous index until the job is done.
+    """
+    os.makedirs(_jobs_dir(folder_path), exist_ok=True)
+    job_id = f"{time.strftime('%Y%m%d-%H%M%S')}-{uuid.uuid4().hex[:6]}"
+    job = IngestJob(folder_path, job_id)
+    job.save(force=True)
+    _prune(folder_path)
+    _submit(job, fn)
+    return job_id
+
+
+def _alive(pid: int) -> bool:
+    if pid == os.getpid() or os.name == "nt":
+        return True  # os.kill would terminate the process on Windows rather than probe it
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+
+def load_job(folder_path: str, job_id: str) -> dict | None:
+    """The job's last saved record, None if unknown.
+
+    A job still marked queued or running whose process has exited (the
+    server restarted) is reported as "interrupted"; running the sync again
+    resumes from its last checkpoint.
+    """
+    path = os.path.join(_jobs_dir(folder_path), f"{os.path.basename(job_id)}.json")
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            record = json.load(f)
+    except (FileNotFoundError, json.JSONDecodeError):
+        return None
+    if record["state"] in ACTIVE_STATES and not _alive(record["pid"]):
+        record["state"] = "interrupted"
+    return record
+
+
+def latest_job(folder_path: str) -> dict | None:
+    names = sorted(n for n in os.listdir(_jobs_dir(folder_path)) if n.endswith(".json")) \
+        if os.path.isdir(_jobs_dir(folder_path)) else []
+    return load_job(folder_path, names[-1][:-len(".json")]) if names else None
+
+
+def job_progress(record: dict) -> tuple:
+    """(finished files, total files) of a job record."""
+    files = record["files"].values()
+    return sum(state in ("embedded", "removed") for state in files), len(files)
+
+
+def _prune(folder_path: str):
+    """Delete all but the newest KEEP_JOBS finished job records; queued and running jobs are never pruned,
+    however many were started since, so their pages can still poll them."""
+    names = sorted(n for n in os.listdir(_jobs_dir(folder_path)) if n.endswith(".json"))
+    finished = []
+    for name in names:
+        record = load_job(folder_path, name[:-len(".json")])
+        if record is None or record["state"] not in ACTIVE_STATES:
+            finished.append(name)
+    for name in finished[:-KEEP_JOBS]:
+        try:
+            os.unlink(os.path.join(_jobs_dir(folder_path), name))
+        except FileNotFoundError:
+            pass  # pruned by another job starting at the same time
@@ -0,0 +1,116 @@
+#checkpoints of a sync in progress: each one writes only the chunks and vectors added since the previous one,
+#so checkpointing costs what was added rather than a rewrite of the whole index.
+#
+#   <index folder>/staging/checkpoint.json   {"settings", "source", "steps": [...]}, rewritten by each checkpoint
+#   <index folder>/staging/part-00000/       docstore.bin/.idx, vectors.f32 (float32, one row per record) and
+#                                            files.json (the files the part completed) of one checkpoint
+#
+# The steps replay the sync on top of the version it started from: {"rebuild": true} starts from an empty
+# index, {"deleted": [...], "dropped": [...]} removes chunks and files, {"part": "part-00000"} adds a part.
+
+import json
+import os
+import shutil
+
+import numpy as np
+from langchain_core.documents import Document
+
+from mmap_docstore import DocstoreWriter, read_documents
+
+STAGING_NAME = "staging"
+_CHECKPOINT = "checkpoint.json"
+_VECTORS = "vectors.f32"
+_FILES = "files.json"
+
+
+class StagingLog:
+    """The checkpoints written so far by one sync of an index folder.
+
+    settings and source (the version the sync started from) must match
+    for an interrupted sync's log to be resumed (see resume). add() streams
+    each batch of added chunks into the open part; checkpoint() closes it
+    and records it, so a part is written once and never rewritten.
+    """
+
+    def __init__(self, folder_path: str, settings: dict, source: str | None, steps: list | None = None):
+        self.path = os.path.join(folder_path, STAGING_NAME)
+        self.settings = settings
+        self.source = source
+        self.steps = steps or []
+        self._part = None  # (name, DocstoreWriter, vectors file, ids)
+
+    @classmethod
+    def resume(cls, folder_path: str, settings: dict, source: str | None) -> "StagingLog":
+        """The log an interrupted sync with these settings left on source, or an empty one (discarding any other)."""
+        try:
+            with open(os.path.join(folder_path, STAGING_NAME, _CHECKPOINT), "r", encoding="utf-8") as f:
+                saved = json.load(f)
+        except (FileNotFoundError, json.JSONDecodeError):
+            saved = None
+        if saved is not None and saved["settings"] == settings and saved["source"] == source:
+            return cls(folder_path, settings, source, saved["steps"])
+        shutil.rmtree(os.path.join(folder_path, STAGING_NAME), ignore_errors=True)
+        return cls(folder_path, settings, source)
+
+    def rebuilt(self):
+        self.steps = [{"rebuild": True}]
+
+    def removed(self, ids: list, rels: list):
+        if ids or rels:
+            self.steps.append({"deleted": list(ids), "dropped": list(rels)})
+
+    def part_path(self, name: str) -> str:
+        return os.path.join(self.path, name)
+
+    def _open(self):
+        name = f"part-{sum('part' in step for step in self.steps):05d}"
+        path = self.part_path(name)
+        shutil.rmtree(path, ignore_errors=True)  # left by a run that crashed before recording it
+        os.makedirs(path)
+        self._part = (name, DocstoreWriter(path), open(os.path.join(path, _VECTORS), "wb"), [])
+
+    def add(self, ids: list, texts: list, metadatas: list, vectors):
+        if self._part is None:
+            self._open()
+        _, writer, vector_file, part_ids = self._part
+        for doc_id, text, metadata in zip(ids, texts, metadatas):
+            writer.add(doc_id, Document(page_content=text, metadata=metadata))
+        np.ascontiguousarray(vectors, dtype=np.float32).tofile(vector_file)
+        part_ids.extend(ids)
+
+    def checkpoint(self, files: dict) -> tuple:
+        """Close the open part, with the files it completed, and record it; returns (its folder, its IDs)."""
+        if self._part is None:
+            self._open()
+        name, writer, vector_file, ids = self._part
+        self._part = None
+        writer.close()
+        vector_file.close()
+        with open(os.path.join(self.part_path(name), _FILES), "w", encoding="utf-8") as f:
+            json.dump(files, f)
+        self.steps.append({"part": name})
+        tmp_path = os.path.join(self.path, f"{_CHECKPOINT}.tmp-{os.getpid()}")
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump({"settings": self.settings, "source": self.source, "steps": self.steps}, f)
+        os.replace(tmp_path, os.path.join(self.path, _CHECKPOINT))
+        return self.part_path(name), ids
+
+    def read_part(self, name: str) -> tuple:
+        """(IDs, Documents, float32 vectors, files) of a recorded part."""
+        path = self.part_path(name)
+        ids, documents = [], []
+        for doc_id, doc in read_documents(path):
+            ids.append(doc_id)
+            documents.append(doc)
+        vectors = np.fromfile(os.path.join(path, _VECTORS), dtype=np.float32)
+        vectors = vectors.reshape(len(ids), -1) if ids else vectors.reshape(0, 0)
+        with open(os.path.join(path, _FILES), "r", encoding="utf-8") as f:
+            return ids, documents, vectors, json.load(f)
+
+    def discard(self):
+        """Delete the log, once the sync it belongs to saved its index."""
+        if self._part is not None:
+            self._part[1].close()
+            self._part[2].close()
+            self._part = None
+        shutil.rmtree(self.path, ignore_errors=True)
@@ -0,0 +1,149 @@
+#local CPU embeddings: a small sentence-transformer run through ONNX Runtime, no network calls.
+
+import os
+import queue
+import threading
+
+import numpy as np
+from langchain_core.embeddings import Embeddings
+
+# "api" uses the hosted Google/OpenAI models, "local" this module.
+EMBEDDING_BACKEND = os.getenv("EMBEDDING_BACKEND", "api")
+LOCAL_EMBEDDING_MODEL = os.getenv("LOCAL_EMBEDDING_MODEL", "sentence-transformers/all-MiniLM-L6-v2")
+# int8-quantized export from the model repo; runs on any x86-64 CPU with AVX2.
+LOCAL_EMBEDDING_ONNX = os.getenv("LOCAL_EMBEDDING_ONNX", "onnx/model_quint8_avx2.onnx")
+
+
+def _model_files(model: str, onnx_file: str) -> tuple:
+    """(tokenizer.json, model.onnx) paths from a local folder, else from the Hugging Face cache/hub."""
+    if os.path.isdir(model):
+        onnx_path = os.path.join(model, onnx_file)
+        for candidate in (os.path.basename(onnx_file), "model.onnx"):
+            if not os.path.exists(onnx_path):
+                onnx_path = os.path.join(model, candidate)
+        return os.path.join(model, "tokenizer.json"), onnx_path
+    from huggingface_hub import hf_hub_download
+    # Downloaded once, then served from the local cache (set HF_HUB_OFFLINE=1 to never touch the network).
+    return hf_hub_download(model, "tokenizer.json"), hf_hub_download(model, onnx_file)
+
+
+class LocalEmbeddings(Embeddings):
+    """Mean-pooled, L2-normalised sentence embeddings computed on the CPU.
+
+    Documents are sorted by token length and cut into batches of at most
+    batch_size texts and max_batch_tokens padded tokens, so short chunks are
+    not padded out to the longest one in the corpus. Queries arriving from
+    several threads at once (e.g. Streamlit sessions) are coalesced into one
+    forward pass by a small micro-batcher.
+    """
+
+    def __init__(self, model: str = LOCAL_EMBEDDING_MODEL, onnx_file: str = LOCAL_EMBEDDING_ONNX,
+                 max_length: int = 256, batch_size: int = 64, max_batch_tokens: int = 8192,
+                 threads: int | None = None):
+        import onnxruntime as ort
+        from tokenizers import Tokenizer
+
+        tokenizer_path, onnx_path = _model_files(model, onnx_file)
+        self.model = f"local:{os.path.basename(model.rstrip('/'))}:{os.path.basename(onnx_path)}"
+        self.max_length = max_length
+        self.batch_size = batch_size
+        self.max_batch_tokens = max_batch_tokens
+
+        self.tokenizer = Tokenizer.from_file(tokenizer_path)
+        self.tokenizer.enable_truncation(max_length=max_length)
+        self.tokenizer.no_padding()
+        options = ort.SessionOptions()
+        options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        options.intra_op_num_threads = threads or os.cpu_count() or 1
+        self.session = ort.InferenceSession(onnx_path, options, providers=["CPUExecutionProvider"])
+        self.input_names = {i.name for i in self.session.get_inputs()}
+
+        self._queries = queue.Queue()
+        self._worker = None
+        self._worker_lock = threading.Lock()
+
+    def _forward(self, encodings: list) -> np.ndarray:
+        width = max(len(e.ids) for e in encodings)
+        ids = np.zeros((len(encodings), width), dtype=np.int64)
+        mask = np.zeros((len(encodings), width), dtype=np.int64)
+        for i, e in enumerate(encodings):
+            ids[i, :len(e.ids)] = e.ids
+            mask[i, :len(e.ids)] = 1
+        feeds = {"input_ids": ids, "attention_mask": mask}
+        if "token_type_ids" in self.input_names:
+            feeds["token_type_ids"] = np.zeros_like(ids)
+        hidden = self.session.run(None, feeds)[0]
+        weights = mask[:, :, None].astype(np.float32)
+        pooled = (hidden * weights).sum(axis=1) / np.maximum(weights.sum(axis=1), 1e-9)
+        return pooled / np.maximum(np.linalg.norm(pooled, axis=1, keepdims=True), 1e-12)
+
+    def _embed(self, texts: list) -> np.ndarray:
+        encodings = self.tokenizer.encode_batch(texts)
+        order = sorted(range(len(texts)), key=lambda i: len(encodings[i].ids))
+        out = None
+        start = 0
+        while start < len(order):
+            # Grow the batch while the padded size (rows x longest row) fits the token budget.
+            end = start + 1
+            while (end < len(order) and end - start < self.batch_size
+                   and (end - start + 1) * len(encodings[order[end]].ids) <= self.max_batch_tokens):
+                end += 1
+            rows = order[start:end]
+            vectors = self._forward([encodings[i] for i in rows])
+            if out is None:
+                out = np.empty((len(texts), vectors.shape[1]), dtype=np.float32)
+            out[rows] = vectors
+            start = end
+        return out if out is not None else np.empty((0, 0), dtype=np.float32)
+
+    def embed_documents(self, texts: list) -> list:
+        if not texts:
+            return []
+        return self._embed(list(texts)).tolist()
+
+    def _serve_queries(self):
+        while True:
+            batch = [self._queries.get()]
+            try:
+                # Take whatever queued up during the last forward pass, up to one batch; a lone
+                # query is not held back waiting for company.
+                while len(batch) < self.batch_size:
+                    batch.append(self._queries.get_nowait())
+            except queue.Empty:
+                pass
+            try:
+                vectors = self._embed([text for text, _ in batch])
+                for (_, slot), vector in zip(batch, vectors):
+                    slot["vector"] = vector.tolist()
+            except Exception as exc:
+                for _, slot in batch:
+                    slot["error"] = exc
+            for _, slot in batch:
+                slot["done"].set()
+
+    def embed_query(self, text: str) -> list:
+        with self._worker_lock:
+            if self._worker is None:
+                self._worker = threading.Thread(target=self._serve_queries, daemon=True)
+                self._worker.start()
+        slot = {"done": threading.Event()}
+        self._queries.put((text, slot))
+        slot["done"].wait()
+        if "error" in slot:
+            raise slot["error"]
+        return slot["vector"]
+
+
+if __name__ == "__main__":
+    import time
+
+    embeddings = LocalEmbeddings()
+    texts = [("Dakshinkali temple is dedicated to the goddess Kali. " * (1 + i % 8)) for i in range(512)]
+    start = time.perf_counter()
+    embeddings.embed_documents(texts)
+    print(f"⚡ {len(texts) / (time.perf_counter() - start):.0f} chunks/sec ({embeddings.model})")
+    embeddings.embed_query("warm up")
+    start = time.perf_counter()
+    for _ in range(50):
+        embeddings.embed_query("Which day are animal sacrifices made at Dakshinkali?")
+    print(f"🔍 {(time.perf_counter() - start) / 50 * 1000:.1f} ms per query")
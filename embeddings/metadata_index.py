@@ -0,0 +1,134 @@
+#inverted index from chunk metadata values (source, candidate, page, ...) to FAISS rows, for pre-filtered search.
+
+import os
+from array import array
+
+import faiss
+import numpy as np
+
+METADATA_INDEX_NAME = "metadata_index.npz"
+METADATA_FIELDS = ("source", "file", "candidate", "page", "batch")
+# Filters matching at most this many rows are scored exactly against reconstructed vectors.
+BRUTE_FORCE_ROWS = 20000
+
+
+def _norm(value) -> str:
+    return str(value).strip().casefold()
+
+
+class MetadataIndexBuilder:
+    """Collects the rows of each (field, value) one chunk at a time, in compact int64 arrays."""
+
+    def __init__(self, fields=METADATA_FIELDS):
+        self.fields = fields
+        self._postings = {}
+        self._labels = {}
+        self._count = 0
+
+    def add(self, metadata: dict):
+        for field in self.fields:
+            if metadata.get(field) is not None:
+                key = (field, _norm(metadata[field]))
+                if key not in self._postings:
+                    self._postings[key] = array("q")
+                    self._labels[key] = str(metadata[field])
+                self._postings[key].append(self._count)
+        self._count += 1
+
+    def finish(self) -> "MetadataIndex":
+        keys = sorted(self._postings)
+        offsets = np.zeros(len(keys) + 1, dtype=np.int64)
+        offsets[1:] = np.cumsum([len(self._postings[key]) for key in keys])
+        rows = np.concatenate([np.frombuffer(self._postings[key], dtype=np.int64) for key in keys]) \
+            if keys else np.empty(0, dtype=np.int64)
+        return MetadataIndex(np.array([f for f, _ in keys], dtype=str), np.array([v for _, v in keys], dtype=str),
+                             offsets, rows, np.array([self._labels[key] for key in keys], dtype=str))
+
+
+class MetadataIndex:
+    """Sorted row lists per (field, value), stored as flat arrays like BM25Index.
+
+    Values are compared as case-insensitive strings, so {"candidate": "asha
+    gurung"} and {"page": 0} both work.
+    """
+
+    def __init__(self, fields, values, offsets, rows, labels):
+        self.fields = fields
+        self.values = values
+        self.offsets = offsets
+        self.rows = rows
+        self.labels = labels  # original spelling of each value, for listing
+        self._lookup = {(f, v): i for i, (f, v) in enumerate(zip(fields.tolist(), values.tolist()))}
+
+    @classmethod
+    def build(cls, metadatas, fields=METADATA_FIELDS) -> "MetadataIndex":
+        builder = MetadataIndexBuilder(fields)
+        for metadata in metadatas:
+            builder.add(metadata)
+        return builder.finish()
+
+    def save(self, folder_path: str):
+        with open(os.path.join(folder_path, METADATA_INDEX_NAME), "wb") as f:
+            np.savez(f, fields=self.fields, values=self.values, offsets=self.offsets, rows=self.rows,
+                     labels=self.labels)
+
+    @classmethod
+    def load(cls, folder_path: str) -> "MetadataIndex | None":
+        path = os.path.join(folder_path, METADATA_INDEX_NAME)
+        if not os.path.exists(path):
+            return None
+        with np.load(path) as data:
+            return cls(data["fields"], data["values"], data["offsets"], data["rows"], data["labels"])
+
+    def values_of(self, field: str) -> list:
+        """Distinct values recorded for field, in their original spelling."""
+        return [label for f, label in zip(self.fields.tolist(), self.labels.tolist()) if f == field]
+
+    def match(self, filter: dict) -> np.ndarray:
+        """Rows matching every field of filter; a list of values matches any of them."""
+        result = None
+        for field, wanted in filter.items():
+            wanted = wanted if isinstance(wanted, (list, tuple, set)) else [wanted]
+            parts = [self.rows[self.offsets[i]:self.offsets[i + 1]]
+                     for i in (self._lookup.get((field, _norm(w))) for w in wanted) if i is not None]
+            rows = np.unique(np.concatenate(parts)) if parts else np.empty(0, dtype=np.int64)
+            result = rows if result is None else np.intersect1d(result, rows, assume_unique=True)
+        return result if result is not None else np.empty(0, dtype=np.int64)
+
+
+def _selector_params(index, rows: np.ndarray):
+    """Search parameters that make FAISS skip every row not in rows while scanning."""
+    selector = faiss.IDSelectorBatch(rows)
+    index = faiss.downcast_index(index)
+    if isinstance(index, faiss.IndexRefine):
+        return faiss.IndexRefineSearchParameters(k_factor=index.k_factor,
+                                                 base_index_params=_selector_params(index.base_index, rows))
+    ivf = faiss.try_extract_index_ivf(index)
+    if ivf is not None:
+        # Matches can sit in any list; probing them all keeps a filtered search exact.
+        return faiss.SearchParametersIVF(sel=selector, nprobe=ivf.nlist)
+    if isinstance(index, faiss.IndexHNSW):
+        return faiss.SearchParametersHNSW(sel=selector, efSearch=max(index.hnsw.efSearch, 256))
+    return faiss.SearchParameters(sel=selector)
+
+
+def filtered_search(index, vector, k: int, rows: np.ndarray) -> list:
+    """(row, L2 distance) pairs for the k nearest of the given rows only.
+
+    Small row sets are scored directly against their stored vectors; larger
+    ones, and IVF indexes that cannot return stored vectors, go through
+    FAISS with an ID selector. Either way rows outside the filter are never
+    scored, so a narrow filter cannot be crowded out by other chunks.
+    """
+    query = np.asarray(vector, dtype=np.float32)
+    if len(rows) <= BRUTE_FORCE_ROWS:
+        try:
+            stored = index.reconstruct_batch(rows)
+        except RuntimeError:
+            stored = None
+        if stored is not None:
+            distances = ((stored - query) ** 2).sum(axis=1)
+            top = np.argsort(distances)[:k]
+            return [(int(rows[i]), float(distances[i])) for i in top]
+    distances, found = index.search(query[None, :], min(k, len(rows)), params=_selector_params(index, rows))
+    return [(int(r), float(d)) for r, d in zip(found[0], distances[0]) if r != -1]
@@ -0,0 +1,220 @@
+#docstore files next to the FAISS index: chunk texts and metadata decoded one record at a time (memory-mapped
+#for queries, read on demand during ingestion) instead of being unpickled from index.pkl all at once.
+#
+#   docstore.idx  b"DOCSTORE" | uint64 count | (count + 1) uint64 record offsets
+#   docstore.bin  one UTF-8 JSON record per FAISS row: {"id", "page_content", "metadata"}
+
+import json
+import mmap
+import os
+import struct
+import sys
+from array import array
+from collections.abc import Mapping
+
+import faiss
+from langchain_community.docstore.base import AddableMixin, Docstore
+from langchain_core.documents import Document
+
+DOCSTORE_DATA = "docstore.bin"
+DOCSTORE_INDEX = "docstore.idx"
+DOCSTORE_FILES = (DOCSTORE_DATA, DOCSTORE_INDEX)
+_MAGIC = b"DOCSTORE"
+_HEADER = struct.Struct("<8sQ")
+_OFFSET = struct.Struct("<Q")
+
+
+class DocstoreWriter:
+    """Writes docstore records one at a time, so a save holds one document (and 8 bytes per row) in memory."""
+
+    def __init__(self, folder_path: str):
+        self.folder_path = folder_path
+        self._data = open(os.path.join(folder_path, DOCSTORE_DATA), "wb")
+        self._offsets = array("Q", [0])
+
+    def add(self, doc_id: str, doc: Document):
+        record = json.dumps({"id": doc_id, "page_content": doc.page_content, "metadata": doc.metadata},
+                            ensure_ascii=False).encode("utf-8")
+        self._data.write(record)
+        self._offsets.append(self._offsets[-1] + len(record))
+
+    def close(self):
+        self._data.close()
+        offsets = self._offsets
+        if sys.byteorder != "little":
+            offsets = array("Q", offsets)
+            offsets.byteswap()
+        with open(os.path.join(self.folder_path, DOCSTORE_INDEX), "wb") as index:
+            index.write(_HEADER.pack(_MAGIC, len(offsets) - 1))
+            index.write(offsets.tobytes())
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def read_documents(folder_path: str):
+    """(ID, Document) of every record, in row order, read sequentially rather than mapped."""
+    with open(os.path.join(folder_path, DOCSTORE_INDEX), "rb") as index:
+        magic, count = _HEADER.unpack(index.read(_HEADER.size))
+        if magic != _MAGIC:
+            raise ValueError(f"{folder_path} does not contain a docstore index")
+        offsets = array("Q")
+        offsets.frombytes(index.read((count + 1) * _OFFSET.size))
+        if sys.byteorder != "little":
+            offsets.byteswap()
+    with open(os.path.join(folder_path, DOCSTORE_DATA), "rb") as data:
+        for row in range(count):
+            record = json.loads(data.read(offsets[row + 1] - offsets[row]))
+            yield record["id"], Document(id=record["id"], page_content=record["page_content"],
+                                         metadata=record["metadata"])
+
+
+def _map(path: str):
+    with open(path, "rb") as f:
+        if os.fstat(f.fileno()).st_size == 0:
+            return b""
+        return mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+
+class MmapDocstore(Docstore):
+    """Read-only docstore keyed by FAISS row; records are decoded on lookup.
+
+    Opening it only maps the two files, so load time does not grow with the
+    corpus and every process serving the same index shares the same pages.
+    """
+
+    def __init__(self, folder_path: str):
+        self._index = _map(os.path.join(folder_path, DOCSTORE_INDEX))
+        self._data = _map(os.path.join(folder_path, DOCSTORE_DATA))
+        magic, self.count = _HEADER.unpack_from(self._index, 0)
+        if magic != _MAGIC:
+            raise ValueError(f"{folder_path} does not contain a docstore index")
+
+    def __len__(self):
+        return self.count
+
+    def _offset(self, i: int) -> int:
+        return _OFFSET.unpack_from(self._index, _HEADER.size + i * _OFFSET.size)[0]
+
+    def record(self, row: int) -> dict:
+        if not 0 <= row < self.count:
+            raise KeyError(row)
+        return json.loads(self._data[self._offset(row):self._offset(row + 1)])
+
+    def search(self, search: str | int) -> Document | str:
+        try:
+            record = self.record(int(search))
+        except (KeyError, ValueError):
+            return f"ID {search} not found."
+        return Document(id=record["id"], page_content=record["page_content"], metadata=record["metadata"])
+
+
+class RowIdMap(Mapping):
+    """Stands in for index_to_docstore_id: FAISS row i is docstore key i."""
+
+    def __init__(self, count: int):
+        self.count = count
+
+    def __getitem__(self, row):
+        row = int(row)
+        if not 0 <= row < self.count:
+            raise KeyError(row)
+        return row
+
+    def __len__(self):
+        return self.count
+
+    def __iter__(self):
+        return iter(range(self.count))
+
+
+def has_docstore(folder_path: str) -> bool:
+    return all(os.path.exists(os.path.join(folder_path, name)) for name in DOCSTORE_FILES)
+
+
+def read_index_mmap(path: str):
+    """Memory-map the FAISS index file instead of copying it into the heap."""
+    flags = faiss.IO_FLAG_MMAP | getattr(faiss, "IO_FLAG_MMAP_IFC", 0) | faiss.IO_FLAG_READ_ONLY
+    try:
+        return faiss.read_index(path, flags)
+    except RuntimeError:
+        return faiss.read_index(path)
+
+
+class SpilledDocstore(Docstore, AddableMixin):
+    """Writable docstore for ingestion that keeps only the documents added since the last save in memory.
+
+    Documents already saved to folder_path's docstore files are read back
+    by ID when asked for (rows maps ID -> record number), and rebase()
+    moves onto the files a new save wrote. attach() does the same for
+    documents a checkpoint wrote to docstore files of their own (see
+    ingest_staging). The files are opened, never mapped, and close()
+    releases them, so an old version can be deleted on Windows too.
+    """
+
+    def __init__(self, folder_path: str, rows: dict | None = None):
+        self.folder_path = folder_path
+        self._folders = [folder_path]
+        self._rows = rows or {}  # ID -> record number, plus (folder number << 40) past the first folder
+        self._added = {}
+        self._files = {}
+
+    def __len__(self):
+        return len(self._rows) + len(self._added)
+
+    def _read(self, key: int) -> dict:
+        folder, row = key >> 40, key & ((1 << 40) - 1)
+        if folder not in self._files:
+            path = self._folders[folder]
+            self._files[folder] = (open(os.path.join(path, DOCSTORE_INDEX), "rb"),
+                                   open(os.path.join(path, DOCSTORE_DATA), "rb"))
+        index, data = self._files[folder]
+        index.seek(_HEADER.size + row * _OFFSET.size)
+        start, end = struct.unpack("<2Q", index.read(2 * _OFFSET.size))
+        data.seek(start)
+        return json.loads(data.read(end - start))
+
+    def search(self, search: str) -> Document | str:
+        if search in self._added:
+            return self._added[search]
+        key = self._rows.get(search)
+        if key is None:
+            return f"ID {search} not found."
+        record = self._read(key)
+        return Document(id=record["id"], page_content=record["page_content"], metadata=record["metadata"])
+
+    def add(self, texts: dict):
+        overlapping = [doc_id for doc_id in texts if doc_id in self._added or doc_id in self._rows]
+        if overlapping:
+            raise ValueError(f"Tried to add ids that already exist: {overlapping}")
+        self._added.update(texts)
+
+    def delete(self, ids: list):
+        for doc_id in ids:
+            if self._added.pop(doc_id, None) is None and self._rows.pop(doc_id, None) is None:
+                raise ValueError(f"ID {doc_id} not found.")
+
+    def attach(self, folder_path: str, ids: list):
+        """Drop the in-memory documents ids, which were written in this order to folder_path's docstore files."""
+        folder = len(self._folders)
+        self._folders.append(folder_path)
+        for row, doc_id in enumerate(ids):
+            del self._added[doc_id]
+            self._rows[doc_id] = (folder << 40) | row
+
+    def close(self):
+        for files in self._files.values():
+            for f in files:
+                f.close()
+        self._files = {}
+
+    def rebase(self, folder_path: str, index_to_docstore_id):
+        """Drop the in-memory documents once a save has written every row to folder_path's docstore files."""
+        self.close()
+        self.folder_path = folder_path
+        self._folders = [folder_path]
+        self._rows = {doc_id: row for row, doc_id in index_to_docstore_id.items()}
+        self._added = {}
@@ -0,0 +1,90 @@
+#persistent cache of extracted PDF page text, so re-chunking never has to parse a PDF twice.
+
+import json
+import os
+import sqlite3
+import threading
+import time
+import zlib
+
+from langchain_core.documents import Document
+
+DEFAULT_PAGE_CACHE_PATH = os.getenv(
+    "PAGE_CACHE_PATH",
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), "page_cache.sqlite"),
+)
+PAGE_CACHE = os.getenv("PAGE_CACHE", "1") == "1"
+
+
+class PageCache:
+    """SQLite table of zlib-compressed page text keyed by (PDF sha256, page number).
+
+    The key is the file's content hash, so a renamed or copied PDF is still
+    a hit and an edited one is a miss. A PDF counts as cached only once all
+    of its pages are stored (the files table row is written in the same
+    transaction), so an interrupted parse is simply redone. Safe to share
+    between the processes of a parse pool.
+    """
+
+    def __init__(self, path: str = DEFAULT_PAGE_CACHE_PATH):
+        self.path = path
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False, timeout=30)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            """CREATE TABLE IF NOT EXISTS pages (
+                   file_sha256 TEXT NOT NULL,
+                   page INTEGER NOT NULL,
+                   text BLOB NOT NULL,
+                   metadata TEXT NOT NULL,
+                   PRIMARY KEY (file_sha256, page)
+               ) WITHOUT ROWID"""
+        )
+        self._conn.execute(
+            """CREATE TABLE IF NOT EXISTS files (
+                   file_sha256 TEXT PRIMARY KEY,
+                   pages INTEGER NOT NULL,
+                   parsed_at REAL NOT NULL
+               ) WITHOUT ROWID"""
+        )
+        self._conn.commit()
+
+    def get_pages(self, file_hash: str, source: str) -> list | None:
+        """The cached pages of a PDF as Documents with source set to its current path, or None."""
+        with self._lock:
+            if self._conn.execute("SELECT 1 FROM files WHERE file_sha256 = ?", (file_hash,)).fetchone() is None:
+                return None
+            rows = self._conn.execute(
+                "SELECT text, metadata FROM pages WHERE file_sha256 = ? ORDER BY page", (file_hash,)
+            ).fetchall()
+        return [Document(page_content=zlib.decompress(text).decode("utf-8"),
+                         metadata={"source": source, **json.loads(metadata)}) for text, metadata in rows]
+
+    def put_pages(self, file_hash: str, pages: list):
+        # The path is not part of the cached entry; get_pages fills in wherever the file is now.
+        rows = [(file_hash, i, zlib.compress(page.page_content.encode("utf-8"), 6),
+                 json.dumps({k: v for k, v in page.metadata.items() if k != "source"}, default=str))
+                for i, page in enumerate(pages)]
+        with self._lock:
+            self._conn.execute("DELETE FROM pages WHERE file_sha256 = ?", (file_hash,))
+            self._conn.executemany("INSERT INTO pages VALUES (?, ?, ?, ?)", rows)
+            self._conn.execute("INSERT OR REPLACE INTO files VALUES (?, ?, ?)", (file_hash, len(pages), time.time()))
+            self._conn.commit()
+
+
+_caches = {}
+_caches_lock = threading.Lock()
+
+
+def get_page_cache(path: str = DEFAULT_PAGE_CACHE_PATH) -> PageCache:
+    """One PageCache per path and process, so parse workers each open their own connection.
+
+    Keyed by process ID too: a forked worker inherits the parent's _caches,
+    and SQLite connections must never be used across a fork.
+    """
+    key = (os.getpid(), path)
+    with _caches_lock:
+        if key not in _caches:
+            _caches[key] = PageCache(path)
+        return _caches[key]
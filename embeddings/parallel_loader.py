@@ -0,0 +1,81 @@
+#parse and split PDFs in a process pool, streaming each file's chunks out as soon as it is done.
+
+import multiprocessing
+import os
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+
+from langchain_community.document_loaders import PyPDFLoader
+from langchain_text_splitters import RecursiveCharacterTextSplitter
+
+from page_cache import get_page_cache
+
+
+def load_pages(path: str, file_hash: str | None = None, cache_path: str | None = None) -> list:
+    """Pages of one PDF, read from the page cache when the file's hash is known and cached."""
+    if file_hash is None or cache_path is None:
+        return PyPDFLoader(path).load()
+    cache = get_page_cache(cache_path)
+    pages = cache.get_pages(file_hash, path)
+    if pages is None:
+        pages = PyPDFLoader(path).load()
+        cache.put_pages(file_hash, pages)
+    return pages
+
+
+def load_and_split(path: str, chunk_size: int, chunk_overlap: int, file_hash: str | None = None,
+                   cache_path: str | None = None):
+    """Parse one PDF (or fetch its cached pages) and split it; runs inside a worker process."""
+    pages = load_pages(path, file_hash, cache_path)
+    # start_index lets the query side merge overlapping neighbours back together.
+    splitter = RecursiveCharacterTextSplitter(chunk_size=chunk_size, chunk_overlap=chunk_overlap,
+                                              add_start_index=True)
+    return path, splitter.split_documents(pages), len(pages)
+
+
+def _mp_context():
+    # Ingestion runs next to other threads (shard syncs, job workers, the async embedding loop), and a
+    # forked child can inherit a lock one of them held at that moment; workers start from a fork server.
+    if "forkserver" not in multiprocessing.get_all_start_methods():
+        return multiprocessing.get_context("spawn")
+    context = multiprocessing.get_context("forkserver")
+    context.set_forkserver_preload([__name__])  # imported once by the server, not by every worker
+    return context
+
+
+def iter_split_pdfs(paths, chunk_size: int = 1000, chunk_overlap: int = 200, max_workers: int | None = None,
+                    hashes: dict | None = None, cache_path: str | None = None):
+    """Yield (path, chunks, page_count) for every PDF, in completion order.
+
+    Only about two files per worker are in flight at a time, so pages are
+    never all held in memory at once and the caller can start embedding the
+    first files while the rest are still being parsed. With hashes
+    ({path: sha256}) and a cache_path, extracted pages go through the page
+    cache, so changing chunk_size or chunk_overlap does not parse again.
+    """
+    paths = list(paths)
+    hashes = hashes or {}
+
+    def job(path):
+        return path, chunk_size, chunk_overlap, hashes.get(path), cache_path
+
+    max_workers = min(max_workers or os.cpu_count() or 1, len(paths))
+    if max_workers <= 1:
+        # Not worth a process pool for a single file or a single core.
+        for path in paths:
+            yield load_and_split(*job(path))
+        return
+
+    pending = iter(paths)
+    with ProcessPoolExecutor(max_workers=max_workers, mp_context=_mp_context()) as pool:
+        running = set()
+        for path in pending:
+            running.add(pool.submit(load_and_split, *job(path)))
+            if len(running) >= 2 * max_workers:
+                break
+        while running:
+            done, running = wait(running, return_when=FIRST_COMPLETED)
+            for future in done:
+                next_path = next(pending, None)
+                if next_path is not None:
+                    running.add(pool.submit(load_and_split, *job(next_path)))
+                yield future.result()
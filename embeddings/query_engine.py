@@ -0,0 +1,180 @@
+#long-lived RAG query engine: loads the FAISS index once and swaps it when ingestion writes a new one.
+
+import os
+import threading
+import time
+
+from langchain.chains import create_retrieval_chain
+from langchain.chains.combine_documents import create_stuff_documents_chain
+
+from context_compactor import CompactingRetriever
+from hybrid_retriever import HybridRetriever
+from index_store import INDEX_FILES, MMAP_DEFAULT, index_exists, index_version, load_vectorstore, vectorstore_bytes
+from mmap_docstore import DOCSTORE_FILES
+from sharded_index import SHARDS_NAME, ShardedRetriever, is_sharded, load_shards, load_shards_manifest, shard_paths
+
+
+def index_stamp(folder_path: str):
+    """Cheap fingerprint of the saved index, None if it is missing.
+
+    This is the version CURRENT names (see index_store.save_index), so the
+    index is only reloaded when an ingest actually saved a new one; older
+    folders use their VERSION token, or else the mtime and size of the
+    index files. For a sharded index it is the shard versions shards.json
+    names.
+    """
+    if is_sharded(folder_path):
+        versions = load_shards_manifest(folder_path).get("versions")
+        if versions is not None:
+            return tuple(sorted(versions.items()))
+        try:
+            stamps = [os.stat(os.path.join(folder_path, SHARDS_NAME)).st_mtime_ns]
+        except FileNotFoundError:
+            return None
+        stamps += [index_stamp(path) for path in shard_paths(folder_path)]
+        return tuple(stamps)
+    version = index_version(folder_path)
+    if version is not None:
+        return version
+    try:
+        stats = [os.stat(os.path.join(folder_path, name)) for name in INDEX_FILES]
+    except FileNotFoundError:
+        return None
+    for name in DOCSTORE_FILES:
+        path = os.path.join(folder_path, name)
+        if os.path.exists(path):
+            stats.append(os.stat(path))
+    return tuple((s.st_mtime_ns, s.st_size) for s in stats)
+
+
+class RAGQueryEngine:
+    """Retrieval chain over a FAISS folder that stays warm between questions.
+
+    The embeddings client, chat model and documents chain are built once.
+    Before each question the index stamp (its version) is checked (at most every
+    check_interval seconds); if ingestion saved a new index, it is
+    loaded and swapped in with a single assignment, so concurrent questions
+    always see either the old or the new index, never a mix. With
+    check_interval=None questions never look at the files once the index
+    is loaded; whoever ingests in the same process calls refresh(force=True).
+    A new index that fails to load is reported once and not retried until
+    the next save, while the old one keeps answering. With lazy=True
+    the index and docstore are memory-mapped rather than unpickled.
+    Retrieval fuses BM25 and dense results (HybridRetriever), which lets k
+    stay smaller than with dense search alone, and the hits are compacted
+    (merged, de-duplicated, cut to token_budget) before reaching the LLM.
+    A sharded folder (see sharded_index) is searched across all its shards
+    in parallel; db is then the list of shard vector stores.
+    invoke/ask/retrieve take an optional metadata filter such as
+    {"candidate": "Asha Gurung"} or {"source": [...], "page": 0}, applied
+    before any chunk is scored.
+    """
+
+    def __init__(self, folder_path: str, embeddings, llm, prompt, k: int = 3, check_interval: float | None = 1.0,
+                 lazy: bool = MMAP_DEFAULT, token_budget: int = 1500):
+        self.folder_path = folder_path
+        self.token_budget = token_budget
+        self.lazy = lazy
+        self.embeddings = embeddings
+        self.llm = llm
+        self.k = k
+        self.check_interval = check_interval
+        self.doc_chain = create_stuff_documents_chain(llm, prompt)
+        self._state = None  # (stamp, db, chain, retriever)
+        self._bytes = 0
+        self._checked_at = 0.0
+        self._failed_stamp = None  # stamp of a saved index that failed to load
+        self._lock = threading.Lock()
+
+    def _retriever(self, db, filter: dict | None = None, vector: list | None = None) -> CompactingRetriever:
+        if isinstance(db, list):
+            base = ShardedRetriever(shards=db, k=2 * self.k, filter=filter, vector=vector)
+        else:
+            base = HybridRetriever(db=db, bm25=db.bm25, k=2 * self.k, filter=filter, vector=vector)
+        # Fetch twice as many candidates, then merge/trim them down to at most k within the token budget.
+        return CompactingRetriever(base=base, max_docs=self.k, token_budget=self.token_budget)
+
+    def _load(self):
+        stamp = index_stamp(self.folder_path)
+        if is_sharded(self.folder_path):
+            db = load_shards(self.folder_path, self.embeddings, lazy=self.lazy)
+        else:
+            db = load_vectorstore(self.folder_path, self.embeddings, lazy=self.lazy)
+        retriever = self._retriever(db)
+        chain = create_retrieval_chain(retriever, self.doc_chain)
+        # If the files changed while we were reading them, load again on the next check.
+        if index_stamp(self.folder_path) != stamp:
+            stamp = None
+        self._bytes = sum(vectorstore_bytes(d) for d in (db if isinstance(db, list) else [db]))
+        self._state = (stamp, db, chain, retriever)
+
+    def refresh(self, force: bool = False):
+        """Reload the index if the files on disk changed since it was loaded."""
+        now = time.monotonic()
+        if not force and self._state is not None and (self.check_interval is None
+                                                      or now - self._checked_at < self.check_interval):
+            return
+        with self._lock:
+            self._checked_at = now
+            if not (index_exists(self.folder_path) or shard_paths(self.folder_path)):
+                if self._state is None:
+                    raise FileNotFoundError(f"No FAISS index found in {self.folder_path}")
+                return  # mid-rebuild: keep answering from the old index
+            stamp = index_stamp(self.folder_path)
+            if self._state is not None and not force and stamp in (self._state[0], self._failed_stamp):
+                return
+            try:
+                self._load()
+                self._failed_stamp = None
+            except Exception as e:
+                if self._state is None:
+                    raise
+                if stamp != self._failed_stamp:
+                    print(f"⚠️ Could not load the new index in {self.folder_path}, still answering from the "
+                          f"previous one: {e}")
+                self._failed_stamp = stamp
+
+    @property
+    def memory_bytes(self) -> int:
+        """Rough bytes the loaded index holds (0 before it is loaded), see index_store.vectorstore_bytes."""
+        return self._bytes if self._state is not None else 0
+
+    @property
+    def db(self):
+        self.refresh()
+        return self._state[1]
+
+    def invoke(self, query_text: str, filter: dict | None = None) -> dict:
+        self.refresh()
+        _, db, chain, _ = self._state
+        if filter:
+            chain = create_retrieval_chain(self._retriever(db, filter), self.doc_chain)
+        return chain.invoke({"input": query_text})
+
+    def ask(self, query_text: str, filter: dict | None = None) -> str:
+        return self.invoke(query_text, filter)["answer"].strip()
+
+    def retrieve(self, query_text: str, filter: dict | None = None, vector: list | None = None) -> list:
+        """Only the retrieval step, so a UI can show sources before the answer is generated.
+
+        vector is the query's embedding if the caller already has it (the
+        same question retrieved under many filters is embedded once).
+        """
+        self.refresh()
+        _, db, _, retriever = self._state
+        if filter or vector is not None:
+            retriever = self._retriever(db, filter, vector)
+        return retriever.invoke(query_text)
+
+    def metadata_values(self, field: str) -> list:
+        """Distinct values of a metadata field (e.g. every candidate) across the loaded index."""
+        dbs = self.db if isinstance(self.db, list) else [self.db]
+        values = set()
+        for db in dbs:
+            if getattr(db, "metadata_index", None) is not None:
+                values.update(db.metadata_index.values_of(field))
+        return sorted(values)
+
+    def stream_answer(self, query_text: str, docs: list):
+        """Yield answer tokens for already retrieved docs as the LLM produces them."""
+        yield from self.doc_chain.stream({"input": query_text, "context": docs})
@@ -0,0 +1,150 @@
+#per-session indexes for multi-user apps: each session gets its own folders and an in-memory query engine,
+#and engines are evicted least recently used first once together they pass a memory cap.
+#
+#   <data root>/<session id>/     that session's uploaded PDFs
+#   <index root>/<session id>/    its index folder (what an evicted session is reloaded from)
+#
+# Folders of sessions nobody has used for SESSIONS_TTL_HOURS are deleted, so CVs kept on disk (SESSIONS_SPILL)
+# or left behind by a server that did not exit cleanly do not pile up.
+
+import os
+import re
+import shutil
+import threading
+import time
+import uuid
+from collections import OrderedDict
+
+from ingest_jobs import ACTIVE_STATES, latest_job
+
+SESSIONS_MAX_BYTES = int(os.getenv("SESSIONS_MAX_MB", "1024")) * 1024 * 1024
+SESSIONS_SPILL = os.getenv("SESSIONS_SPILL", "0") == "1"
+SESSIONS_TTL_HOURS = float(os.getenv("SESSIONS_TTL_HOURS", "24"))
+EXPIRE_EVERY = 600.0  # seconds between scans for expired sessions
+_SESSION_ID = re.compile(r"[0-9a-f]{32}")
+
+
+def new_session_id() -> str:
+    return uuid.uuid4().hex
+
+
+def valid_session_id(session_id) -> bool:
+    # Session IDs become folder names and may come from the URL, so only accept what new_session_id makes.
+    return isinstance(session_id, str) and _SESSION_ID.fullmatch(session_id) is not None
+
+
+class SessionRegistry:
+    """Query engines of many sessions, held in memory within max_bytes together.
+
+    make_engine(index_folder) builds a session's engine, a RAGQueryEngine
+    or anything with refresh() and memory_bytes (load it unmapped,
+    lazy=False, so what it holds is what it costs). Every engine() call
+    loads that session's index if needed and marks it most recently used;
+    if the loaded engines then hold more than max_bytes, the least recently
+    used ones are dropped from memory and release(index_folder), if given,
+    frees whatever else was cached for them (e.g. cv_table.forget_cv_table).
+    With spill the dropped session's folders stay on disk and its next
+    question reloads them; without it they are deleted, unless a job is
+    still writing to them. Sessions never share files, so concurrent users
+    cannot overwrite each other's CVs. Every few minutes engine() also
+    deletes the folders of sessions that are not loaded and were last used
+    more than ttl seconds ago (None keeps them).
+    """
+
+    def __init__(self, data_root: str, index_root: str, make_engine, max_bytes: int = SESSIONS_MAX_BYTES,
+                 spill: bool = SESSIONS_SPILL, release=None, ttl: float | None = SESSIONS_TTL_HOURS * 3600):
+        self.data_root = data_root
+        self.index_root = index_root
+        self.make_engine = make_engine
+        self.max_bytes = max_bytes
+        self.spill = spill
+        self.release = release
+        self.ttl = ttl or None
+        self._expired_at = None
+        self._engines = OrderedDict()  # session id -> engine, least recently used first
+        self._lock = threading.Lock()
+        self.evictions = 0
+
+    def paths(self, session_id: str) -> tuple:
+        """(data folder, index folder) of a session, created if missing and marked as used now."""
+        if not valid_session_id(session_id):
+            raise ValueError(f"Invalid session id: {session_id!r}")
+        data_path = os.path.join(self.data_root, session_id)
+        index_path = os.path.join(self.index_root, session_id)
+        os.makedirs(data_path, exist_ok=True)
+        os.makedirs(index_path, exist_ok=True)
+        os.utime(index_path)
+        return data_path, index_path
+
+    def engine(self, session_id: str):
+        """The session's engine, loading it if it was never loaded or was evicted."""
+        if self.ttl is not None and (self._expired_at is None or time.monotonic() - self._expired_at >= EXPIRE_EVERY):
+            self._expired_at = time.monotonic()
+            self.expire()
+        _, index_path = self.paths(session_id)
+        with self._lock:
+            engine = self._engines.get(session_id)
+            if engine is None:
+                engine = self._engines[session_id] = self.make_engine(index_path)
+            self._engines.move_to_end(session_id)
+        try:
+            engine.refresh()  # load (or reload) now, outside the lock, so the cap sees what this question uses
+        except FileNotFoundError:
+            pass  # nothing ingested yet
+        with self._lock:
+            self._evict(keep=session_id)
+        return engine
+
+    @property
+    def memory_bytes(self) -> int:
+        """What the loaded engines hold, as of their last load."""
+        return sum(engine.memory_bytes for engine in self._engines.values())
+
+    def _evict(self, keep: str):
+        while self.memory_bytes > self.max_bytes and len(self._engines) > 1:
+            session_id = next(s for s in self._engines if s != keep)
+            del self._engines[session_id]
+            self.evictions += 1
+            self._release(session_id)
+            if not self.spill:
+                self._remove_files(session_id)
+
+    def _release(self, session_id: str):
+        if self.release is not None:
+            self.release(os.path.join(self.index_root, session_id))
+
+    def _remove_files(self, session_id: str):
+        data_path, index_path = os.path.join(self.data_root, session_id), os.path.join(self.index_root, session_id)
+        job = latest_job(index_path)
+        if job is not None and job["state"] in ACTIVE_STATES:
+            return False
+        shutil.rmtree(data_path, ignore_errors=True)
+        shutil.rmtree(index_path, ignore_errors=True)
+        return True
+
+    def expire(self) -> list:
+        """Delete the folders of sessions not in memory whose last use is more than ttl seconds ago.
+
+        Returns their IDs. Last use is the newer folder mtime of the two,
+        which paths() touches; sessions with a job still running are kept.
+        """
+        cutoff = time.time() - self.ttl
+        with self._lock:
+            loaded = set(self._engines)
+        roots = [root for root in (self.data_root, self.index_root) if os.path.isdir(root)]
+        expired = []
+        for session_id in sorted({name for root in roots for name in os.listdir(root) if valid_session_id(name)}):
+            if session_id in loaded:
+                continue
+            stamps = [os.path.getmtime(os.path.join(root, session_id)) for root in roots
+                      if os.path.isdir(os.path.join(root, session_id))]
+            if stamps and max(stamps) < cutoff and self._remove_files(session_id):
+                expired.append(session_id)
+        return expired
+
+    def drop(self, session_id: str):
+        """Forget a session entirely, in memory and on disk."""
+        with self._lock:
+            self._engines.pop(session_id, None)
+            self._release(session_id)
+            self._remove_files(session_id)
@@ -0,0 +1,228 @@
+#sharded FAISS index: independently built shard folders under one index folder, searched in parallel.
+#
+#   faiss_gemini/shards.json       {"num_shards": N, "shards": ["shard-000", ...], "versions": {"shard-000": "v-..."}}
+#   faiss_gemini/shard-000/        an ordinary index folder (CURRENT, v-<token>/, see index_store)
+#
+# Readers load the shard versions shards.json names, so rewriting it publishes a sync of every shard at once.
+
+import hashlib
+import json
+import os
+import shutil
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from langchain_core.callbacks import CallbackManagerForRetrieverRun
+from langchain_core.documents import Document
+from langchain_core.retrievers import BaseRetriever
+
+from hybrid_retriever import channel_relevance, dense_search, document_at, filter_rows, rrf_fuse
+from incremental_ingest import sync_index
+from index_store import clear_index, current_version, index_exists, load_manifest, load_vectorstore, publish_index
+
+SHARDS_NAME = "shards.json"
+SHARDS = int(os.getenv("FAISS_SHARDS", "1"))
+_SHARD_PREFIX = "shard-"
+_search_pool = None
+
+
+def shard_name(i: int) -> str:
+    return f"{_SHARD_PREFIX}{i:03d}"
+
+
+def shard_of(rel_path: str, num_shards: int) -> int:
+    """Stable shard number for a PDF; the same file always lands in the same shard."""
+    return int(hashlib.sha1(rel_path.encode("utf-8")).hexdigest()[:8], 16) % num_shards
+
+
+def load_shards_manifest(folder_path: str) -> dict:
+    path = os.path.join(folder_path, SHARDS_NAME)
+    if not os.path.exists(path):
+        return {}
+    with open(path, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+def is_sharded(folder_path: str) -> bool:
+    return os.path.exists(os.path.join(folder_path, SHARDS_NAME))
+
+
+def shard_paths(folder_path: str) -> list:
+    """Index folders of the shards listed in shards.json that hold an index: the version folder it
+    names for each shard (shard folders written before versions were recorded: the shard folder)."""
+    manifest = load_shards_manifest(folder_path)
+    versions = manifest.get("versions")
+    if versions is None:
+        names = manifest.get("shards", [])
+        return [os.path.join(folder_path, name) for name in names if index_exists(os.path.join(folder_path, name))]
+    paths = [os.path.join(folder_path, name, version) for name, version in sorted(versions.items())]
+    return [path for path in paths if index_exists(path)]
+
+
+def indexed_files(folder_path: str) -> dict:
+    """{relative path: sha256} of every PDF in the index, sharded or not."""
+    folders = shard_paths(folder_path) if is_sharded(folder_path) else [folder_path]
+    return {rel: entry["sha256"] for folder in folders for rel, entry in load_manifest(folder).get("files", {}).items()}
+
+
+def _write_shards_manifest(folder_path: str, num_shards: int, versions: dict):
+    tmp_path = os.path.join(folder_path, f"{SHARDS_NAME}.tmp-{os.getpid()}")
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump({"num_shards": num_shards, "shards": [shard_name(i) for i in range(num_shards)],
+                   "versions": versions}, f)
+    os.replace(tmp_path, os.path.join(folder_path, SHARDS_NAME))
+
+
+def _remove_shards(folder_path: str, keep: int = 0):
+    """Delete shard folders numbered keep and above."""
+    if not os.path.isdir(folder_path):
+        return
+    for name in os.listdir(folder_path):
+        suffix = name[len(_SHARD_PREFIX):]
+        if name.startswith(_SHARD_PREFIX) and suffix.isdigit() and int(suffix) >= keep:
+            shutil.rmtree(os.path.join(folder_path, name), ignore_errors=True)
+
+
+def sync_shards(data_path: str, faiss_path: str, embeddings, num_shards: int = SHARDS,
+                only: list | None = None, max_parallel: int | None = None, **kwargs) -> dict:
+    """Bring a sharded index in faiss_path in line with the PDFs in data_path.
+
+    Each PDF is assigned to one of num_shards shards by a hash of its path,
+    and every shard is its own incremental index (sync_index, which gets
+    kwargs), so shards build, update and load independently. max_parallel
+    shards are synced at once; only restricts the run to some shard numbers,
+    so separate processes or machines can each build their own. Changing
+    num_shards moves files between shards, re-using cached embeddings.
+    The shards' new versions are saved unpublished and then published
+    together by one rewrite of shards.json, so readers never combine
+    shards from different syncs.
+    With num_shards <= 1 this is a plain sync_index of faiss_path.
+    """
+    if num_shards <= 1:
+        if is_sharded(faiss_path):
+            os.unlink(os.path.join(faiss_path, SHARDS_NAME))
+            _remove_shards(faiss_path)
+        return sync_index(data_path, faiss_path, embeddings, **kwargs)
+
+    os.makedirs(faiss_path, exist_ok=True)
+    if load_shards_manifest(faiss_path).get("num_shards") != num_shards:
+        clear_index(faiss_path)  # a monolithic index from before sharding
+        if only is None:
+            _remove_shards(faiss_path, keep=num_shards)
+
+    def sync_one(i: int) -> dict:
+        return sync_index(data_path, os.path.join(faiss_path, shard_name(i)), embeddings,
+                          select=lambda rel: shard_of(rel, num_shards) == i, publish=False, **kwargs)
+
+    numbers = list(range(num_shards)) if only is None else list(only)
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=max_parallel or min(len(numbers), 4)) as pool:
+        results = list(pool.map(sync_one, numbers))
+    elapsed = time.perf_counter() - start
+
+    synced = {shard_name(i): r["version"] for i, r in zip(numbers, results)}
+    previous = load_shards_manifest(faiss_path)
+    versions = {}
+    for i in range(num_shards):
+        name = shard_name(i)
+        if name in synced:
+            version = synced[name]
+        elif previous.get("num_shards") == num_shards and "versions" in previous:
+            version = previous["versions"].get(name)
+        else:
+            folder = os.path.join(faiss_path, name)
+            version = current_version(folder) or ("." if index_exists(folder) else None)  # ".": saved unversioned
+        if version is not None:
+            versions[name] = version
+    _write_shards_manifest(faiss_path, num_shards, versions)
+    # Readers follow shards.json; CURRENT in each shard only tells its next sync where to start.
+    for name, version in synced.items():
+        if version is None:
+            clear_index(os.path.join(faiss_path, name))
+        else:
+            publish_index(os.path.join(faiss_path, name), version)
+
+    stats = {key: sum(r[key] for r in results)
+             for key in ("added", "updated", "removed", "unchanged", "chunks_added", "chunks_removed",
+                         "chunks_deduplicated")}
+    if stats["chunks_added"]:
+        stats["chunks_per_sec"] = stats["chunks_added"] / elapsed
+    stats["shards"] = len(numbers)
+    return stats
+
+
+def _pool() -> ThreadPoolExecutor:
+    global _search_pool
+    if _search_pool is None:
+        _search_pool = ThreadPoolExecutor(max_workers=min(32, 2 * (os.cpu_count() or 1)),
+                                          thread_name_prefix="shard-search")
+    return _search_pool
+
+
+def load_shards(folder_path: str, embeddings, lazy: bool = False) -> list:
+    """Load every built shard of a sharded index, in parallel; all from the same shards.json."""
+    for attempt in range(3):
+        paths = shard_paths(folder_path)
+        if not paths:
+            raise FileNotFoundError(f"No built shards in {folder_path}")
+        try:
+            return list(_pool().map(lambda path: load_vectorstore(path, embeddings, lazy=lazy), paths))
+        except (FileNotFoundError, RuntimeError):
+            if attempt == 2 or shard_paths(folder_path) == paths:
+                raise  # not a version removed by newer syncs while loading
+
+
+class ShardedRetriever(BaseRetriever):
+    """HybridRetriever over several shards.
+
+    The query is embedded once; dense and BM25 search then run on every
+    shard in a thread pool, the per-shard hits are merged into one dense and
+    one lexical ranking (distances are comparable across shards since they
+    share an embedding model) and fused with RRF into the top k. BM25
+    scores use each shard's own term statistics, so the lexical side is a
+    close approximation of a single index rather than identical to it.
+    """
+
+    shards: list
+    k: int = 3
+    fetch_k: int = 20
+    rrf_k: int = 60
+    dense_weight: float = 1.0
+    lexical_weight: float = 1.0
+    filter: dict | None = None
+    vector: list | None = None
+
+    def _search_shard(self, i: int, query: str, vector: list):
+        db = self.shards[i]
+        only = filter_rows(db, self.filter) if self.filter else None
+        if only is not None and not len(only):
+            return [], []
+        dense = [((i, row), dist) for row, dist in dense_search(db, query, self.fetch_k, vector, only)]
+        lexical = [] if db.bm25 is None else [((i, row), s) for row, s in db.bm25.search(query, self.fetch_k, only)]
+        return dense, lexical
+
+    def _search(self, query: str) -> tuple:
+        """Merged (dense, lexical) hits of all shards, keyed by (shard number, row)."""
+        vector = self.vector if self.vector is not None else self.shards[0].embeddings.embed_query(query)
+        results = list(_pool().map(lambda i: self._search_shard(i, query, vector), range(len(self.shards))))
+        dense = sorted((hit for d, _ in results for hit in d), key=lambda hit: hit[1])[:self.fetch_k]
+        lexical = sorted((hit for _, l in results for hit in l), key=lambda hit: hit[1], reverse=True)[:self.fetch_k]
+        return dense, lexical
+
+    def _fuse(self, dense: list, lexical: list) -> list:
+        return rrf_fuse([(self.dense_weight, [key for key, _ in dense]),
+                         (self.lexical_weight, [key for key, _ in lexical])], self.rrf_k)
+
+    def fused_keys(self, query: str) -> list:
+        """(shard number, row) keys with their fused scores, best first."""
+        return self._fuse(*self._search(query))
+
+    def _get_relevant_documents(self, query: str, *, run_manager: CallbackManagerForRetrieverRun) -> list:
+        dense, lexical = self._search(query)
+        relevance = channel_relevance(dense, lexical)
+        results = []
+        for (i, row), score in self._fuse(dense, lexical)[:self.k]:
+            doc = document_at(self.shards[i], row)
+            results.append(Document(id=doc.id, page_content=doc.page_content,
+                                    metadata={**doc.metadata, "score": score, "relevance": relevance[(i, row)]}))
+        return results
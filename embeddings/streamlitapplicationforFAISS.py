@@ -1,12 +1,11 @@
 #this is the python program that implements temple chatbot of dakshinkali temple and provide information according to the user prompt.
 
 import streamlit as st
-from langchain_community.vectorstores import FAISS
 from langchain_google_genai import ChatGoogleGenerativeAI, GoogleGenerativeAIEmbeddings
 from langchain_core.prompts import ChatPromptTemplate
-from langchain.chains.combine_documents import create_stuff_documents_chain
-from langchain.chains import create_retrieval_chain
 from dotenv import load_dotenv
+from local_embeddings import EMBEDDING_BACKEND, LocalEmbeddings
+from query_engine import RAGQueryEngine
 import os
 
 # Load .env
@@ -14,17 +13,13 @@ load_dotenv()
 GOOGLE_API_KEY = os.getenv("GOOGLE_API_KEY")
 FAISS_PATH = "faiss_gemini"
 
-# Load DB and RAG chain once
+# Build the query engine once per server process; it picks up a re-ingested index on its own
 @st.cache_resource
-def setup_rag_chain():
-    embeddings = GoogleGenerativeAIEmbeddings(model='models/gemini-embedding-exp-03-07')
-    db = FAISS.load_local(
-        folder_path=FAISS_PATH,
-        embeddings=embeddings,
-        allow_dangerous_deserialization=True
-    )
-    retriever = db.as_retriever(search_kwargs={"k": 5})
-
+def get_query_engine():
+    if EMBEDDING_BACKEND == "local":
+        embeddings = LocalEmbeddings()
+    else:
+        embeddings = GoogleGenerativeAIEmbeddings(model='models/gemini-embedding-exp-03-07')
     llm = ChatGoogleGenerativeAI(model='gemini-2.5-flash')
     prompt = ChatPromptTemplate.from_template(
         """
@@ -37,9 +32,7 @@ def setup_rag_chain():
         {input}
         """
     )
-    doc_chain = create_stuff_documents_chain(llm, prompt)
-    chain = create_retrieval_chain(retriever, doc_chain)
-    return chain
+    return RAGQueryEngine(FAISS_PATH, embeddings, llm, prompt, k=3)
 
 # Streamlit UI
 st.set_page_config(page_title="Rag Chatbot", page_icon="🤖", layout="centered")
@@ -50,8 +43,17 @@ st.write("Ask questions from your embedded PDF documents.")
 query_text = st.text_input("Enter your query:", placeholder="Ask something about your data...")
 
 if query_text:
-    with st.spinner("Thinking... 🤔"):
-        chain = setup_rag_chain()
-        response = chain.invoke({"input": query_text})
-        st.markdown("### 💬 Answer:")
-        st.success(response["answer"].strip())
+    engine = get_query_engine()
+    with st.spinner("Searching documents... 🔎"):
+        docs = engine.retrieve(query_text)
+
+    # Sources show up as soon as retrieval is done; the answer streams in below them
+    with st.expander(f"📚 Sources ({len(docs)})"):
+        for doc in docs:
+            source = os.path.basename(doc.metadata.get("source", "unknown"))
+            page = doc.metadata.get("page")
+            st.markdown(f"**{source}**" + (f", page {page + 1}" if page is not None else ""))
+            st.caption(doc.page_content[:300] + ("..." if len(doc.page_content) > 300 else ""))
+
+    st.markdown("### 💬 Answer:")
+    st.write_stream(engine.stream_answer(query_text, docs))
@@ -0,0 +1,104 @@
+#local stand-in for an OpenAI-compatible /v1/embeddings endpoint, for load and throttling tests without API keys.
+
+import argparse
+import hashlib
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+def stub_vector(text: str, dim: int) -> list:
+    """Deterministic unit vector for a text."""
+    vector = [b - 127.5 for b in hashlib.shake_256(text.encode("utf-8")).digest(dim)]
+    norm = sum(v * v for v in vector) ** 0.5 or 1.0
+    return [v / norm for v in vector]
+
+
+class StubEmbeddingServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, address, dim=768, latency_ms=50.0, max_concurrent=0):
+        super().__init__(address, StubEmbeddingHandler)
+        self.dim = dim
+        self.latency = latency_ms / 1000
+        self.max_concurrent = max_concurrent
+        self.active = 0
+        self.requests = 0
+        self.rejected = 0
+        self.lock = threading.Lock()
+
+    @property
+    def url(self) -> str:
+        host, port = self.server_address[:2]
+        return f"http://{host}:{port}/v1"
+
+
+class StubEmbeddingHandler(BaseHTTPRequestHandler):
+    def log_message(self, format, *args):
+        pass
+
+    def _send(self, status, body, headers=None):
+        payload = json.dumps(body).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(payload)))
+        for key, value in (headers or {}).items():
+            self.send_header(key, value)
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def do_POST(self):
+        server = self.server
+        body = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))) or b"{}")
+        with server.lock:
+            server.requests += 1
+            if server.max_concurrent and server.active >= server.max_concurrent:
+                server.rejected += 1
+                self._send(429, {"error": {"message": "Rate limit reached", "type": "rate_limit"}},
+                           {"Retry-After": "0.05"})
+                return
+            server.active += 1
+        try:
+            inputs = body.get("input", [])
+            if isinstance(inputs, str):
+                inputs = [inputs]
+            time.sleep(server.latency)
+            # Token-id inputs (tiktoken pre-chunking) are hashed via their JSON form.
+            data = [{"object": "embedding", "index": i,
+                     "embedding": stub_vector(item if isinstance(item, str) else json.dumps(item), server.dim)}
+                    for i, item in enumerate(inputs)]
+            self._send(200, {"object": "list", "data": data, "model": body.get("model", "stub"),
+                             "usage": {"prompt_tokens": 0, "total_tokens": 0}})
+        finally:
+            with server.lock:
+                server.active -= 1
+
+
+def serve_in_background(host="127.0.0.1", port=0, **options) -> StubEmbeddingServer:
+    """Start a stub server on a free port in a daemon thread."""
+    server = StubEmbeddingServer((host, port), **options)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def stub_embeddings(server: StubEmbeddingServer, model: str = "stub-embedding"):
+    """OpenAIEmbeddings client pointed at the stub; client-side retries are off so 429s reach the caller."""
+    from langchain_openai import OpenAIEmbeddings
+
+    return OpenAIEmbeddings(model=model, base_url=server.url, api_key="stub",
+                            check_embedding_ctx_length=False, max_retries=0)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Stub OpenAI-compatible embedding server")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--dim", type=int, default=768)
+    parser.add_argument("--latency-ms", type=float, default=50)
+    parser.add_argument("--max-concurrent", type=int, default=0, help="answer 429 above this many in-flight requests (0 = unlimited)")
+    args = parser.parse_args()
+
+    server = StubEmbeddingServer(("127.0.0.1", args.port), dim=args.dim, latency_ms=args.latency_ms,
+                                 max_concurrent=args.max_concurrent)
+    print(f"🧪 Stub embedding server on {server.url}")
+    server.serve_forever()
@@ -0,0 +1,7 @@
+#the embeddings scripts import each other as top-level modules (they run with embeddings/ as the working
+#directory), so the tests put that folder on sys.path the same way.
+
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
@@ -0,0 +1,75 @@
+#router questions answered from the CV table, and the ones that must fall back to the LLM.
+
+import pyarrow as pa
+import pytest
+
+from cv_table import SCHEMA, CVTable, answer_from_table, find_phone
+
+
+def _row(name, skills, years=None, education=()):
+    return {"file": f"{name.lower()}.pdf", "sha256": name, "name": name, "email": f"{name.lower()}@example.com",
+            "phone": None, "skills": list(skills), "years_experience": years, "education": list(education)}
+
+
+@pytest.fixture
+def table():
+    return CVTable(pa.Table.from_pylist([
+        _row("Asha", ["Python", "SQL"], 2, ["BSc Computer Science"]),
+        _row("Bikash", ["Java", "SQL"], 6, ["MSc Software Engineering"]),
+        _row("Chandra", ["Python", "Java"], 4),
+        _row("Dipa", ["Excel"], 1),
+    ], schema=SCHEMA))
+
+
+def _names(answer):
+    return {line[2:].split(" (")[0] for line in answer.splitlines() if line.startswith("- ")}
+
+
+def test_skill_filter(table):
+    assert _names(answer_from_table("Who knows Python?", table)) == {"Asha", "Chandra"}
+
+
+def test_negated_skill_lists_candidates_without_it(table):
+    answer = answer_from_table("Who doesn't know SQL?", table)
+    assert _names(answer) == {"Chandra", "Dipa"}
+    assert answer_from_table("How many candidates don't know SQL?", table) == "2 of 4 candidates have no SQL."
+
+
+def test_or_needs_any_of_the_skills(table):
+    assert _names(answer_from_table("Who has Python or Java?", table)) == {"Asha", "Bikash", "Chandra"}
+
+
+def test_but_not_excludes_the_negated_skill(table):
+    assert _names(answer_from_table("Who knows Python but not Java?", table)) == {"Asha"}
+
+
+def test_years_of_a_skill_goes_to_the_llm(table):
+    assert answer_from_table("Who has at least 3 years of Python experience?", table) is None
+    assert answer_from_table("Which candidates have 3+ years Python?", table) is None
+
+
+def test_total_years_still_answered(table):
+    assert _names(answer_from_table("Who has at least 3 years of experience?", table)) == {"Bikash", "Chandra"}
+    assert _names(answer_from_table("Who knows Python and has at least 3 years of experience?", table)) == {"Chandra"}
+
+
+@pytest.mark.parametrize("question", [
+    "Which candidates don't have a master's degree?",
+    "List candidates not from Kathmandu",
+    "Who has Python or Java and a bachelor's degree?",
+    "Who knows neither Python nor Java?",
+    "Who has Python or similar languages?",
+])
+def test_unsupported_forms_go_to_the_llm(table, question):
+    assert answer_from_table(question, table) is None
+
+
+@pytest.mark.parametrize("text, phone", [
+    ("Software Engineer, Acme 2015 - 2019\nPhone: +977 984-123-4567", "+977 984-123-4567"),
+    ("Experience 2015 – 2019, 2019-2021\nasha@example.com | 9841234567", "9841234567"),
+    ("Order no. 12345678901\nMobile:\n01 4423 5566", "01 4423 5566"),
+    ("Born 12.05.1995\nWorked 2010 - 2014 and 2016 - 2020", None),
+    ("Student ID 12345678", None),
+])
+def test_find_phone(text, phone):
+    assert find_phone(text) == phone
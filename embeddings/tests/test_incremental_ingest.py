@@ -0,0 +1,127 @@
+#sync_index against tiny generated PDFs and a fake embedding: adds, changes, deletes, rebuilds, resuming and dedup.
+
+import os
+
+import pytest
+from langchain_community.embeddings import DeterministicFakeEmbedding
+
+import incremental_ingest
+from bench_rag import make_corpus, write_pdf
+from incremental_ingest import sync_index
+from index_store import current_version, index_exists, load_manifest, load_vectorstore
+
+SETTINGS = dict(chunk_size=300, chunk_overlap=0, index_type="flat", max_workers=1)
+
+
+class CrashingEmbedding(DeterministicFakeEmbedding):
+    """Fails once it would embed more than `limit` texts, like a run killed part-way."""
+
+    limit: int | None = None
+    embedded: list = []
+
+    def embed_documents(self, texts):
+        if self.limit is not None and len(self.embedded) + len(texts) > self.limit:
+            raise RuntimeError("embedding service went away")
+        self.embedded.extend(texts)
+        return super().embed_documents(texts)
+
+
+@pytest.fixture(autouse=True)
+def no_page_cache(monkeypatch):
+    monkeypatch.setattr(incremental_ingest, "PAGE_CACHE", False)
+
+
+@pytest.fixture
+def embeddings():
+    return CrashingEmbedding(size=16, embedded=[])
+
+
+def _sync(data, index, embeddings, **kwargs):
+    return sync_index(str(data), str(index), embeddings, **{**SETTINGS, **kwargs})
+
+
+def _chunk_texts(index, embeddings) -> list:
+    db = load_vectorstore(str(index), embeddings)
+    return sorted(db.docstore.search(doc_id).page_content for doc_id in db.index_to_docstore_id.values())
+
+
+def test_add_change_and_delete(tmp_path, embeddings):
+    data, index = tmp_path / "data", tmp_path / "index"
+    make_corpus(str(data), 3, 1)
+    stats = _sync(data, index, embeddings)
+    assert (stats["added"], stats["unchanged"]) == (3, 0)
+    first = current_version(str(index))
+    assert stats["version"] == first
+
+    stats = _sync(data, index, embeddings)
+    assert (stats["added"], stats["updated"], stats["unchanged"], stats["chunks_added"]) == (0, 0, 3, 0)
+    assert current_version(str(index)) == first
+
+    os.unlink(data / "doc_00000.pdf")
+    write_pdf(str(data / "doc_00001.pdf"), [["A changed page about Kubernetes and Terraform."]])
+    write_pdf(str(data / "new.pdf"), [["A new page about Rust."]])
+    stats = _sync(data, index, embeddings)
+    assert (stats["added"], stats["updated"], stats["removed"], stats["unchanged"]) == (1, 1, 1, 1)
+    assert sorted(load_manifest(str(index))["files"]) == ["doc_00001.pdf", "doc_00002.pdf", "new.pdf"]
+    texts = _chunk_texts(index, embeddings)
+    assert "A new page about Rust." in texts
+    assert "A changed page about Kubernetes and Terraform." in texts
+
+    # Same result as building the current folder from scratch.
+    _sync(data, tmp_path / "fresh", embeddings)
+    assert texts == _chunk_texts(tmp_path / "fresh", embeddings)
+
+
+def test_settings_change_rebuilds(tmp_path, embeddings):
+    data, index = tmp_path / "data", tmp_path / "index"
+    make_corpus(str(data), 2, 1)
+    before = _sync(data, index, embeddings)["chunks_added"]
+    stats = _sync(data, index, embeddings, chunk_size=150)
+    assert (stats["added"], stats["unchanged"]) == (2, 0)
+    assert stats["chunks_added"] > before
+    manifest = load_manifest(str(index))
+    assert manifest["settings"]["chunk_size"] == 150
+    assert load_vectorstore(str(index), embeddings).index.ntotal == stats["chunks_added"]
+
+
+def test_resume_after_crash(tmp_path, embeddings):
+    data, index = tmp_path / "data", tmp_path / "index"
+    make_corpus(str(data), 4, 1)
+    checkpointed = dict(checkpoint_every=1, ingest_batch=1, batch_size=1, max_in_flight=1)
+    _sync(data, tmp_path / "probe", CrashingEmbedding(size=16, embedded=[]), **checkpointed)
+    chunks = {rel: len(entry["chunks"]) for rel, entry in load_manifest(str(tmp_path / "probe"))["files"].items()}
+
+    done = []
+    embeddings.limit = 2 * min(chunks.values()) + 1  # dies in the second or third file
+    with pytest.raises(RuntimeError):
+        _sync(data, index, embeddings, progress=lambda rel, state: state == "embedded" and done.append(rel),
+              **checkpointed)
+    assert done and not index_exists(str(index))  # checkpoints are not published
+    assert os.path.exists(index / "staging" / "checkpoint.json")
+
+    embeddings.limit = None
+    stats = _sync(data, index, embeddings, **checkpointed)
+    assert stats["added"] == 4 - len(done)  # checkpointed files are not embedded again
+    assert stats["chunks_added"] == sum(n for rel, n in chunks.items() if rel not in done)
+    assert sorted(load_manifest(str(index))["files"]) == sorted(chunks)
+    assert not os.path.exists(index / "staging")
+    assert _chunk_texts(index, embeddings) == _chunk_texts(tmp_path / "probe", embeddings)
+
+
+def test_removing_a_dedup_original_reingests_its_duplicates(tmp_path, embeddings):
+    data, index = tmp_path / "data", tmp_path / "index"
+    data.mkdir()
+    write_pdf(str(data / "a.pdf"), [[f"Line {i}: candidate {i * 7} led project {i * 13} in team {i * 31}."
+                                     for i in range(40)]])
+    (data / "b.pdf").write_bytes((data / "a.pdf").read_bytes())
+    stats = _sync(data, index, embeddings, dedup=True)
+    chunks = load_manifest(str(index))["files"]["b.pdf"]["chunks"]
+    assert stats["chunks_deduplicated"] == len(chunks)
+    assert all("dup_of" in c for c in chunks)
+
+    os.unlink(data / "a.pdf")
+    stats = _sync(data, index, embeddings, dedup=True)
+    assert (stats["removed"], stats["updated"]) == (1, 1)
+    chunks = load_manifest(str(index))["files"]["b.pdf"]["chunks"]
+    assert not any("dup_of" in c for c in chunks)
+    assert load_vectorstore(str(index), embeddings).index.ntotal == len(chunks)
@@ -2,6 +2,7 @@
 import google.generativeai as genai  # Google's Gemini AI library
 from dotenv import load_dotenv       # For loading environment variables
 import os                           # For accessing system environment variables
+from chat_history import ChatHistory  # Rolling, token-budgeted chat history
 
 # Load API key from .env file
 load_dotenv()  # Load environment variables from a .env file
@@ -12,16 +13,16 @@ genai.configure(api_key=os.getenv("GOOGLE_API_KEY"))
 # Using 'gemini-2.5-flash' model which is optimized for fast responses
 model = genai.GenerativeModel('gemini-2.5-flash')
 
-# Start a new chat session with empty history
-# This chat object will maintain conversation context
-chat = model.start_chat(history=[])
+# Start a new chat session
+# Recent turns are resent verbatim, older ones as a rolling summary, so long chats stay as fast as short ones
+chat = ChatHistory(model)
 
 # Start interactive conversation loop
 while True:
     # Prompt user for input
     query = input("Enter your query: ")
 
-    # Send the user's message to the model along with full chat history
+    # Send the user's message to the model along with the summary and recent turns
     # This maintains context for multi-turn conversations
     response = chat.send_message(query)
 
@@ -3,6 +3,7 @@ import streamlit as st  # For building the web interface
 import google.generativeai as genai  # For accessing Google's Gemini AI
 from dotenv import load_dotenv  # For loading environment variables
 import os  # For accessing system environment variables
+from chat_history import ChatHistory  # Keeps what each message resends within a token budget
 
 # Load environment variables from .env file
 load_dotenv()  
@@ -14,8 +15,8 @@ genai.configure(api_key=os.getenv("GOOGLE_API_KEY"))
 if "chat" not in st.session_state:
     # Create a new Gemini model instance (using flash version for faster responses)
     model = genai.GenerativeModel("gemini-2.5-flash")
-    # Start a new chat session with empty history
-    st.session_state.chat = model.start_chat(history=[])
+    # Start a new chat whose older turns are folded into a rolling summary
+    st.session_state.chat = ChatHistory(model)
     # Initialize empty list to store message history for UI display
     st.session_state.messages = []
 
@@ -186,8 +187,8 @@ if ask_btn:  # When send button is clicked
 if reset_btn:  # When reset button is clicked
     # Reinitialize the model
     model = genai.GenerativeModel("gemini-2.5-flash")
-    # Clear chat history
-    st.session_state.chat = model.start_chat(history=[])
+    # Clear chat history and its summary
+    st.session_state.chat = ChatHistory(model)
     # Clear message display history
     st.session_state.messages = []
     # Show success message
@@ -1,9 +1,12 @@
-from langchain_community.document_loaders import PyPDFDirectoryLoader
-from langchain_text_splitters import RecursiveCharacterTextSplitter
 from langchain_google_genai import GoogleGenerativeAIEmbeddings
-from langchain_community.vectorstores import FAISS
 from dotenv import load_dotenv
 import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "embeddings"))
+from embedding_cache import with_cache
+from incremental_ingest import sync_index
+from local_embeddings import EMBEDDING_BACKEND, LocalEmbeddings
 
 # Load environment variables from .env file
 load_dotenv()
@@ -13,11 +16,12 @@ GOOGLE_API_KEY = os.environ.get("GOOGLE_API_KEY")
 DATA_PATH="data"
 FAISS_PATH="faiss_gemini"
 
-document_loader = PyPDFDirectoryLoader(DATA_PATH)
-docs=document_loader.load()
-
-text_splitter =RecursiveCharacterTextSplitter(chunk_size=1000, chunk_overlap=200)
-documents=text_splitter.split_documents(docs)
+if EMBEDDING_BACKEND == "local":
+    embeddings = LocalEmbeddings()
+else:
+    embeddings = GoogleGenerativeAIEmbeddings(model='models/gemini-embedding-exp-03-07')
 
-db=FAISS.from_documents(embedding=GoogleGenerativeAIEmbeddings(model='models/gemini-embedding-exp-03-07'), documents=documents)
-db.save_local(FAISS_PATH)
\ No newline at end of file
+# Only new or changed PDFs are embedded; pass --rebuild to re-embed everything.
+stats = sync_index(DATA_PATH, FAISS_PATH, with_cache(embeddings),
+                   chunk_size=1000, chunk_overlap=200, rebuild="--rebuild" in sys.argv)
+print(stats)
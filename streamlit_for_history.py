@@ -2,6 +2,7 @@ import streamlit as st
 import google.generativeai as genai
 from dotenv import load_dotenv
 import os
+from chat_history import ChatHistory
 
 # Load .env variables
 load_dotenv()
@@ -10,7 +11,7 @@ genai.configure(api_key=os.getenv("GOOGLE_API_KEY"))
 # Initialize model and chat once per session
 if "chat" not in st.session_state:
     model = genai.GenerativeModel("gemini-2.5-flash")
-    st.session_state.chat = model.start_chat(history=[])
+    st.session_state.chat = ChatHistory(model)
     st.session_state.messages = []
 
 # Streamlit page config
@@ -72,7 +73,7 @@ with input_container:
 
     if reset_btn:
         model = genai.GenerativeModel("gemini-2.5-flash")
-        st.session_state.chat = model.start_chat(history=[])
+        st.session_state.chat = ChatHistory(model)
         st.session_state.messages = []
         st.success("Conversation reset.")
         st.rerun()
\ No newline at end of file